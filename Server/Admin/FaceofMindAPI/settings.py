@@ -141,6 +141,9 @@ REDIS_PORT = int(os.getenv('REDIS_PORT', 6379))
 # Redis URL for coreapi.utils.get_redis()
 REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
 
+# Detections older than this many months are moved to detection_archive by archive_detections
+DETECTION_RETENTION_MONTHS = int(os.getenv('DETECTION_RETENTION_MONTHS', 24))
+
 WSGI_APPLICATION = 'FaceofMindAPI.wsgi.application'
 
 
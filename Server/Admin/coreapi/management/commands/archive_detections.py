@@ -0,0 +1,152 @@
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Min
+
+from coreapi.models import DetectionArchive, EmotionDetection
+
+ARCHIVE_FIELDS = [
+    "id", "session_id", "user_id", "timestamp", "local_day", "crisis_flag", "emotion",
+    "emotion_code", "voice_content", "acknowledgment", "suggestions", "urls",
+]
+SCHEMA = pa.schema([
+    ("detection_id", pa.int64()),
+    ("session_id", pa.int64()),
+    ("user_id", pa.int64()),
+    ("timestamp", pa.timestamp("us", tz="UTC")),
+    ("local_day", pa.date32()),
+    ("crisis_flag", pa.bool_()),
+    ("emotion", pa.string()),
+    ("emotion_code", pa.int16()),
+    ("voice_content", pa.string()),
+    ("acknowledgment", pa.string()),
+    ("suggestions", pa.list_(pa.string())),
+    ("urls", pa.list_(pa.string())),
+])
+# One row per detection; like the session history, the earliest facial/voice/suggestion row wins
+MOVE_SQL = """
+    INSERT INTO detection_archive (id, session_id, user_id, "timestamp", local_day, crisis_flag, emotion,
+                                   emotion_code, voice_content, acknowledgment, suggestions, urls)
+    SELECT d.id, d.session_id, d.user_id, d."timestamp", d.local_day, d.crisis_flag, f.emotion,
+           f.emotion_code, v.content, w.acknowledgment, w.suggestions, w.urls
+    FROM emotion_detections d
+    LEFT JOIN facial_data f ON f.id = (SELECT min(id) FROM facial_data WHERE detection_id = d.id)
+    LEFT JOIN voice_data v ON v.id = (SELECT min(id) FROM voice_data WHERE detection_id = d.id)
+    LEFT JOIN wellness_suggestions w ON w.id = (SELECT min(id) FROM wellness_suggestions WHERE detection_id = d.id)
+    WHERE d."timestamp" >= %s AND d."timestamp" < %s
+"""
+CHILD_TABLES = ["facial_data", "voice_data", "wellness_suggestions"]
+
+
+def month_start(value: datetime) -> datetime:
+    return datetime(value.year, value.month, 1, tzinfo=timezone.utc)
+
+
+def add_months(value: datetime, months: int) -> datetime:
+    index = value.year * 12 + value.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def partition_name(month: datetime) -> str:
+    return f"detection_archive_{month:%Y_%m}"
+
+
+def ensure_partition(cursor, month: datetime):
+    """Create the archive partition for the month on PostgreSQL; other databases keep one plain table."""
+    if connection.vendor != "postgresql":
+        return
+    cursor.execute(
+        f'CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF detection_archive '
+        f'FOR VALUES FROM (%s) TO (%s)',
+        [month, add_months(month, 1)]
+    )
+
+
+def move_month(month: datetime) -> int:
+    """Move one month of detections and their facial/voice/suggestion rows into the archive. Returns the number moved."""
+    start, end = month, add_months(month, 1)
+    with transaction.atomic(), connection.cursor() as cursor:
+        ensure_partition(cursor, month)
+        cursor.execute(MOVE_SQL, [start, end])
+        moved = cursor.rowcount
+        for table in CHILD_TABLES:
+            cursor.execute(
+                f'DELETE FROM {table} WHERE detection_id IN '
+                f'(SELECT id FROM emotion_detections WHERE "timestamp" >= %s AND "timestamp" < %s)',
+                [start, end]
+            )
+        cursor.execute('DELETE FROM emotion_detections WHERE "timestamp" >= %s AND "timestamp" < %s', [start, end])
+    return moved
+
+
+def offload_month(output: Path, month: datetime) -> int:
+    """Write one archived month to a zstd-compressed Parquet file, then drop it from the database."""
+    start, end = month, add_months(month, 1)
+    rows = list(
+        DetectionArchive.objects.filter(timestamp__gte=start, timestamp__lt=end)
+        .order_by("id").values_list(*ARCHIVE_FIELDS)
+    )
+    if rows:
+        columns = list(zip(*rows))
+        table = pa.Table.from_arrays(
+            [pa.array(values, type=field.type) for values, field in zip(columns, SCHEMA)],
+            schema=SCHEMA
+        )
+        directory = output / f"month={month:%Y-%m}"
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / "detections.parquet"
+        tmp = path.with_suffix(".tmp")
+        pq.write_table(table, tmp, compression="zstd")
+        os.replace(tmp, path)
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute(f"DROP TABLE IF EXISTS {partition_name(month)}")
+        else:
+            cursor.execute('DELETE FROM detection_archive WHERE "timestamp" >= %s AND "timestamp" < %s', [start, end])
+    return len(rows)
+
+
+class Command(BaseCommand):
+    help = "Move emotion detections older than the retention period into the month-partitioned detection_archive table"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--retention-months", type=int, default=settings.DETECTION_RETENTION_MONTHS, help="Whole months of detections kept in the hot tables")
+        parser.add_argument("--offload-months", type=int, default=None, help="Also write archived months older than this to Parquet files and drop them")
+        parser.add_argument("--output", default=str(Path(settings.BASE_DIR) / "exports" / "archive"), help="Directory for offloaded Parquet files")
+
+    def handle(self, *args, **options):
+        now = datetime.now(timezone.utc)
+        cutoff = add_months(month_start(now), -options["retention_months"])
+        oldest = EmotionDetection.objects.filter(timestamp__lt=cutoff).aggregate(oldest=Min("timestamp"))["oldest"]
+
+        moved = 0
+        month = month_start(oldest) if oldest else cutoff
+        # Month by month, so each transaction stays bounded and an interrupted run resumes where it stopped
+        while month < cutoff:
+            # Skip empty months rather than creating empty partitions for them
+            if EmotionDetection.objects.filter(timestamp__gte=month, timestamp__lt=add_months(month, 1)).exists():
+                count = move_month(month)
+                moved += count
+                self.stdout.write(f"Archived {count} detections from {month:%Y-%m}")
+            month = add_months(month, 1)
+        self.stdout.write(self.style.SUCCESS(f"Archived {moved} detections older than {cutoff:%Y-%m-%d}"))
+
+        if options["offload_months"] is None:
+            return
+        offload_cutoff = add_months(month_start(now), -options["offload_months"])
+        oldest = DetectionArchive.objects.filter(timestamp__lt=offload_cutoff).aggregate(oldest=Min("timestamp"))["oldest"]
+        output = Path(options["output"])
+        offloaded = 0
+        month = month_start(oldest) if oldest else offload_cutoff
+        while month < offload_cutoff:
+            if DetectionArchive.objects.filter(timestamp__gte=month, timestamp__lt=add_months(month, 1)).exists():
+                offloaded += offload_month(output, month)
+            month = add_months(month, 1)
+        self.stdout.write(self.style.SUCCESS(f"Offloaded {offloaded} archived detections to {output}"))
@@ -0,0 +1,140 @@
+import json
+import os
+import shutil
+import time
+from collections import defaultdict
+from datetime import timezone
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from coreapi.models import EmotionDetection
+
+SCHEMA = pa.schema([
+    ("detection_id", pa.int64()),
+    ("session_id", pa.int64()),
+    ("user_id", pa.int64()),
+    ("timestamp", pa.timestamp("us", tz="UTC")),
+    ("crisis_flag", pa.bool_()),
+    ("emotion", pa.string()),
+    ("emotion_code", pa.int16()),
+    ("voice_content", pa.string()),
+])
+FIELDS = [
+    "id", "session_id", "user_id", "timestamp", "crisis_flag",
+    "facialdata__emotion", "facialdata__emotion_code", "voicedata__content",
+]
+WATERMARK_FILE = "_watermark.json"
+# Uncommitted transactions hold ids near the top of the sequence; gaps further down are deleted or rolled-back rows
+IN_FLIGHT_WINDOW = 10000
+
+
+def read_watermark(output: Path):
+    """Return (last exported id, {skipped id: epoch first seen missing})."""
+    try:
+        with open(output / WATERMARK_FILE) as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        return 0, {}
+    return state["last_detection_id"], {int(i): seen for i, seen in state.get("missing_ids", {}).items()}
+
+
+def write_watermark(output: Path, last_id: int, missing: dict):
+    tmp = output / (WATERMARK_FILE + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump({"last_detection_id": last_id, "missing_ids": {str(i): seen for i, seen in missing.items()}}, f)
+    os.replace(tmp, output / WATERMARK_FILE)
+
+
+def write_partitions(output: Path, rows, first_id: int, last_id: int, prefix: str = "part") -> int:
+    """Write one chunk of joined rows as a Parquet file per UTC day. Returns the number of files."""
+    by_day = defaultdict(list)
+    for row in rows:
+        by_day[row[3].astimezone(timezone.utc).date()].append(row)
+
+    for day, day_rows in by_day.items():
+        columns = list(zip(*day_rows))
+        batch = pa.RecordBatch.from_arrays(
+            [pa.array(values, type=field.type) for values, field in zip(columns, SCHEMA)],
+            schema=SCHEMA
+        )
+        # File names come from the id range, so re-running an interrupted chunk overwrites rather than duplicates
+        directory = output / "detections" / f"day={day.isoformat()}"
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"{prefix}-{first_id:012d}-{last_id:012d}.parquet"
+        tmp = path.with_suffix(".tmp")
+        pq.write_table(pa.Table.from_batches([batch]), tmp)
+        os.replace(tmp, path)
+    return len(by_day)
+
+
+class Command(BaseCommand):
+    help = "Export emotion detections with their facial and voice data to day-partitioned Parquet files, resuming from the last exported id"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", default=str(Path(settings.BASE_DIR) / "exports"), help="Directory for the Parquet dataset")
+        parser.add_argument("--chunk-size", type=int, default=10000, help="Detections read per query")
+        parser.add_argument("--full", action="store_true", help="Delete the exported files and export everything again")
+        parser.add_argument("--grace-minutes", type=int, default=60, help="How long ids skipped below the watermark are retried before they count as rolled back")
+
+    def export_late_rows(self, output: Path, missing: dict, grace_seconds: int):
+        """Export rows whose ids were skipped by an earlier run because their transaction had not committed yet.
+
+        Ids that stay missing past the grace period belonged to rolled-back or deleted rows and are dropped.
+        Returns (detections exported, files written).
+        """
+        exported = files = 0
+        ids = sorted(missing)
+        for start in range(0, len(ids), 1000):
+            rows = list(EmotionDetection.objects.filter(id__in=ids[start:start + 1000]).order_by("id").values_list(*FIELDS))
+            if rows:
+                # Named apart from the regular parts, whose id ranges these ids fall inside
+                files += write_partitions(output, rows, rows[0][0], rows[-1][0], prefix="late")
+                for row in rows:
+                    missing.pop(row[0], None)
+                exported += len({row[0] for row in rows})
+        cutoff = time.time() - grace_seconds
+        for detection_id in [i for i, seen in missing.items() if seen < cutoff]:
+            del missing[detection_id]
+        return exported, files
+
+    def handle(self, *args, **options):
+        output = Path(options["output"])
+        output.mkdir(parents=True, exist_ok=True)
+        if options["full"]:
+            # File names come from id ranges that a fresh run chunks differently, so old files would duplicate rows
+            shutil.rmtree(output / "detections", ignore_errors=True)
+            last_id, missing = 0, {}
+        else:
+            last_id, missing = read_watermark(output)
+        until = EmotionDetection.objects.order_by("-id").values_list("id", flat=True).first() or 0
+
+        exported, files = self.export_late_rows(output, missing, options["grace_minutes"] * 60)
+        while last_id < until:
+            ids = list(
+                EmotionDetection.objects.filter(id__gt=last_id, id__lte=until)
+                .order_by("id").values_list("id", flat=True)[:options["chunk_size"]]
+            )
+            if not ids:
+                break
+            # Fetch the whole id range at once so a detection's facial and voice rows never straddle chunks
+            rows = list(
+                EmotionDetection.objects.filter(id__gt=last_id, id__lte=ids[-1])
+                .order_by("id").values_list(*FIELDS)
+            )
+            files += write_partitions(output, rows, ids[0], ids[-1])
+            # Ids are handed out before commit, so a gap may be a transaction that commits after this read;
+            # remember it and look again next run rather than skipping the row forever
+            now = time.time()
+            for gap in set(range(max(last_id, until - IN_FLIGHT_WINDOW) + 1, ids[-1] + 1)).difference(ids):
+                missing.setdefault(gap, now)
+            exported += len(ids)
+            last_id = ids[-1]
+            write_watermark(output, last_id, missing)
+            self.stdout.write(f"Exported detections up to id {last_id}")
+        write_watermark(output, last_id, missing)
+
+        self.stdout.write(self.style.SUCCESS(f"Exported {exported} detections into {files} files in {output}; {len(missing)} skipped ids pending"))
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.3 on 2026-10-18 09:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coreapi', '0003_remove_voicedata_audio_path_wellnesssuggestion_url'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmotionDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('local_day', models.DateField()),
+                ('emotion', models.TextField()),
+                ('mild', models.IntegerField(default=0)),
+                ('moderate', models.IntegerField(default=0)),
+                ('severe', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='coreapi.user')),
+            ],
+            options={
+                'db_table': 'emotion_daily_rollups',
+                'constraints': [models.UniqueConstraint(fields=('user', 'local_day', 'emotion'), name='uniq_rollup_user_day_emotion')],
+            },
+        ),
+    ]
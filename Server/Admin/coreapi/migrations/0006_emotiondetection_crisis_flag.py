@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-18 11:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coreapi', '0005_session_user_start_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='emotiondetection',
+            name='crisis_flag',
+            field=models.BooleanField(db_default=False, db_index=True, default=False),
+        ),
+    ]
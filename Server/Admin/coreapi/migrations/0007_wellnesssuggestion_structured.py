@@ -0,0 +1,68 @@
+# Generated by Django 5.2.3 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+def summarize(text):
+    for sep in [".", "!", "?"]:
+        if sep in text:
+            first_sentence = text.split(sep)[0].strip()
+            if first_sentence:
+                return first_sentence
+    words = text.split()
+    return " ".join(words[:6]) + ("..." if len(words) > 6 else "")
+
+
+def parse_existing_suggestions(apps, schema_editor):
+    """Fill the structured columns from the bullet text and comma-joined URLs stored so far."""
+    WellnessSuggestion = apps.get_model('coreapi', 'WellnessSuggestion')
+    batch = []
+    for row in WellnessSuggestion.objects.exclude(suggestion="").iterator(chunk_size=1000):
+        bullets = []
+        for line in row.suggestion.split('\n'):
+            line = line.strip()
+            if line.startswith('- ') or line.startswith('•'):
+                clean = line.lstrip('-*• ').strip()
+                if clean:
+                    bullets.append(clean)
+        row.acknowledgment = bullets[0] if bullets else ""
+        row.suggestions = bullets[1:]
+        row.summary = summarize(row.suggestion.split('•')[0].strip()) or None
+        row.urls = [u.strip() for u in (row.url or "").split(',') if u.strip()]
+        batch.append(row)
+        if len(batch) == 1000:
+            WellnessSuggestion.objects.bulk_update(batch, ['acknowledgment', 'suggestions', 'summary', 'urls'])
+            batch = []
+    if batch:
+        WellnessSuggestion.objects.bulk_update(batch, ['acknowledgment', 'suggestions', 'summary', 'urls'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coreapi', '0006_emotiondetection_crisis_flag'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wellnesssuggestion',
+            name='acknowledgment',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='wellnesssuggestion',
+            name='suggestions',
+            field=models.JSONField(default=list),
+        ),
+        migrations.AddField(
+            model_name='wellnesssuggestion',
+            name='summary',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='wellnesssuggestion',
+            name='urls',
+            field=models.JSONField(default=list),
+        ),
+        migrations.RunPython(parse_existing_suggestions, migrations.RunPython.noop),
+    ]
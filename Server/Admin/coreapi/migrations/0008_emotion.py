@@ -0,0 +1,36 @@
+# Generated by Django 5.2.3 on 2026-10-18 13:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coreapi', '0007_wellnesssuggestion_structured'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Emotion',
+            fields=[
+                ('id', models.SmallAutoField(primary_key=True, serialize=False)),
+                ('name', models.TextField(unique=True)),
+                ('intensity', models.CharField(default='moderate', max_length=10)),
+                ('color', models.CharField(default='#778899', max_length=7)),
+            ],
+            options={
+                'db_table': 'emotions',
+            },
+        ),
+        migrations.AddField(
+            model_name='facialdata',
+            name='emotion_code',
+            field=models.ForeignKey(db_column='emotion_code', null=True, on_delete=django.db.models.deletion.PROTECT, to='coreapi.emotion'),
+        ),
+        migrations.AddField(
+            model_name='emotiondailyrollup',
+            name='emotion_code',
+            field=models.ForeignKey(db_column='emotion_code', null=True, on_delete=django.db.models.deletion.PROTECT, to='coreapi.emotion'),
+        ),
+    ]
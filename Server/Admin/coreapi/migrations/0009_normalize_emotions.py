@@ -0,0 +1,68 @@
+# Generated by Django 5.2.3 on 2026-10-18 13:00
+
+from django.db import migrations
+from django.db.models.functions import Lower, Trim
+
+MILD_EMOTIONS = ["happy", "content", "neutral"]
+SEVERE_EMOTIONS = ["sad", "angry", "depressed", "furious", "fearful", "anxious", "stressed", "overwhelmed"]
+DEFAULT_COLOR = "#778899"
+EMOTION_COLORS = {
+    "happy": "#FFD700", "joyful": "#FFD700", "excited": "#FF8C00", "content": "#98FB98",
+    "grateful": "#FFA07A", "hopeful": "#87CEFA", "sad": "#4682B4", "depressed": "#1E90FF",
+    "lonely": "#6495ED", "angry": "#DC143C", "furious": "#B22222", "frustrated": "#CD5C5C",
+    "fearful": "#9370DB", "anxious": "#9932CC", "stressed": "#FF6347", "overwhelmed": "#FF4500",
+    "surprised": "#FFA500", "shocked": "#FF4500", "disgusted": "#2E8B57", "neutral": "#778899",
+    "tired": "#A9A9A9", "confused": "#DAA520",
+}
+
+
+def intensity_of(name):
+    if name in MILD_EMOTIONS:
+        return "mild"
+    if name in SEVERE_EMOTIONS:
+        return "severe"
+    return "moderate"
+
+
+def normalize_emotions(apps, schema_editor):
+    """Seed the vocabulary, then point every facial row and rollup at its emotion's code."""
+    Emotion = apps.get_model('coreapi', 'Emotion')
+    FacialData = apps.get_model('coreapi', 'FacialData')
+    EmotionDailyRollup = apps.get_model('coreapi', 'EmotionDailyRollup')
+
+    facial = FacialData.objects.annotate(normalized=Lower(Trim('emotion')))
+    rollups = EmotionDailyRollup.objects.annotate(normalized=Lower(Trim('emotion')))
+    names = set(EMOTION_COLORS) | set(MILD_EMOTIONS) | set(SEVERE_EMOTIONS)
+    names |= set(facial.values_list('normalized', flat=True).distinct())
+    names |= set(rollups.values_list('normalized', flat=True).distinct())
+    for name in sorted(names):
+        emotion, _ = Emotion.objects.get_or_create(
+            name=name, defaults={"intensity": intensity_of(name), "color": EMOTION_COLORS.get(name, DEFAULT_COLOR)}
+        )
+        facial.filter(normalized=name).update(emotion_code=emotion.id)
+        rollups.filter(normalized=name).update(emotion_code=emotion.id)
+
+    # Names that only differed in case or spacing now share a code; merge their rollup rows
+    seen = {}
+    for row in EmotionDailyRollup.objects.order_by('id'):
+        key = (row.user_id, row.local_day, row.emotion_code_id)
+        kept = seen.get(key)
+        if kept is None:
+            seen[key] = row
+            continue
+        kept.mild += row.mild
+        kept.moderate += row.moderate
+        kept.severe += row.severe
+        kept.save(update_fields=['mild', 'moderate', 'severe'])
+        row.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coreapi', '0008_emotion'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_emotions, migrations.RunPython.noop),
+    ]
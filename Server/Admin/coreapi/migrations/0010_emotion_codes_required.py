@@ -0,0 +1,36 @@
+# Generated by Django 5.2.3 on 2026-10-18 13:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coreapi', '0009_normalize_emotions'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='emotiondailyrollup',
+            name='uniq_rollup_user_day_emotion',
+        ),
+        migrations.RemoveField(
+            model_name='emotiondailyrollup',
+            name='emotion',
+        ),
+        migrations.AlterField(
+            model_name='emotiondailyrollup',
+            name='emotion_code',
+            field=models.ForeignKey(db_column='emotion_code', on_delete=django.db.models.deletion.PROTECT, to='coreapi.emotion'),
+        ),
+        migrations.AlterField(
+            model_name='facialdata',
+            name='emotion_code',
+            field=models.ForeignKey(db_column='emotion_code', on_delete=django.db.models.deletion.PROTECT, to='coreapi.emotion'),
+        ),
+        migrations.AddConstraint(
+            model_name='emotiondailyrollup',
+            constraint=models.UniqueConstraint(fields=('user', 'local_day', 'emotion_code'), name='uniq_rollup_user_day_emotion'),
+        ),
+    ]
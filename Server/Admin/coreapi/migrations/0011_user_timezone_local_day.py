@@ -0,0 +1,55 @@
+# Generated by Django 5.2.3 on 2026-10-18 15:00
+
+from zoneinfo import ZoneInfo
+
+from django.db import migrations, models
+
+
+def fill_local_days(apps, schema_editor):
+    """Stamp existing detections with their calendar day in the owner's timezone."""
+    EmotionDetection = apps.get_model('coreapi', 'EmotionDetection')
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            "UPDATE emotion_detections d SET local_day = (d.timestamp AT TIME ZONE u.timezone)::date "
+            "FROM sessions s JOIN users u ON u.id = s.user_id WHERE s.id = d.session_id"
+        )
+        return
+
+    zones = {}
+    batch = []
+    detections = EmotionDetection.objects.select_related('session__user').only('id', 'timestamp', 'session__user__timezone')
+    for detection in detections.iterator(chunk_size=1000):
+        name = detection.session.user.timezone
+        zone = zones.setdefault(name, ZoneInfo(name))
+        detection.local_day = detection.timestamp.astimezone(zone).date()
+        batch.append(detection)
+        if len(batch) == 1000:
+            EmotionDetection.objects.bulk_update(batch, ['local_day'])
+            batch = []
+    if batch:
+        EmotionDetection.objects.bulk_update(batch, ['local_day'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coreapi', '0010_emotion_codes_required'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='timezone',
+            field=models.CharField(db_default='Asia/Manila', default='Asia/Manila', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='emotiondetection',
+            name='local_day',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.RunPython(fill_local_days, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='emotiondetection',
+            index=models.Index(fields=['session', 'local_day'], name='detections_session_day_idx'),
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.2.3 on 2026-10-18 16:00
+
+from django.db import migrations, models
+
+COLUMNS = """
+    id bigint NOT NULL,
+    session_id integer NOT NULL,
+    user_id integer NOT NULL,
+    "timestamp" timestamp with time zone NOT NULL,
+    local_day date,
+    crisis_flag boolean NOT NULL DEFAULT false,
+    emotion text,
+    emotion_code smallint,
+    voice_content text,
+    acknowledgment text,
+    suggestions {json},
+    urls {json},
+    PRIMARY KEY (id, "timestamp")
+"""
+
+
+def create_archive_table(apps, schema_editor):
+    """Create detection_archive; on PostgreSQL it is partitioned by month of the detection timestamp."""
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            "CREATE TABLE detection_archive (" + COLUMNS.format(json="jsonb") + ') PARTITION BY RANGE ("timestamp")'
+        )
+    else:
+        schema_editor.execute("CREATE TABLE detection_archive (" + COLUMNS.format(json="text") + ")")
+    schema_editor.execute('CREATE INDEX detection_archive_user_time_idx ON detection_archive (user_id, "timestamp")')
+
+
+def drop_archive_table(apps, schema_editor):
+    schema_editor.execute("DROP TABLE detection_archive")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coreapi', '0011_user_timezone_local_day'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='emotiondetection',
+            index=models.Index(fields=['timestamp'], name='detections_timestamp_idx'),
+        ),
+        migrations.CreateModel(
+            name='DetectionArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('session_id', models.IntegerField()),
+                ('user_id', models.IntegerField()),
+                ('timestamp', models.DateTimeField()),
+                ('local_day', models.DateField(null=True)),
+                ('crisis_flag', models.BooleanField(default=False)),
+                ('emotion', models.TextField(null=True)),
+                ('emotion_code', models.SmallIntegerField(null=True)),
+                ('voice_content', models.TextField(null=True)),
+                ('acknowledgment', models.TextField(null=True)),
+                ('suggestions', models.JSONField(null=True)),
+                ('urls', models.JSONField(null=True)),
+            ],
+            options={
+                'db_table': 'detection_archive',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(create_archive_table, drop_archive_table),
+    ]
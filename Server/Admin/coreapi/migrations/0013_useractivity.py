@@ -0,0 +1,50 @@
+# Generated by Django 5.2.3 on 2026-10-18 17:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max, Min
+
+
+def fill_activity(apps, schema_editor):
+    """One summary row per user with sessions, from the sessions and detections tables."""
+    Session = apps.get_model('coreapi', 'Session')
+    EmotionDetection = apps.get_model('coreapi', 'EmotionDetection')
+    UserActivity = apps.get_model('coreapi', 'UserActivity')
+
+    last_ids = dict(
+        EmotionDetection.objects.values('session__user_id').annotate(last=Max('id')).values_list('session__user_id', 'last')
+    )
+    UserActivity.objects.bulk_create([
+        UserActivity(
+            user_id=row['user_id'],
+            session_count=row['count'],
+            first_session_at=row['first'],
+            last_session_at=row['last'],
+            last_detection_id=last_ids.get(row['user_id'])
+        )
+        for row in Session.objects.values('user_id').annotate(count=Count('id'), first=Min('start_time'), last=Max('start_time'))
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coreapi', '0012_detection_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserActivity',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='coreapi.user')),
+                ('session_count', models.IntegerField(default=0)),
+                ('first_session_at', models.DateTimeField(blank=True, null=True)),
+                ('last_session_at', models.DateTimeField(blank=True, null=True)),
+                ('last_detection_id', models.IntegerField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'user_activity',
+            },
+        ),
+        migrations.RunPython(fill_activity, migrations.RunPython.noop),
+    ]
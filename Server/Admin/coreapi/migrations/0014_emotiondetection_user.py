@@ -0,0 +1,30 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_session_users(apps, schema_editor):
+    """Give every existing detection the user of its session."""
+    EmotionDetection = apps.get_model('coreapi', 'EmotionDetection')
+    Session = apps.get_model('coreapi', 'Session')
+    EmotionDetection.objects.filter(user__isnull=True).update(
+        user_id=Subquery(Session.objects.filter(id=OuterRef('session_id')).values('user_id')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coreapi', '0013_useractivity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='emotiondetection',
+            name='user',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, to='coreapi.user'),
+        ),
+        migrations.RunPython(copy_session_users, migrations.RunPython.noop),
+    ]
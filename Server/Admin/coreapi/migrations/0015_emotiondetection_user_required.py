@@ -0,0 +1,31 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coreapi', '0014_emotiondetection_user'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='emotiondetection',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='coreapi.user'),
+        ),
+        migrations.RemoveIndex(
+            model_name='emotiondetection',
+            name='detections_session_day_idx',
+        ),
+        migrations.AddIndex(
+            model_name='emotiondetection',
+            index=models.Index(fields=['user', 'timestamp'], name='detections_user_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='emotiondetection',
+            index=models.Index(fields=['user', 'local_day'], name='detections_user_day_idx'),
+        ),
+    ]
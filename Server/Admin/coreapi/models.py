@@ -15,6 +15,7 @@ class User(models.Model):
     role = models.TextField()
     status = models.CharField(max_length=15, choices=Status.choices, default=Status.INACTIVE)
     created_at = models.DateTimeField(auto_now_add=True)
+    timezone = models.CharField(max_length=64, default="Asia/Manila", db_default="Asia/Manila")
 
     class Meta:
         db_table = "users"
@@ -30,17 +31,39 @@ class Session(models.Model):
 
     class Meta:
         db_table = "sessions"
+        indexes = [
+            models.Index(fields=["user", "-start_time", "-id"], name="sessions_user_start_idx"),
+        ]
 
 class EmotionDetection(models.Model):
     session = models.ForeignKey(Session, on_delete=models.CASCADE)
+    # Covered by detections_user_time_idx
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False)
     timestamp = models.DateTimeField(auto_now_add=True)
+    crisis_flag = models.BooleanField(default=False, db_default=False, db_index=True)
+    local_day = models.DateField(null=True, blank=True)
 
     class Meta:
         db_table = "emotion_detections"
+        indexes = [
+            models.Index(fields=["user", "timestamp"], name="detections_user_time_idx"),
+            models.Index(fields=["user", "local_day"], name="detections_user_day_idx"),
+            models.Index(fields=["timestamp"], name="detections_timestamp_idx"),
+        ]
+
+class Emotion(models.Model):
+    id = models.SmallAutoField(primary_key=True)
+    name = models.TextField(unique=True)
+    intensity = models.CharField(max_length=10, default="moderate")
+    color = models.CharField(max_length=7, default="#778899")
+
+    class Meta:
+        db_table = "emotions"
 
 class FacialData(models.Model):
     detection = models.ForeignKey(EmotionDetection, on_delete=models.CASCADE)
     emotion = models.TextField()
+    emotion_code = models.ForeignKey(Emotion, on_delete=models.PROTECT, db_column="emotion_code")
 
     class Meta:
         db_table = "facial_data"
@@ -64,10 +87,61 @@ class WellnessSuggestion(models.Model):
     detection = models.ForeignKey(EmotionDetection, on_delete=models.CASCADE)
     suggestion = models.TextField()
     url = models.TextField()
+    acknowledgment = models.TextField(blank=True, default="")
+    suggestions = models.JSONField(default=list)
+    summary = models.TextField(null=True, blank=True)
+    urls = models.JSONField(default=list)
 
     class Meta:
         db_table = "wellness_suggestions"
 
+class DetectionArchive(models.Model):
+    """Detections older than the retention period, one flat row each.
+
+    The table is created by migration 0012 and is range-partitioned by month on
+    PostgreSQL; archive_detections fills it and creates the partitions.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    session_id = models.IntegerField()
+    user_id = models.IntegerField()
+    timestamp = models.DateTimeField()
+    local_day = models.DateField(null=True)
+    crisis_flag = models.BooleanField(default=False)
+    emotion = models.TextField(null=True)
+    emotion_code = models.SmallIntegerField(null=True)
+    voice_content = models.TextField(null=True)
+    acknowledgment = models.TextField(null=True)
+    suggestions = models.JSONField(null=True)
+    urls = models.JSONField(null=True)
+
+    class Meta:
+        db_table = "detection_archive"
+        managed = False
+
+class UserActivity(models.Model):
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True)
+    session_count = models.IntegerField(default=0)
+    first_session_at = models.DateTimeField(null=True, blank=True)
+    last_session_at = models.DateTimeField(null=True, blank=True)
+    last_detection_id = models.IntegerField(null=True, blank=True)
+
+    class Meta:
+        db_table = "user_activity"
+
+class EmotionDailyRollup(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    local_day = models.DateField()
+    emotion_code = models.ForeignKey(Emotion, on_delete=models.PROTECT, db_column="emotion_code")
+    mild = models.IntegerField(default=0)
+    moderate = models.IntegerField(default=0)
+    severe = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = "emotion_daily_rollups"
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'local_day', 'emotion_code'], name='uniq_rollup_user_day_emotion'),
+        ]
+
 class CommunityPost(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     content = models.TextField()
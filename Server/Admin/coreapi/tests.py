@@ -1,3 +1,43 @@
+import shutil
+import tempfile
+from io import StringIO
+from pathlib import Path
+
+import pyarrow.dataset as ds
+from django.core.management import call_command
 from django.test import TestCase
 
-# Create your tests here.
+from coreapi.models import Emotion, EmotionDetection, FacialData, Session, User, VoiceData
+
+
+class ExportDetectionsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(email="a@example.com", password="x", first_name="A", last_name="B", role="user")
+        self.session = Session.objects.create(user=self.user)
+        self.sad, _ = Emotion.objects.get_or_create(name="sad")
+        self.output = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.output)
+
+    def check_in(self, text):
+        detection = EmotionDetection.objects.create(session=self.session, user=self.user)
+        FacialData.objects.create(detection=detection, emotion="sad", emotion_code=self.sad)
+        VoiceData.objects.create(detection=detection, content=text)
+        return detection.id
+
+    def export(self, *args):
+        call_command("export_detections", "--output", str(self.output), *args, stdout=StringIO())
+        return sorted(ds.dataset(self.output / "detections", format="parquet", partitioning="hive")
+                      .to_table().column("detection_id").to_pylist())
+
+    def test_incremental_then_full_export(self):
+        first = [self.check_in("Long day"), self.check_in("Tired")]
+        self.assertEqual(self.export(), first)
+
+        # The next run only writes the new detection
+        second = self.check_in("Better now")
+        self.assertEqual(self.export(), first + [second])
+        self.assertEqual(len(list((self.output / "detections").rglob("part-*.parquet"))), 2)
+
+        # A full export replaces the files instead of adding overlapping ones
+        self.assertEqual(self.export("--full"), first + [second])
+        self.assertEqual(len(list((self.output / "detections").rglob("part-*.parquet"))), 1)
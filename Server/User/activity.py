@@ -0,0 +1,108 @@
+# activity.py
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import case, func, select, update
+from sqlalchemy.orm import Session
+from database import dialect_insert
+from models import Session as SessionModel, EmotionDetection, UserActivity
+
+
+def get_activity(db: Session, user_id: int) -> Optional[UserActivity]:
+    return db.get(UserActivity, user_id)
+
+
+def session_count(db: Session, user_id: int) -> int:
+    activity = get_activity(db, user_id)
+    return activity.session_count if activity else 0
+
+
+def record_session_start(db: Session, user_id: int, start_time: datetime):
+    """Count a new session in the user's summary with one upsert. The caller commits."""
+    table = UserActivity.__table__
+    stmt = dialect_insert(db)(table).values(
+        user_id=user_id, session_count=1, first_session_at=start_time, last_session_at=start_time
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.user_id],
+        set_={
+            "session_count": table.c.session_count + 1,
+            "first_session_at": case(
+                (table.c.first_session_at.is_(None) | (stmt.excluded.first_session_at < table.c.first_session_at), stmt.excluded.first_session_at),
+                else_=table.c.first_session_at
+            ),
+            "last_session_at": case(
+                (table.c.last_session_at.is_(None) | (stmt.excluded.last_session_at > table.c.last_session_at), stmt.excluded.last_session_at),
+                else_=table.c.last_session_at
+            )
+        }
+    )
+    db.execute(stmt)
+
+
+def record_detection_id(db: Session, user_id: int, detection_id: int):
+    """Move the user's last_detection_id forward. The caller commits.
+
+    It only ever grows, also when sessions are deleted, so it works as a version for caches.
+    """
+    db.execute(
+        update(UserActivity).where(
+            UserActivity.user_id == user_id,
+            (UserActivity.last_detection_id.is_(None)) | (UserActivity.last_detection_id < detection_id)
+        ).values(last_detection_id=detection_id),
+        execution_options={"synchronize_session": False}
+    )
+
+
+def record_session_delete(db: Session, user_id: int):
+    """Take a deleted session out of the summary; run after the session row is gone. The caller commits.
+
+    The first/last times are re-read from sessions_user_start_idx, one index probe each.
+    """
+    first = select(func.min(SessionModel.start_time)).where(SessionModel.user_id == user_id).scalar_subquery()
+    last = select(func.max(SessionModel.start_time)).where(SessionModel.user_id == user_id).scalar_subquery()
+    db.execute(
+        update(UserActivity).where(UserActivity.user_id == user_id).values(
+            session_count=UserActivity.session_count - 1,
+            first_session_at=first,
+            last_session_at=last
+        ),
+        execution_options={"synchronize_session": False}
+    )
+
+
+def rebuild_activity(db: Session, user_id: Optional[int] = None) -> int:
+    """Recompute summaries from the sessions and detections tables. Returns the number of rows written."""
+    sessions = db.query(
+        SessionModel.user_id, func.count(), func.min(SessionModel.start_time), func.max(SessionModel.start_time)
+    ).group_by(SessionModel.user_id)
+    detections = db.query(EmotionDetection.user_id, func.max(EmotionDetection.id)).group_by(EmotionDetection.user_id)
+    cleanup = db.query(UserActivity)
+    if user_id is not None:
+        sessions = sessions.filter(SessionModel.user_id == user_id)
+        detections = detections.filter(EmotionDetection.user_id == user_id)
+        cleanup = cleanup.filter(UserActivity.user_id == user_id)
+    last_ids = dict(detections.all())
+    rows = [
+        {"user_id": owner_id, "session_count": count, "first_session_at": first, "last_session_at": last, "last_detection_id": last_ids.get(owner_id)}
+        for owner_id, count, first, last in sessions.all()
+    ]
+    cleanup.delete(synchronize_session=False)
+    if rows:
+        db.execute(UserActivity.__table__.insert(), rows)
+    db.commit()
+    return len(rows)
+
+
+if __name__ == "__main__":
+    import argparse
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Rebuild the per-user activity summaries from the sessions table")
+    parser.add_argument("--user-id", type=int, default=None, help="Only rebuild this user's summary")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        print(f"Rebuilt {rebuild_activity(db, args.user_id)} activity summaries")
+    finally:
+        db.close()
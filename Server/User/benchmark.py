@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Round-trip benchmarks for the User API data paths, run against an in-memory SQLite database
+and, for the LLM providers, a local OpenRouter-style HTTP server.
+
+Usage: python benchmark.py [name ...]
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from database import Base
+from models import User, Session as SessionModel, EmotionDetection, FacialData, VoiceData, WellnessSuggestion
+from checkins import save_check_in, save_check_in_batch
+from rollups import DEFAULT_TZ, record_detection, local_day_of
+from emotions import emotion_code
+from session_queries import load_session_history, serialize_session_history
+import requests
+from llm import FakeProvider, OpenRouterProvider, complete_with_fallback
+
+
+class RoundTrips:
+    """Counts statements and commits sent to the database."""
+
+    def __init__(self, engine):
+        self.statements = 0
+        self.commits = 0
+        event.listen(engine, "before_cursor_execute", self._on_statement)
+        event.listen(engine, "commit", self._on_commit)
+
+    def _on_statement(self, *args):
+        self.statements += 1
+
+    def _on_commit(self, *args):
+        self.commits += 1
+
+    def reset(self):
+        self.statements = 0
+        self.commits = 0
+
+
+def make_db():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine, autoflush=False)()
+    user = User(email="bench@example.com", password="x", first_name="Bench", last_name="User", role="user", status="active")
+    db.add(user)
+    db.commit()
+    # Warm the emotion vocabulary the way a running process would have it
+    emotion_code(db, "sad")
+    return db, RoundTrips(engine), user.id
+
+
+def legacy_check_in(db, user_id, session_id, emotion, voice_content, suggestions_list, url_field):
+    """The process_emotion write sequence before it became a single unit of work."""
+    now = datetime.now(DEFAULT_TZ)
+    detection = EmotionDetection(session_id=session_id, user_id=user_id, timestamp=now)
+    db.add(detection)
+    db.commit()
+    db.refresh(detection)
+    facial = FacialData(detection_id=detection.id, emotion=emotion, emotion_code=emotion_code(db, emotion))
+    db.add(facial)
+    record_detection(db, user_id, local_day_of(detection.timestamp), facial.emotion_code)
+    db.commit()
+    db.refresh(facial)
+    voice = VoiceData(detection_id=detection.id, content=voice_content)
+    db.add(voice)
+    db.commit()
+    db.refresh(voice)
+    suggestion = WellnessSuggestion(detection_id=detection.id, suggestion='\n'.join(['- ' + s for s in suggestions_list]), url=url_field)
+    db.add(suggestion)
+    db.commit()
+    db.refresh(suggestion)
+    session = db.query(SessionModel).filter(SessionModel.id == session_id, SessionModel.user_id == user_id).first()
+    if session and not session.end_time:
+        session.end_time = now
+        db.commit()
+
+
+def bench_check_in(runs=200):
+    """Round trips per process_emotion check-in, before and after the single-transaction rewrite."""
+    suggestions = ["I hear you.", "Breathe slowly.", "Take a walk.", "Call a friend.", "Rest."]
+    urls = ["https://www.reddit.com/r/Anxiety/"]
+    for label in ("legacy", "unit of work"):
+        db, trips, user_id = make_db()
+        session_ids = []
+        for _ in range(runs):
+            session = SessionModel(user_id=user_id, start_time=datetime.now(DEFAULT_TZ))
+            db.add(session)
+            db.flush()
+            session_ids.append(session.id)
+        db.commit()
+        trips.reset()
+        started = time.perf_counter()
+        for session_id in session_ids:
+            if label == "legacy":
+                legacy_check_in(db, user_id, session_id, "Sad", "Long day at work", suggestions, urls[0])
+            else:
+                save_check_in(db, user_id, session_id, "Sad", "Long day at work", suggestions, urls)
+        elapsed = time.perf_counter() - started
+        print(f"check_in [{label}]: {trips.statements / runs:.1f} statements, "
+              f"{trips.commits / runs:.1f} commits, {elapsed / runs * 1000:.2f} ms per check-in")
+        db.close()
+
+
+def bench_batch_check_in(sizes=(1, 50, 500)):
+    """Offline replay: one save_check_in per item versus one save_check_in_batch call."""
+    for size in sizes:
+        for label in ("one by one", "batch"):
+            db, trips, user_id = make_db()
+            session = SessionModel(user_id=user_id, start_time=datetime.now(DEFAULT_TZ))
+            db.add(session)
+            db.commit()
+            session_id = session.id
+            items = [
+                {"session_id": session_id, "emotion": "Sad", "voice_content": f"entry {i}", "timestamp": datetime.now(DEFAULT_TZ)}
+                for i in range(size)
+            ]
+            trips.reset()
+            started = time.perf_counter()
+            if label == "batch":
+                save_check_in_batch(db, user_id, items)
+            else:
+                for item in items:
+                    save_check_in(db, user_id, session_id, item["emotion"], item["voice_content"], timestamp=item["timestamp"])
+            elapsed = time.perf_counter() - started
+            print(f"batch_check_in [{size:>3} items, {label}]: {trips.statements} statements, "
+                  f"{trips.commits} commits, {elapsed * 1000:.2f} ms total")
+            db.close()
+
+
+def legacy_session_history(db, session_id, user_id):
+    """The get_session_history lookups before eager loading: three queries per detection."""
+    session = db.query(SessionModel).filter(SessionModel.id == session_id, SessionModel.user_id == user_id).first()
+    rows = []
+    for det in db.query(EmotionDetection).filter(EmotionDetection.session_id == session.id).all():
+        rows.append((
+            det,
+            db.query(FacialData).filter(FacialData.detection_id == det.id).first(),
+            db.query(VoiceData).filter(VoiceData.detection_id == det.id).first(),
+            db.query(WellnessSuggestion).filter(WellnessSuggestion.detection_id == det.id).first()
+        ))
+    return rows
+
+
+def bench_session_history(sizes=(10, 200, 800), runs=5):
+    """Statements and time to load one session's history, per-detection lookups versus eager loading."""
+    for size in sizes:
+        db, trips, user_id = make_db()
+        session = SessionModel(user_id=user_id, start_time=datetime.now(DEFAULT_TZ))
+        db.add(session)
+        db.commit()
+        session_id = session.id
+        save_check_in_batch(db, user_id, [
+            {"session_id": session_id, "emotion": "Sad", "voice_content": f"entry {i}", "timestamp": datetime.now(DEFAULT_TZ)}
+            for i in range(size)
+        ])
+        for label in ("per detection", "eager"):
+            db.expunge_all()
+            trips.reset()
+            started = time.perf_counter()
+            for _ in range(runs):
+                if label == "eager":
+                    serialize_session_history(db, load_session_history(db, session_id, user_id))
+                else:
+                    legacy_session_history(db, session_id, user_id)
+                db.expunge_all()
+            elapsed = time.perf_counter() - started
+            print(f"session_history [{size:>3} detections, {label}]: {trips.statements / runs:.0f} statements, "
+                  f"{elapsed / runs * 1000:.2f} ms per request")
+        db.close()
+
+
+class StandInChatHandler(BaseHTTPRequestHandler):
+    """Answers every chat completion at once with the same reply, so only client overhead is measured."""
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out as separate writes; without this, kept-alive requests stall on delayed ACKs
+    disable_nagle_algorithm = True
+    reply = json.dumps({"choices": [{"message": {"content": "Take a slow breath."}}]}).encode()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(self.reply)))
+        self.end_headers()
+        self.wfile.write(self.reply)
+
+    def log_message(self, *args):
+        pass
+
+
+def legacy_openrouter_call(api_url, prompt):
+    """The provider call before it kept a pool: a new connection per request."""
+    data = {"model": "openai/gpt-4o", "messages": [{"role": "user", "content": prompt}]}
+    resp = requests.post(api_url, headers={"Content-Type": "application/json"}, data=json.dumps(data), timeout=30)
+    resp.raise_for_status()
+    return resp.json()["choices"][0]["message"]["content"].strip()
+
+
+def bench_llm_overhead(runs=300):
+    """Per-call client overhead against a stand-in server that answers instantly."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInChatHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    api_url = f"http://127.0.0.1:{server.server_port}/chat"
+    pooled = OpenRouterProvider(api_url, "key")
+    calls = {
+        "new connection per call": lambda: legacy_openrouter_call(api_url, "prompt"),
+        "pooled provider": lambda: complete_with_fallback("prompt", [pooled]),
+        "fake provider": lambda: complete_with_fallback("prompt", [FakeProvider()]),
+    }
+    for label, call in calls.items():
+        call()
+        started = time.perf_counter()
+        for _ in range(runs):
+            call()
+        elapsed = time.perf_counter() - started
+        print(f"llm_overhead [{label}]: {elapsed / runs * 1000:.3f} ms per call")
+    pooled.close()
+    server.shutdown()
+
+
+BENCHMARKS = {
+    "check_in": bench_check_in,
+    "batch_check_in": bench_batch_check_in,
+    "session_history": bench_session_history,
+    "llm_overhead": bench_llm_overhead,
+}
+
+
+if __name__ == "__main__":
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        BENCHMARKS[name]()
@@ -0,0 +1,201 @@
+# charts.py
+from datetime import date, datetime, timedelta
+from typing import List, Optional
+from zoneinfo import ZoneInfo
+import numpy as np
+from fastapi import HTTPException
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session
+from models import DetectionArchive, EmotionDailyRollup, EmotionDetection, FacialData
+from rollups import DEFAULT_TZ
+from emotions import INTENSITIES, vocabulary_for
+
+# Windows aggregated in NumPy and downsampled to at most MAX_CHART_POINTS points
+LONG_WINDOWS = {'quarter': 90, 'year': 365, 'all': None}
+MAX_CHART_POINTS = 120
+
+
+def chart_window(window: str, zone: ZoneInfo):
+    """Return (since, days) for a chart window, with days in the given timezone."""
+    now = datetime.now(zone)
+    if window == 'day':
+        since = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        days = [since.date()]
+    elif window == '3days':
+        since = now - timedelta(days=3)
+        days = [(since + timedelta(days=i)).date() for i in range(4)]
+    elif window == 'week':
+        monday = now - timedelta(days=now.weekday())
+        days = [(monday + timedelta(days=i)).date() for i in range(7)]
+        since = monday.replace(hour=0, minute=0, second=0, microsecond=0)
+    elif window == 'month':
+        since = now - timedelta(days=30)
+        days = [(since + timedelta(days=i)).date() for i in range(31)]
+    elif window in LONG_WINDOWS:
+        # Points are laid out by get_long_range_chart_rows; 'all' starts at the first detection
+        span = LONG_WINDOWS[window]
+        since = None if span is None else (now - timedelta(days=span)).replace(hour=0, minute=0, second=0, microsecond=0)
+        days = []
+    else:
+        raise HTTPException(status_code=400, detail="Invalid window")
+    return since, days
+
+
+def _rollup_day_counts(db: Session, user_id: int, since_day: date):
+    """Per (day, emotion) counts from the rollup table, already bucketed in the user's timezone."""
+    return db.query(
+        EmotionDailyRollup.local_day.label("day"),
+        EmotionDailyRollup.emotion_code.label("emotion"),
+        EmotionDailyRollup.mild.label("mild"),
+        EmotionDailyRollup.moderate.label("moderate"),
+        EmotionDailyRollup.severe.label("severe"),
+        (EmotionDailyRollup.mild + EmotionDailyRollup.moderate + EmotionDailyRollup.severe).label("total")
+    ).filter(
+        EmotionDailyRollup.user_id == user_id,
+        EmotionDailyRollup.local_day >= since_day
+    )
+
+
+def get_daily_chart_rows(db: Session, user_id: int, since: datetime, zone: ZoneInfo, user_zone: ZoneInfo = DEFAULT_TZ) -> dict:
+    """Map day -> (dominant_emotion, {mild, moderate, severe}).
+
+    Days in the user's own timezone come straight from the rollup table with one grouped
+    query, and the database picks the per-day mode. The rollups cannot be re-bucketed into
+    any other timezone, so those days come from the detections, bucketed in NumPy like the
+    long-range windows. Either way ties go to the lowest emotion code.
+    """
+    if zone.key != user_zone.key:
+        n_days = (datetime.now(zone).date() - since.astimezone(zone).date()).days + 1
+        return get_long_range_chart_rows(db, user_id, since, zone, max_points=max(n_days, 1))[0]
+
+    counts = _rollup_day_counts(db, user_id, since.date()).subquery()
+    ranked = db.query(
+        *counts.c,
+        func.row_number().over(
+            partition_by=counts.c.day,
+            order_by=(counts.c.total.desc(), counts.c.emotion)
+        ).label("rank")
+    ).subquery()
+    rows = db.query(
+        ranked.c.day,
+        func.max(case((ranked.c.rank == 1, ranked.c.emotion))),
+        *[func.sum(ranked.c[name]) for name in INTENSITIES]
+    ).group_by(ranked.c.day).all()
+
+    name_of = vocabulary_for(db, {row[1] for row in rows}).name_of
+    result = {}
+    for day, dominant_code, mild, moderate, severe in rows:
+        if isinstance(day, str):
+            day = date.fromisoformat(day)
+        result[day] = (name_of[dominant_code], {"mild": int(mild), "moderate": int(moderate), "severe": int(severe)})
+    return result
+
+
+def load_detection_arrays(db: Session, user_id: int, since: Optional[datetime]):
+    """The user's hot and archived detections as columns: (epoch seconds, emotion codes).
+
+    The archive is filtered on its partition key, so windows inside the retention
+    period only scan the partitions they overlap.
+    """
+    hot = db.query(
+        func.extract('epoch', EmotionDetection.timestamp),
+        FacialData.emotion_code
+    ).join(
+        FacialData, FacialData.detection_id == EmotionDetection.id
+    ).filter(EmotionDetection.user_id == user_id)
+    archived = db.query(
+        func.extract('epoch', DetectionArchive.timestamp),
+        DetectionArchive.emotion_code
+    ).filter(
+        DetectionArchive.user_id == user_id,
+        DetectionArchive.emotion_code.isnot(None)
+    )
+    if since is not None:
+        hot = hot.filter(EmotionDetection.timestamp >= since)
+        archived = archived.filter(DetectionArchive.timestamp >= since)
+    rows = hot.union_all(archived).all()
+    if not rows:
+        return np.empty(0, dtype=np.float64), np.empty(0, dtype=np.intp)
+    epochs, codes = zip(*rows)
+    return np.array(epochs, dtype=np.float64), np.array(codes, dtype=np.intp)
+
+
+def _point_starts(n_days: int, max_points: int) -> np.ndarray:
+    """Day index each point starts at, merging consecutive days once there are too many to plot."""
+    if n_days <= max_points:
+        return np.arange(n_days)
+    _, starts = np.unique(np.arange(n_days) * max_points // n_days, return_index=True)
+    return starts
+
+
+def get_long_range_chart_rows(db: Session, user_id: int, since: Optional[datetime], zone: ZoneInfo, max_points: int = MAX_CHART_POINTS):
+    """Return (rows, days) like get_daily_chart_rows for quarter/year/all windows.
+
+    Detections are bucketed into local days with one searchsorted over the day edges,
+    counted per (point, emotion code) with one bincount, and days beyond max_points are
+    merged into evenly sized points. Each entry of days is the first day of its point.
+    Ties go to the lowest emotion code, as in get_daily_chart_rows.
+    """
+    epochs, codes = load_detection_arrays(db, user_id, since)
+    today = datetime.now(zone).date()
+    if since is not None:
+        first_day = since.astimezone(zone).date()
+    elif len(epochs):
+        first_day = datetime.fromtimestamp(epochs.min(), zone).date()
+    else:
+        first_day = today
+    n_days = (today - first_day).days + 1
+    days = [first_day + timedelta(days=i) for i in range(n_days)]
+    starts = _point_starts(n_days, max_points)
+    point_days = [days[i] for i in starts]
+    if not len(epochs):
+        return {}, point_days
+
+    # Local midnights as epochs, so DST changes keep days aligned to the calendar
+    edges = np.array([datetime(d.year, d.month, d.day, tzinfo=zone).timestamp() for d in days], dtype=np.float64)
+    day_index = np.searchsorted(edges, epochs, side='right') - 1
+    keep = day_index >= 0
+    day_index, codes = day_index[keep], codes[keep]
+
+    point_index = np.searchsorted(starts, day_index, side='right') - 1
+    vocabulary = vocabulary_for(db, np.unique(codes).tolist())
+    n_points, n_emotions = len(starts), int(codes.max()) + 1 if len(codes) else 1
+    counts = np.bincount(point_index * n_emotions + codes, minlength=n_points * n_emotions).reshape(n_points, n_emotions)
+
+    # Codes the user never used fall in the 'moderate' column with zero counts
+    intensity_of = np.array([INTENSITIES.index(vocabulary.intensity_of.get(code, "moderate")) for code in range(n_emotions)])
+    tallies = np.stack([counts[:, intensity_of == i].sum(axis=1) for i in range(len(INTENSITIES))], axis=1)
+    dominant = counts.argmax(axis=1)
+    totals = counts.sum(axis=1)
+
+    rows = {}
+    for i in np.flatnonzero(totals):
+        rows[point_days[i]] = (vocabulary.name_of[int(dominant[i])], {name: int(tallies[i, k]) for k, name in enumerate(INTENSITIES)})
+    return rows, point_days
+
+
+def get_chart_rows(db: Session, user_id: int, window: str, zone: ZoneInfo, user_zone: ZoneInfo = DEFAULT_TZ):
+    """Return (rows, days) for any chart window, ready for the build_* functions."""
+    since, days = chart_window(window, zone)
+    if window in LONG_WINDOWS:
+        return get_long_range_chart_rows(db, user_id, since, zone)
+    return get_daily_chart_rows(db, user_id, since, zone, user_zone), days
+
+
+def build_intensity_chart(daily: dict, days: List[date]) -> list:
+    chart = []
+    for day in days:
+        dominant_emotion, intensity_tally = daily.get(day, (None, {"mild": 0, "moderate": 0, "severe": 0}))
+        chart.append({
+            "day": str(day),
+            "dominant_emotion": dominant_emotion,
+            "intensity_tally": intensity_tally
+        })
+    return chart
+
+
+def build_dominant_emotion_chart(daily: dict, days: List[date]) -> list:
+    return [
+        {"day": str(day), "dominant_emotion": daily.get(day, (None, None))[0]}
+        for day in days
+    ]
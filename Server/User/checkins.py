@@ -0,0 +1,221 @@
+# checkins.py
+from datetime import datetime
+from typing import List, Optional, Tuple
+from zoneinfo import ZoneInfo
+from sqlalchemy import case, delete, func, insert, select, update
+from sqlalchemy.orm import Session
+from models import Session as SessionModel, DetectionArchive, EmotionDetection, FacialData, Feedback, VoiceData, WellnessSuggestion
+from rollups import DEFAULT_TZ, record_detection, record_detections, remove_detections, local_day_of
+from crisis import is_crisis_check_in
+from emotions import emotion_code, emotion_codes
+from activity import record_detection_id, record_session_delete
+
+
+def parse_suggestion_text(suggestion_text: str) -> Tuple[List[str], List[str]]:
+    """Split a model reply into (up to 5 bullet suggestions, up to 5 Reddit/Quora URLs)."""
+    # Parse bullet suggestions and URLs (split by lines)
+    lines = [l.strip() for l in suggestion_text.split('\n') if l.strip()]
+    suggestions_list = []
+    urls_list = []
+    for line in lines:
+        if line.startswith('- ') or line.startswith('• '):
+            suggestions_list.append(line[2:].strip())
+        elif line.startswith('http'):
+            urls_list.append(line)
+    # Fallback: If no suggestions found, take lines before first URL (up to 5)
+    if not suggestions_list:
+        for line in lines:
+            if line.startswith('http'):
+                break
+            suggestions_list.append(line)
+            if len(suggestions_list) == 5:
+                break
+    # Only keep up to 5 suggestions and 5 URLs
+    suggestions_list = suggestions_list[:5]
+    # Only keep Reddit/Quora URLs
+    urls_list = [u for u in urls_list if ('reddit.com' in u or 'quora.com' in u)][:5]
+    return suggestions_list, urls_list
+
+
+def summarize_suggestion(suggestion: str) -> str:
+    if not suggestion:
+        return None
+    # Try to get the first sentence
+    for sep in [".", "!", "?"]:
+        if sep in suggestion:
+            first_sentence = suggestion.split(sep)[0].strip()
+            if first_sentence:
+                return first_sentence
+    # If no sentence-ending punctuation, return first 6 words
+    words = suggestion.split()
+    return " ".join(words[:6]) + ("..." if len(words) > 6 else "")
+
+
+def suggestion_fields(suggestions_list: List[str], urls_list: Optional[List[str]]) -> dict:
+    """Column values for a WellnessSuggestion, parsed once here so read paths never split strings.
+
+    suggestion/url keep the legacy bullet text and comma-joined URLs for older readers.
+    The first bullet is the acknowledgment, the rest are the suggestions.
+    """
+    text = '\n'.join(['- ' + s for s in suggestions_list])
+    bullets = [b for b in (s.lstrip('-*• ').strip() for s in suggestions_list) if b]
+    urls = [u.strip() for u in urls_list or [] if u.strip()]
+    return {
+        "suggestion": text,
+        "url": ','.join(urls) if urls else None,
+        "acknowledgment": bullets[0] if bullets else "",
+        "suggestions": bullets[1:],
+        "summary": summarize_suggestion(text.split('•')[0].strip()),
+        "urls": urls
+    }
+
+
+def save_suggestion(db: Session, detection_id: int, suggestions_list: List[str], urls_list: List[str]):
+    """Add the suggestion row for a detection. The caller commits."""
+    db.add(WellnessSuggestion(detection_id=detection_id, **suggestion_fields(suggestions_list, urls_list)))
+
+
+def save_check_in(
+    db: Session,
+    user_id: int,
+    session_id: int,
+    emotion: str,
+    voice_content: str,
+    suggestions_list: Optional[List[str]] = None,
+    urls_list: Optional[List[str]] = None,
+    timestamp: Optional[datetime] = None,
+    zone: ZoneInfo = DEFAULT_TZ
+) -> Optional[int]:
+    """Store one check-in as a single unit of work and return the new detection id.
+
+    The owning session is closed with one UPDATE, which also checks that it belongs to
+    the user; then the detection and its facial/voice/suggestion rows are flushed together
+    and the rollup and activity summary are bumped, all under one commit. Returns None,
+    writing nothing, when the user has no such session.
+    Pass suggestions_list=None to store the check-in without a suggestion.
+    zone is the user's timezone; it fixes the detection's local_day.
+    """
+    timestamp = timestamp or datetime.now(zone)
+    # End the session automatically; a session that already ended keeps its end time
+    closed = db.execute(
+        update(SessionModel).where(
+            SessionModel.id == session_id,
+            SessionModel.user_id == user_id
+        ).values(end_time=func.coalesce(SessionModel.end_time, timestamp)),
+        execution_options={"synchronize_session": False}
+    )
+    if closed.rowcount == 0:
+        db.rollback()
+        return None
+
+    local_day = local_day_of(timestamp, zone)
+    code = emotion_code(db, emotion)
+    detection = EmotionDetection(
+        session_id=session_id,
+        user_id=user_id,
+        timestamp=timestamp,
+        local_day=local_day,
+        crisis_flag=is_crisis_check_in(emotion, voice_content)
+    )
+    detection.facial_data.append(FacialData(emotion=emotion, emotion_code=code))
+    detection.voice_data.append(VoiceData(content=voice_content))
+    if suggestions_list is not None:
+        detection.wellness_suggestions.append(WellnessSuggestion(**suggestion_fields(suggestions_list, urls_list)))
+    db.add(detection)
+    db.flush()
+    detection_id = detection.id
+
+    record_detection(db, user_id, local_day, code)
+    record_detection_id(db, user_id, detection_id)
+    db.commit()
+    return detection_id
+
+
+def save_check_in_batch(db: Session, user_id: int, items: List[dict], zone: ZoneInfo = DEFAULT_TZ) -> List[int]:
+    """Store many check-ins with bulk inserts under one commit and return their detection ids in order.
+
+    Each item holds session_id, emotion, voice_content and timestamp. The caller checks that the
+    sessions belong to the user. Suggestions are left to the job workers.
+    """
+    if not items:
+        return []
+    codes = emotion_codes(db, [item["emotion"] for item in items])
+    local_days = [local_day_of(item["timestamp"], zone) for item in items]
+    detection_ids = db.execute(
+        insert(EmotionDetection).returning(EmotionDetection.id, sort_by_parameter_order=True),
+        [
+            {
+                "session_id": item["session_id"],
+                "user_id": user_id,
+                "timestamp": item["timestamp"],
+                "local_day": local_day,
+                "crisis_flag": is_crisis_check_in(item["emotion"], item["voice_content"])
+            }
+            for item, local_day in zip(items, local_days)
+        ]
+    ).scalars().all()
+    db.execute(insert(FacialData), [
+        {"detection_id": detection_id, "emotion": item["emotion"], "emotion_code": code}
+        for detection_id, item, code in zip(detection_ids, items, codes)
+    ])
+    db.execute(insert(VoiceData), [
+        {"detection_id": detection_id, "content": item["voice_content"]}
+        for detection_id, item in zip(detection_ids, items)
+    ])
+    record_detections(db, user_id, list(zip(local_days, codes)))
+    record_detection_id(db, user_id, max(detection_ids))
+
+    # Close each session at its latest replayed check-in
+    session_ends = {}
+    for item in items:
+        current = session_ends.get(item["session_id"])
+        if current is None or item["timestamp"] > current:
+            session_ends[item["session_id"]] = item["timestamp"]
+    db.execute(
+        update(SessionModel).where(
+            SessionModel.id.in_(list(session_ends)),
+            SessionModel.user_id == user_id,
+            SessionModel.end_time.is_(None)
+        ).values(end_time=case(session_ends, value=SessionModel.id)),
+        execution_options={"synchronize_session": False}
+    )
+    db.commit()
+    return detection_ids
+
+
+def delete_session_cascade(db: Session, user_id: int, session_id: int) -> bool:
+    """Delete a session of the user with everything hanging off it, in one transaction.
+
+    Children go with set-based DELETEs keyed on the session, so the statement count
+    does not depend on how many check-ins the session holds; nothing is loaded into
+    the identity map. The session's detections are taken back out of the rollups and
+    the session out of the activity summary.
+    Returns False when the user has no such session.
+    """
+    owned = db.query(SessionModel.id).filter(SessionModel.id == session_id, SessionModel.user_id == user_id).first()
+    if owned is None:
+        return False
+
+    detection_ids = select(EmotionDetection.id).where(EmotionDetection.session_id == session_id).scalar_subquery()
+    hot = db.query(EmotionDetection.local_day, FacialData.emotion_code, func.count()).join(
+        FacialData, FacialData.detection_id == EmotionDetection.id
+    ).filter(EmotionDetection.session_id == session_id).group_by(EmotionDetection.local_day, FacialData.emotion_code)
+    archived = db.query(DetectionArchive.local_day, DetectionArchive.emotion_code, func.count()).filter(
+        DetectionArchive.session_id == session_id,
+        DetectionArchive.user_id == user_id,
+        DetectionArchive.emotion_code.isnot(None)
+    ).group_by(DetectionArchive.local_day, DetectionArchive.emotion_code)
+    remove_detections(db, user_id, hot.union_all(archived).all())
+
+    for model in (FacialData, VoiceData, WellnessSuggestion):
+        db.execute(delete(model).where(model.detection_id.in_(detection_ids)), execution_options={"synchronize_session": False})
+    db.execute(delete(EmotionDetection).where(EmotionDetection.session_id == session_id), execution_options={"synchronize_session": False})
+    db.execute(
+        delete(DetectionArchive).where(DetectionArchive.session_id == session_id, DetectionArchive.user_id == user_id),
+        execution_options={"synchronize_session": False}
+    )
+    db.execute(delete(Feedback).where(Feedback.session_id == session_id), execution_options={"synchronize_session": False})
+    db.execute(delete(SessionModel).where(SessionModel.id == session_id), execution_options={"synchronize_session": False})
+    record_session_delete(db, user_id)
+    db.commit()
+    return True
@@ -31,6 +31,33 @@ class Settings(BaseSettings):
     gemini_api_key: str = os.getenv("GEMINI_API_KEY")
     gemini_api_url: str = os.getenv("GEMINI_API_URL")
 
+    # LLM provider: "gemini" (with OpenRouter fallback) or "fake" for offline runs
+    llm_provider: str = os.getenv("LLM_PROVIDER", "gemini")
+    # Kept-alive connections per HTTP provider; at least the number of job workers
+    llm_pool_size: int = int(os.getenv("LLM_POOL_SIZE", 10))
+    # Threads that may call a model at once: the API's sync threadpool (40) plus the job workers
+    llm_concurrent_callers: int = int(os.getenv("LLM_CONCURRENT_CALLERS", 40 + int(os.getenv("JOB_WORKERS", 4))))
+    # Seconds a request may spend on the model, fallbacks included, and how long the current
+    # provider may stay quiet before the next one is started alongside it (0 turns hedging off)
+    llm_deadline_seconds: float = float(os.getenv("LLM_DEADLINE_SECONDS", 12))
+    llm_hedge_after_seconds: float = float(os.getenv("LLM_HEDGE_AFTER_SECONDS", 0))
+    # Failures in a row before a provider is skipped, and how long it is skipped for
+    llm_breaker_failures: int = int(os.getenv("LLM_BREAKER_FAILURES", 5))
+    llm_breaker_reset_seconds: float = float(os.getenv("LLM_BREAKER_RESET_SECONDS", 30))
+
+    # Suggestion jobs: "redis" queue, or "local" for a single process. JOB_WORKERS=0 leaves
+    # the work to a separate `python jobs.py` process.
+    job_queue_backend: str = os.getenv("JOB_QUEUE_BACKEND", "redis")
+    job_workers: int = int(os.getenv("JOB_WORKERS", 4))
+    job_result_ttl_seconds: int = int(os.getenv("JOB_RESULT_TTL_SECONDS", 60 * 60))
+
+    # Diagnosis result cache
+    diagnosis_cache_ttl_seconds: int = int(os.getenv("DIAGNOSIS_CACHE_TTL_SECONDS", 6 * 60 * 60))
+
+    # Suggestion cache: entries kept per process (0 turns the local tier off) and lifetime in both tiers
+    suggestion_cache_size: int = int(os.getenv("SUGGESTION_CACHE_SIZE", 1000))
+    suggestion_cache_ttl_seconds: int = int(os.getenv("SUGGESTION_CACHE_TTL_SECONDS", 24 * 60 * 60))
+
     class Config:
         env_file = ".env"
         case_sensitive = False
@@ -0,0 +1,100 @@
+import os
+import pytest
+
+# The app reads its settings at import time; point it at SQLite so modules import without a .env
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+
+
+class DictRedis:
+    """The few Redis commands the caches and the job queue use, kept in a dict.
+
+    Expiry is not simulated; tests drop keys themselves to stand in for it.
+    """
+
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value, ex=None):
+        self.values[key] = str(value)
+
+    def incr(self, key):
+        self.values[key] = str(int(self.values.get(key, 0)) + 1)
+        return int(self.values[key])
+
+    def expire(self, key, seconds):
+        return key in self.values
+
+    def exists(self, key):
+        return int(key in self.values)
+
+    def delete(self, *keys):
+        for key in keys:
+            self.values.pop(key, None)
+
+    def hset(self, key, mapping):
+        self.values.setdefault(key, {}).update({field: str(value) for field, value in mapping.items()})
+
+    def hgetall(self, key):
+        return dict(self.values.get(key, {}))
+
+    def sadd(self, key, *members):
+        self.values.setdefault(key, set()).update(members)
+
+    def srem(self, key, *members):
+        self.values.get(key, set()).difference_update(members)
+
+    def smembers(self, key):
+        return set(self.values.get(key, set()))
+
+    def lpush(self, key, *items):
+        for item in items:
+            self.values.setdefault(key, []).insert(0, item)
+
+    def lrange(self, key, start, end):
+        items = self.values.get(key, [])
+        return items[start:] if end == -1 else items[start:end + 1]
+
+    def lrem(self, key, count, item):
+        items = self.values.get(key, [])
+        if item in items:
+            items.remove(item)
+            return 1
+        return 0
+
+    def lmove(self, source, destination, src, dest):
+        items = self.values.get(source)
+        if not items:
+            return None
+        item = items.pop(0 if src == "LEFT" else -1)
+        target = self.values.setdefault(destination, [])
+        target.insert(0 if dest == "LEFT" else len(target), item)
+        return item
+
+    def blmove(self, source, destination, timeout, src, dest):
+        return self.lmove(source, destination, src, dest)
+
+    def pipeline(self):
+        return DictPipeline(self)
+
+
+class DictPipeline:
+    """Queues commands and runs them against the DictRedis on execute()."""
+
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.commands.append((getattr(self.client, name), args, kwargs))
+
+    def execute(self):
+        return [command(*args, **kwargs) for command, args, kwargs in self.commands]
+
+
+@pytest.fixture
+def fake_redis():
+    return DictRedis()
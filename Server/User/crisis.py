@@ -0,0 +1,54 @@
+# crisis.py
+import re
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from models import EmotionDetection, FacialData, VoiceData
+
+# Keyword stems, matched from the start of a word so inflections still count ("suicidal",
+# "self-harming", "worthlessness") while words that merely contain a keyword ("studied") do not.
+# "die" is too short a stem for that, so it only takes the -d and -s endings.
+CRISIS_STEMS = [
+    r"die[ds]?\b", r"suicid\w*", r"kill(?:s|ed|ing)?\s+myself", r"end(?:s|ed|ing)?\s+my\s+life",
+    r"self[-\s]?harm\w*", r"hurt(?:s|ing)?\s+myself", r"give\s+up", r"worthless\w*", r"no\s+way\s+out"
+]
+
+# One pass over the text for every stem
+CRISIS_PATTERN = re.compile(r"\b(?:" + "|".join(CRISIS_STEMS) + ")", re.IGNORECASE)
+
+
+def contains_suicidal_keywords(text: str) -> bool:
+    return bool(text) and CRISIS_PATTERN.search(text) is not None
+
+
+def is_crisis_check_in(emotion: str, voice_content: str) -> bool:
+    """Whether a check-in should be flagged, decided once when it is stored."""
+    return contains_suicidal_keywords(voice_content) or contains_suicidal_keywords(emotion)
+
+
+def backfill_crisis_flags(db: Session) -> int:
+    """Flag detections stored before the crisis flag existed. Returns the number flagged."""
+    rows = db.query(EmotionDetection.id, FacialData.emotion, VoiceData.content).outerjoin(
+        FacialData, FacialData.detection_id == EmotionDetection.id
+    ).outerjoin(
+        VoiceData, VoiceData.detection_id == EmotionDetection.id
+    ).filter(EmotionDetection.crisis_flag.is_(False))
+
+    flagged = {detection_id for detection_id, emotion, content in rows.yield_per(1000) if is_crisis_check_in(emotion, content)}
+    ids = list(flagged)
+    for start in range(0, len(ids), 1000):
+        db.execute(
+            update(EmotionDetection).where(EmotionDetection.id.in_(ids[start:start + 1000])).values(crisis_flag=True),
+            execution_options={"synchronize_session": False}
+        )
+    db.commit()
+    return len(ids)
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        print(f"Flagged {backfill_crisis_flags(db)} detections")
+    finally:
+        db.close()
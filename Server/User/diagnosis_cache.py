@@ -0,0 +1,91 @@
+# diagnosis_cache.py
+import json
+from datetime import date
+from typing import Optional
+from sqlalchemy.orm import Session
+from config import settings
+from activity import get_activity
+from redis_client import get_sync_redis
+import metrics
+
+
+def _latest_key(user_id: int) -> str:
+    return f"diagnosis:latest:{user_id}"
+
+
+def _generation_key(user_id: int) -> str:
+    return f"diagnosis:generation:{user_id}"
+
+
+def _entry_key(client, user_id: int, window: str, since_day: date, latest_id: int) -> str:
+    # invalidate_user bumps the generation, which retires every entry of the user at once
+    generation = client.get(_generation_key(user_id)) or 0
+    return f"diagnosis:{user_id}:{generation}:{window}:{since_day}:{latest_id}"
+
+
+def latest_detection_id(db: Session, user_id: int) -> int:
+    """Id of the user's newest detection, as recorded by process_emotion (falls back to the activity summary)."""
+    try:
+        cached = get_sync_redis().get(_latest_key(user_id))
+        if cached is not None:
+            return int(cached)
+    except Exception as e:
+        print(f"Diagnosis cache unavailable: {e}")
+    activity = get_activity(db, user_id)
+    latest = (activity.last_detection_id if activity else None) or 0
+    try:
+        get_sync_redis().set(_latest_key(user_id), latest, ex=settings.diagnosis_cache_ttl_seconds)
+    except Exception:
+        pass
+    return latest
+
+
+def get_cached_diagnosis(user_id: int, window: str, since_day: date, latest_id: int) -> Optional[dict]:
+    try:
+        client = get_sync_redis()
+        payload = client.get(_entry_key(client, user_id, window, since_day, latest_id))
+    except Exception as e:
+        print(f"Diagnosis cache unavailable: {e}")
+        payload = None
+    if payload is None:
+        metrics.increment("diagnosis_cache_miss")
+        return None
+    metrics.increment("diagnosis_cache_hit")
+    return json.loads(payload)
+
+
+def store_diagnosis(user_id: int, window: str, since_day: date, latest_id: int, result: dict):
+    try:
+        client = get_sync_redis()
+        client.set(
+            _entry_key(client, user_id, window, since_day, latest_id),
+            json.dumps(result),
+            ex=settings.diagnosis_cache_ttl_seconds
+        )
+        # The generation must outlive the entries carrying it, or a counter that expired
+        # and was bumped again could bring an old entry back
+        client.expire(_generation_key(user_id), settings.diagnosis_cache_ttl_seconds)
+    except Exception as e:
+        print(f"Diagnosis cache unavailable: {e}")
+
+
+def note_new_detection(user_id: int, detection_id: int):
+    """Move the user's cache version forward; entries for older detections are never read again."""
+    try:
+        get_sync_redis().set(_latest_key(user_id), detection_id, ex=settings.diagnosis_cache_ttl_seconds)
+    except Exception as e:
+        print(f"Diagnosis cache unavailable: {e}")
+
+
+def invalidate_user(user_id: int):
+    """Retire every cached diagnosis for the user, e.g. after detections were deleted.
+
+    Bumps the user's generation instead of scanning the keyspace; the old entries simply expire.
+    """
+    try:
+        client = get_sync_redis()
+        client.incr(_generation_key(user_id))
+        client.expire(_generation_key(user_id), settings.diagnosis_cache_ttl_seconds)
+        client.delete(_latest_key(user_id))
+    except Exception as e:
+        print(f"Diagnosis cache unavailable: {e}")
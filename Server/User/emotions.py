@@ -0,0 +1,133 @@
+# emotions.py
+import threading
+import weakref
+from typing import Iterable, List
+from sqlalchemy.orm import Session
+from database import dialect_insert
+from models import Emotion
+
+INTENSITIES = ["mild", "moderate", "severe"]
+MILD_EMOTIONS = ["happy", "content", "neutral"]
+SEVERE_EMOTIONS = ["sad", "angry", "depressed", "furious", "fearful", "anxious", "stressed", "overwhelmed"]
+DEFAULT_COLOR = "#778899"
+
+# Enhanced emotion color mapping with more nuanced emotions
+EMOTION_COLORS = {
+    # Positive emotions
+    "happy": "#FFD700",  # Gold
+    "joyful": "#FFD700",
+    "excited": "#FF8C00",  # Dark orange
+    "content": "#98FB98",  # Pale green
+    "grateful": "#FFA07A",  # Light salmon
+    "hopeful": "#87CEFA",  # Light sky blue
+    
+    # Negative emotions
+    "sad": "#4682B4",    # Steel blue
+    "depressed": "#1E90FF",  # Dodger blue
+    "lonely": "#6495ED",  # Cornflower blue
+    "angry": "#DC143C",  # Crimson
+    "furious": "#B22222",  # Firebrick
+    "frustrated": "#CD5C5C",  # Indian red
+    "fearful": "#9370DB", # Medium purple
+    "anxious": "#9932CC",  # Dark orchid
+    "stressed": "#FF6347",  # Tomato
+    "overwhelmed": "#FF4500",  # Orange red
+    
+    # Neutral/other
+    "surprised": "#FFA500", # Orange
+    "shocked": "#FF4500",
+    "disgusted": "#2E8B57", # Sea green
+    "neutral": "#778899", # Light slate gray
+    "tired": "#A9A9A9",   # Dark gray
+    "confused": "#DAA520"   # Golden rod
+}
+
+# Names a check-in can add to the vocabulary. Anything else shares the "other" code, so
+# clients cannot grow the table (or use up the SmallInteger codes) with arbitrary strings.
+OTHER_EMOTION = "other"
+KNOWN_EMOTIONS = frozenset(EMOTION_COLORS) | frozenset(MILD_EMOTIONS) | frozenset(SEVERE_EMOTIONS) | {OTHER_EMOTION}
+
+
+def normalize_emotion(name: str) -> str:
+    return (name or "").strip().lower()
+
+
+def classify_intensity(emotion: str) -> str:
+    """Intensity given to an emotion when it first enters the vocabulary."""
+    if emotion in MILD_EMOTIONS:
+        return "mild"
+    if emotion in SEVERE_EMOTIONS:
+        return "severe"
+    return "moderate"
+
+
+class EmotionVocabulary:
+    """In-process snapshot of the emotions table."""
+
+    def __init__(self, rows):
+        self.code_of = {}
+        self.name_of = {}
+        self.intensity_of = {}
+        self.color_of = {}
+        for row in rows:
+            self.code_of[row.name] = row.id
+            self.name_of[row.id] = row.name
+            self.intensity_of[row.id] = row.intensity
+            self.color_of[row.id] = row.color
+
+    def color(self, name: str) -> str:
+        code = self.code_of.get(normalize_emotion(name))
+        return self.color_of[code] if code is not None else EMOTION_COLORS.get(normalize_emotion(name), DEFAULT_COLOR)
+
+
+# One snapshot per engine, so tests with their own databases never share codes
+_vocabularies = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+
+def get_vocabulary(db: Session, refresh: bool = False) -> EmotionVocabulary:
+    engine = db.get_bind()
+    vocabulary = None if refresh else _vocabularies.get(engine)
+    if vocabulary is None:
+        vocabulary = EmotionVocabulary(db.query(Emotion).all())
+        with _lock:
+            _vocabularies[engine] = vocabulary
+    return vocabulary
+
+
+def vocabulary_for(db: Session, codes: Iterable[int]) -> EmotionVocabulary:
+    """The vocabulary, refreshed if any of the codes read from the database is newer than the snapshot."""
+    vocabulary = get_vocabulary(db)
+    if any(code not in vocabulary.name_of for code in codes):
+        vocabulary = get_vocabulary(db, refresh=True)
+    return vocabulary
+
+
+def emotion_codes(db: Session, names: Iterable[str]) -> List[int]:
+    """Codes for the given emotion names, adding known names the vocabulary has not seen yet.
+
+    Names outside KNOWN_EMOTIONS keep a code they already have (older data was migrated
+    with its own names) and otherwise get the "other" code. The raw name stays in facial_data.
+    """
+    vocabulary = get_vocabulary(db)
+    names = [normalize_emotion(name) for name in names]
+    names = [name if name in vocabulary.code_of or name in KNOWN_EMOTIONS else OTHER_EMOTION for name in names]
+    missing = {name for name in names if name not in vocabulary.code_of}
+    if missing:
+        # Another process may have added them since the snapshot was taken
+        vocabulary = get_vocabulary(db, refresh=True)
+        missing = {name for name in missing if name not in vocabulary.code_of}
+    if missing:
+        stmt = dialect_insert(db)(Emotion).values([
+            {"name": name, "intensity": classify_intensity(name), "color": EMOTION_COLORS.get(name, DEFAULT_COLOR)}
+            for name in sorted(missing)
+        ]).on_conflict_do_nothing(index_elements=[Emotion.name])
+        # Committed on its own connection so a rollback of the caller cannot leave cached codes dangling
+        with db.get_bind().begin() as conn:
+            conn.execute(stmt)
+        vocabulary = get_vocabulary(db, refresh=True)
+    return [vocabulary.code_of[name] for name in names]
+
+
+def emotion_code(db: Session, name: str) -> int:
+    return emotion_codes(db, [name])[0]
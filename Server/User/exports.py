@@ -0,0 +1,103 @@
+# exports.py
+import csv
+import io
+import json
+from typing import Iterator
+from sqlalchemy.orm import Session
+from models import Session as SessionModel, DetectionArchive, Emotion, EmotionDetection, FacialData, VoiceData, WellnessSuggestion
+
+EXPORT_FIELDS = [
+    "session_id", "session_start", "session_end", "detection_id", "timestamp", "emotion", "intensity",
+    "crisis_flag", "voice_content", "acknowledgment", "suggestions", "urls"
+]
+EXPORT_BATCH_SIZE = 1000
+# Rows are sent to the client in chunks of about this many characters
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+
+def iter_export_rows(db: Session, user_id: int) -> Iterator[dict]:
+    """Every check-in of the user as a flat dict, oldest first, archived ones included.
+
+    Rows come off a server-side cursor EXPORT_BATCH_SIZE at a time, so memory use does
+    not depend on how much history the user has.
+    """
+    hot = db.query(
+        SessionModel.id, SessionModel.start_time, SessionModel.end_time,
+        EmotionDetection.id, EmotionDetection.timestamp, EmotionDetection.crisis_flag,
+        FacialData.emotion, Emotion.intensity, VoiceData.content,
+        WellnessSuggestion.acknowledgment, WellnessSuggestion.suggestions, WellnessSuggestion.urls
+    ).join(
+        EmotionDetection, EmotionDetection.session_id == SessionModel.id
+    ).outerjoin(
+        FacialData, FacialData.detection_id == EmotionDetection.id
+    ).outerjoin(
+        Emotion, Emotion.id == FacialData.emotion_code
+    ).outerjoin(
+        VoiceData, VoiceData.detection_id == EmotionDetection.id
+    ).outerjoin(
+        WellnessSuggestion, WellnessSuggestion.detection_id == EmotionDetection.id
+    ).filter(
+        SessionModel.user_id == user_id
+    )
+    # Archived rows are already flat, one per detection
+    archived = db.query(
+        SessionModel.id, SessionModel.start_time, SessionModel.end_time,
+        DetectionArchive.id, DetectionArchive.timestamp, DetectionArchive.crisis_flag,
+        DetectionArchive.emotion, Emotion.intensity, DetectionArchive.voice_content,
+        DetectionArchive.acknowledgment, DetectionArchive.suggestions, DetectionArchive.urls
+    ).join(
+        DetectionArchive, DetectionArchive.session_id == SessionModel.id
+    ).outerjoin(
+        Emotion, Emotion.id == DetectionArchive.emotion_code
+    ).filter(
+        SessionModel.user_id == user_id,
+        DetectionArchive.user_id == user_id
+    )
+    query = hot.union_all(archived).order_by(SessionModel.start_time, SessionModel.id, EmotionDetection.id)
+
+    for row in query.execution_options(stream_results=True).yield_per(EXPORT_BATCH_SIZE):
+        (session_id, start_time, end_time, detection_id, timestamp, crisis_flag,
+         emotion, intensity, voice_content, acknowledgment, suggestions, urls) = row
+        yield {
+            "session_id": session_id,
+            "session_start": start_time.isoformat() if start_time else None,
+            "session_end": end_time.isoformat() if end_time else None,
+            "detection_id": detection_id,
+            "timestamp": timestamp.isoformat() if timestamp else None,
+            "emotion": emotion,
+            "intensity": intensity,
+            "crisis_flag": bool(crisis_flag),
+            "voice_content": voice_content,
+            "acknowledgment": acknowledgment,
+            "suggestions": suggestions or [],
+            "urls": urls or []
+        }
+
+
+def ndjson_chunks(rows: Iterator[dict]) -> Iterator[str]:
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write(json.dumps(row) + "\n")
+        if buffer.tell() >= EXPORT_CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def csv_chunks(rows: Iterator[dict]) -> Iterator[str]:
+    """CSV with a header row; list columns are joined with ' | '."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+    writer.writeheader()
+    for row in rows:
+        row["suggestions"] = " | ".join(row["suggestions"])
+        row["urls"] = " | ".join(row["urls"])
+        writer.writerow(row)
+        if buffer.tell() >= EXPORT_CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+    if buffer.tell():
+        yield buffer.getvalue()
@@ -0,0 +1,241 @@
+# jobs.py
+import json
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Callable, Optional
+from config import settings
+from redis_client import get_sync_redis
+
+QUEUE_KEY = "jobs:suggestions"
+# Processing lists of every worker process, so stale ones can be found without SCAN
+PROCESSING_SET_KEY = "jobs:processing"
+# A worker process that has not dequeued for this long is presumed dead
+WORKER_TTL_SECONDS = 60
+REQUEUE_INTERVAL_SECONDS = 30
+
+
+def _job_key(job_id: str) -> str:
+    return f"job:{job_id}"
+
+
+def _processing_key(worker_id: str) -> str:
+    return f"jobs:processing:{worker_id}"
+
+
+def _heartbeat_key(worker_id: str) -> str:
+    return f"jobs:worker:{worker_id}"
+
+
+class LocalJobQueue:
+    """In-process queue, for tests and single-process development.
+
+    Jobs are forgotten ttl_seconds after they were queued or finished, like the Redis hashes.
+    """
+
+    def __init__(self, ttl_seconds: float = None):
+        self.ttl_seconds = settings.job_result_ttl_seconds if ttl_seconds is None else ttl_seconds
+        self._pending = queue.Queue()
+        # Ordered by expiry, since every write moves the job to the end with a fresh TTL
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _touch(self, job_id: str, job: dict):
+        job["expires_at"] = time.monotonic() + self.ttl_seconds
+        self._jobs[job_id] = job
+        self._jobs.move_to_end(job_id)
+        while self._jobs:
+            oldest = next(iter(self._jobs.values()))
+            if oldest["expires_at"] > time.monotonic():
+                break
+            self._jobs.popitem(last=False)
+
+    def enqueue(self, payload: dict, owner_id: int) -> str:
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._touch(job_id, {"status": "pending", "owner_id": owner_id, "result": None})
+        self._pending.put((job_id, payload))
+        return job_id
+
+    def dequeue(self, timeout: float):
+        try:
+            return self._pending.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def finish(self, job_id: str, status: str, result: dict):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                self._touch(job_id, dict(job, status=status, result=result))
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job["expires_at"] <= time.monotonic():
+                return None
+            return {key: value for key, value in job.items() if key != "expires_at"}
+
+
+class RedisJobQueue:
+    """Redis list of pending jobs plus one hash per job holding its status and result.
+
+    A dequeued job is moved atomically into this worker process's processing list and
+    only removed from it once finished. If the process dies first, its heartbeat expires
+    and any other worker moves the job back onto the queue, so jobs run at least once.
+    """
+
+    def __init__(self, client=None):
+        self.client = client or get_sync_redis()
+        self.worker_id = uuid.uuid4().hex
+        self.processing_key = _processing_key(self.worker_id)
+        self._claimed = {}
+        self._lock = threading.Lock()
+        self._next_requeue = 0.0
+
+    def enqueue(self, payload: dict, owner_id: int) -> str:
+        job_id = uuid.uuid4().hex
+        pipe = self.client.pipeline()
+        pipe.hset(_job_key(job_id), mapping={"status": "pending", "owner_id": owner_id})
+        pipe.expire(_job_key(job_id), settings.job_result_ttl_seconds)
+        pipe.lpush(QUEUE_KEY, json.dumps({"job_id": job_id, "payload": payload}))
+        pipe.execute()
+        return job_id
+
+    def dequeue(self, timeout: float):
+        self._heartbeat()
+        item = self.client.blmove(QUEUE_KEY, self.processing_key, max(1, int(timeout)), "RIGHT", "LEFT")
+        if item is None:
+            return None
+        job = json.loads(item)
+        with self._lock:
+            self._claimed[job["job_id"]] = item
+        return job["job_id"], job["payload"]
+
+    def finish(self, job_id: str, status: str, result: dict):
+        with self._lock:
+            item = self._claimed.pop(job_id, None)
+        pipe = self.client.pipeline()
+        pipe.hset(_job_key(job_id), mapping={"status": status, "result": json.dumps(result)})
+        pipe.expire(_job_key(job_id), settings.job_result_ttl_seconds)
+        if item is not None:
+            # Acknowledge: the job no longer needs to survive this process
+            pipe.lrem(self.processing_key, 1, item)
+        pipe.execute()
+
+    def _heartbeat(self):
+        now = time.monotonic()
+        with self._lock:
+            if now < self._next_requeue:
+                return
+            self._next_requeue = now + REQUEUE_INTERVAL_SECONDS
+        pipe = self.client.pipeline()
+        pipe.set(_heartbeat_key(self.worker_id), 1, ex=WORKER_TTL_SECONDS)
+        pipe.sadd(PROCESSING_SET_KEY, self.processing_key)
+        pipe.execute()
+        self.requeue_stale()
+
+    def requeue_stale(self) -> int:
+        """Move jobs held by worker processes whose heartbeat expired back onto the queue. Returns the number moved."""
+        moved = 0
+        for processing_key in self.client.smembers(PROCESSING_SET_KEY):
+            worker_id = processing_key.rsplit(":", 1)[1]
+            if self.client.exists(_heartbeat_key(worker_id)):
+                continue
+            # Back onto the consuming end, so they run next; newest first, so the oldest ends up in front
+            while self.client.lmove(processing_key, QUEUE_KEY, "LEFT", "RIGHT") is not None:
+                moved += 1
+            self.client.srem(PROCESSING_SET_KEY, processing_key)
+        if moved:
+            print(f"Re-queued {moved} jobs from stopped workers")
+        return moved
+
+    def get(self, job_id: str) -> Optional[dict]:
+        job = self.client.hgetall(_job_key(job_id))
+        if not job:
+            return None
+        return {
+            "status": job["status"],
+            "owner_id": int(job["owner_id"]),
+            "result": json.loads(job["result"]) if job.get("result") else None
+        }
+
+
+class WorkerPool:
+    """Threads that take jobs off a queue and run the handler on each payload."""
+
+    def __init__(self, job_queue, handler: Callable[[dict], dict], size: int = 4):
+        self.job_queue = job_queue
+        self.handler = handler
+        self.size = size
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        for i in range(self.size):
+            thread = threading.Thread(target=self._run, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                job = self.job_queue.dequeue(timeout=1.0)
+            except Exception as e:
+                print(f"Job queue unavailable: {e}")
+                self._stop.wait(1.0)
+                continue
+            if job is None:
+                continue
+            job_id, payload = job
+            try:
+                self.job_queue.finish(job_id, "done", self.handler(payload))
+            except Exception as e:
+                print(f"Job {job_id} failed: {e}")
+                self.job_queue.finish(job_id, "failed", {"error": str(e)})
+
+
+_job_queue = None
+_pool = None
+
+
+def get_job_queue():
+    global _job_queue
+    if _job_queue is None:
+        _job_queue = LocalJobQueue() if settings.job_queue_backend == "local" else RedisJobQueue()
+    return _job_queue
+
+
+def start_workers(handler: Callable[[dict], dict], size: int = None):
+    global _pool
+    if _pool is None:
+        _pool = WorkerPool(get_job_queue(), handler, size or settings.job_workers)
+        _pool.start()
+    return _pool
+
+
+def stop_workers():
+    global _pool
+    if _pool is not None:
+        _pool.stop()
+        _pool = None
+
+
+if __name__ == "__main__":
+    # Standalone worker process for the Redis queue: python jobs.py
+    from suggestions import run_suggestion_job
+
+    pool = start_workers(run_suggestion_job)
+    print(f"Suggestion workers running ({pool.size} threads). Press Ctrl+C to stop")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        stop_workers()
@@ -0,0 +1,403 @@
+# llm.py
+import json
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, Iterator, List, Optional
+import requests
+from requests.adapters import HTTPAdapter
+import google.generativeai as genai
+from config import settings
+import metrics
+
+SYSTEM_PROMPT = "You are a compassionate mental health assistant."
+UNAVAILABLE_MESSAGE = "AI awareness unavailable (OpenRouter fallback failed). Please try again later."
+STREAM_UNAVAILABLE_MESSAGE = "AI awareness unavailable. Please try again later."
+
+
+class StreamInterrupted(Exception):
+    """A provider failed after its first tokens were sent, so the streamed reply is incomplete."""
+
+
+class CircuitBreaker:
+    """Skips a provider after failure_threshold failures in a row.
+
+    Once open, the provider is left alone for reset_seconds; then one trial call is let
+    through, and its outcome closes the breaker again or keeps it open.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if self._trial or time.monotonic() - self.opened_at < self.reset_seconds:
+                return False
+            self._trial = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._trial = False
+
+    def release(self):
+        """End a call that finished without an outcome (cancelled, or a stream the client closed).
+
+        A trial call gives its slot back, so the next call can be the trial instead.
+        """
+        with self._lock:
+            self._trial = False
+
+
+def default_breaker() -> CircuitBreaker:
+    return CircuitBreaker(settings.llm_breaker_failures, settings.llm_breaker_reset_seconds)
+
+
+class GeminiProvider:
+    """Gemini 1.5 Flash. The SDK is configured and the model built once, then shared by every call."""
+    name = "gemini"
+
+    def __init__(self, api_key: str, model_name: str = 'gemini-1.5-flash', timeout: float = 30):
+        genai.configure(api_key=api_key)
+        self.model = genai.GenerativeModel(model_name)
+        self.timeout = timeout
+        self.breaker = default_breaker()
+
+    def complete(self, prompt: str) -> str:
+        return self.model.generate_content(prompt, request_options={"timeout": self.timeout}).text.strip()
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        for chunk in self.model.generate_content(prompt, stream=True, request_options={"timeout": self.timeout}):
+            if chunk.text:
+                yield chunk.text
+
+    def close(self):
+        pass
+
+
+class OpenRouterProvider:
+    """OpenRouter's GPT-4o, used as the fallback.
+
+    Requests go through one requests.Session, so connections are kept alive and
+    reused instead of paying a TCP and TLS handshake per call.
+    """
+    name = "openrouter"
+
+    def __init__(self, api_url: Optional[str], api_key: str, pool_size: int = 10, timeout: float = 30):
+        self.api_url = api_url or "https://openrouter.ai/api/v1/chat"
+        self.timeout = timeout
+        self.breaker = default_breaker()
+        self.http = requests.Session()
+        self.http.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+        self.http.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+        self.http.headers.update({
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json"
+        })
+
+    def _post(self, prompt: str, stream: bool):
+        data = {
+            "model": "openai/gpt-4o",
+            "stream": stream,
+            "messages": [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ]
+        }
+        return self.http.post(self.api_url, data=json.dumps(data), timeout=self.timeout, stream=stream)
+
+    def complete(self, prompt: str) -> str:
+        resp = self._post(prompt, stream=False)
+        resp.raise_for_status()
+        # OpenRouter returns choices[0].message.content
+        return resp.json()["choices"][0]["message"]["content"].strip()
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        with self._post(prompt, stream=True) as resp:
+            resp.raise_for_status()
+            for line in resp.iter_lines(decode_unicode=True):
+                # OpenRouter streams OpenAI-style "data: {...}" lines, ending with "data: [DONE]"
+                if not line or not line.startswith("data: "):
+                    continue
+                body = line[len("data: "):]
+                if body == "[DONE]":
+                    break
+                delta = json.loads(body)["choices"][0].get("delta", {}).get("content")
+                if delta:
+                    yield delta
+
+    def close(self):
+        self.http.close()
+
+
+class FakeProvider:
+    """Offline stand-in that streams a canned reply word by word, for tests and local runs.
+
+    delay is slept before each word, or before the whole reply for complete(); error makes
+    complete() raise it after the delay, to stand in for a provider that is down.
+    """
+    name = "fake"
+
+    def __init__(self, reply: str = None, delay: float = 0.0, error: Exception = None, name: str = "fake"):
+        self.reply = reply or "It appears you may be experiencing a mix of emotions. Consider talking to someone you trust."
+        self.delay = delay
+        self.error = error
+        self.name = name
+        self.breaker = default_breaker()
+
+    def complete(self, prompt: str) -> str:
+        if self.delay:
+            time.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return self.reply
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        words = self.reply.split(" ")
+        for i, word in enumerate(words):
+            if self.delay:
+                time.sleep(self.delay)
+            yield word if i == len(words) - 1 else word + " "
+
+    def close(self):
+        pass
+
+
+FAKE_SUGGESTION_REPLY = (
+    "- It makes sense to feel this way right now.\n"
+    "- Take three slow, deep breaths.\n"
+    "- Step outside for a short walk.\n"
+    "- Message someone you trust.\n"
+    "- Write down one small thing you can do next.\n"
+    "https://www.reddit.com/r/mentalhealth/"
+)
+
+
+def build_providers(backend: str) -> Dict[str, List]:
+    """Provider chains, in fallback order, for each use. LLM_PROVIDER=fake swaps in the offline provider."""
+    if backend == "fake":
+        return {"diagnosis": [FakeProvider()], "suggestion": [FakeProvider(reply=FAKE_SUGGESTION_REPLY)]}
+    # No single call may outlive the whole request budget
+    chain = [
+        GeminiProvider(settings.gemini_api_key, timeout=settings.llm_deadline_seconds),
+        OpenRouterProvider(
+            settings.openrouter_api_url, settings.openrouter_api_key,
+            pool_size=settings.llm_pool_size, timeout=settings.llm_deadline_seconds
+        )
+    ]
+    return {"diagnosis": chain, "suggestion": chain}
+
+
+_providers: Optional[Dict[str, List]] = None
+_providers_lock = threading.Lock()
+
+
+def init_providers(backend: str = None) -> Dict[str, List]:
+    """Build the shared providers; called once at startup. Replaces any existing ones."""
+    global _providers
+    with _providers_lock:
+        previous, _providers = _providers, build_providers(backend or settings.llm_provider)
+    if previous:
+        _close(previous)
+    return _providers
+
+
+def close_providers():
+    global _providers
+    with _providers_lock:
+        previous, _providers = _providers, None
+    if previous:
+        _close(previous)
+
+
+def _close(providers: Dict[str, List]):
+    for provider in {id(p): p for chain in providers.values() for p in chain}.values():
+        provider.close()
+
+
+def _get_providers() -> Dict[str, List]:
+    global _providers
+    # Processes that skip the app startup hook (python jobs.py, scripts) build them on first use
+    with _providers_lock:
+        if _providers is None:
+            _providers = build_providers(settings.llm_provider)
+        return _providers
+
+
+def get_diagnosis_providers() -> List:
+    return _get_providers()["diagnosis"]
+
+
+def get_suggestion_providers() -> List:
+    return _get_providers()["suggestion"]
+
+
+# Room for every concurrent caller to run its provider and a fallback or hedge at once,
+# so calls do not spend their deadline queued behind other requests
+_executor = ThreadPoolExecutor(max_workers=max(2, settings.llm_concurrent_callers * 2), thread_name_prefix="llm")
+
+
+def _breaker(provider) -> Optional[CircuitBreaker]:
+    return getattr(provider, "breaker", None)
+
+
+def _next_allowed(waiting: List):
+    """Pop providers off the list until one whose circuit breaker lets a call through."""
+    while waiting:
+        provider = waiting.pop(0)
+        breaker = _breaker(provider)
+        if breaker is None or breaker.allow():
+            return provider
+        print(f"{provider.name} skipped: circuit open")
+        metrics.increment("llm_breaker_skip")
+    return None
+
+
+def _call(provider, prompt: str) -> str:
+    breaker = _breaker(provider)
+    try:
+        reply = provider.complete(prompt)
+    except Exception as e:
+        print(f"{provider.name} failed: {e}")
+        if breaker:
+            breaker.record_failure()
+        raise
+    if breaker:
+        breaker.record_success()
+    return reply
+
+
+def complete_with_fallback(
+    prompt: str,
+    providers: List,
+    deadline: Optional[float] = None,
+    hedge_after: Optional[float] = None
+) -> str:
+    """Full reply from the first provider that answers within the deadline.
+
+    Providers whose circuit breaker is open are skipped without a call. A failure starts
+    the next provider right away; with hedge_after set, the next provider is also started
+    once the current one has been quiet that long, and whichever answers first wins.
+    deadline and hedge_after are in seconds and default to LLM_DEADLINE_SECONDS and
+    LLM_HEDGE_AFTER_SECONDS (0 turns hedging off).
+    """
+    deadline = settings.llm_deadline_seconds if deadline is None else deadline
+    hedge_after = settings.llm_hedge_after_seconds if hedge_after is None else hedge_after
+    give_up_at = time.monotonic() + deadline
+
+    waiting = list(providers)
+    running = {}
+    start_next = True
+    while True:
+        provider = _next_allowed(waiting) if start_next else None
+        if provider is not None:
+            running[_executor.submit(_call, provider, prompt)] = provider
+        start_next = False
+        remaining = give_up_at - time.monotonic()
+        if not running or remaining <= 0:
+            break
+        timeout = min(remaining, hedge_after) if hedge_after and waiting else remaining
+        done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+        if not done:
+            hedge = _next_allowed(waiting) if time.monotonic() < give_up_at else None
+            if hedge is not None:
+                print(f"Hedging with {hedge.name}")
+                metrics.increment("llm_hedged")
+                running[_executor.submit(_call, hedge, prompt)] = hedge
+            continue
+        for future in done:
+            running.pop(future)
+            if future.exception() is None:
+                _cancel_pending(running)
+                return future.result()
+        start_next = True
+
+    if running:
+        # Calls already running are left to finish in the background; they record their own outcome
+        print(f"LLM deadline of {deadline}s exceeded")
+        metrics.increment("llm_deadline_exceeded")
+        _cancel_pending(running)
+    return UNAVAILABLE_MESSAGE
+
+
+def _cancel_pending(running: dict):
+    """Drop calls still queued for a thread, so an answered or expired request spends no more provider calls."""
+    for future, provider in running.items():
+        if future.cancel():
+            breaker = _breaker(provider)
+            if breaker:
+                breaker.release()
+
+
+def stream_with_fallback(prompt: str, providers: List, deadline: Optional[float] = None) -> Iterator[str]:
+    """Stream from the first provider that produces output.
+
+    A provider that fails, or sends no first token within the deadline (seconds, defaulting
+    to LLM_DEADLINE_SECONDS), is skipped in favour of the next one. Once tokens have been
+    sent they cannot be taken back, so a failure raises StreamInterrupted instead.
+    Providers with an open circuit breaker are skipped.
+    """
+    deadline = settings.llm_deadline_seconds if deadline is None else deadline
+    for provider in providers:
+        breaker = _breaker(provider)
+        if breaker and not breaker.allow():
+            print(f"{provider.name} skipped: circuit open")
+            metrics.increment("llm_breaker_skip")
+            continue
+        started = False
+        succeeded = None
+        try:
+            tokens = iter(provider.stream(prompt))
+            # Wait for the first token on the pool, so a provider that hangs before answering can be left behind;
+            # it stops at its own request timeout
+            first = _executor.submit(next, tokens, None)
+            try:
+                token = first.result(timeout=deadline)
+            except TimeoutError:
+                if first.cancel():
+                    # Still queued for a thread, so the provider was never asked
+                    continue
+                metrics.increment("llm_first_token_timeout")
+                raise TimeoutError(f"no first token within {deadline}s")
+            while token is not None:
+                started = True
+                yield token
+                token = next(tokens, None)
+            succeeded = True
+            return
+        except Exception as e:
+            print(f"{provider.name} streaming failed: {e}")
+            succeeded = False
+            if started:
+                raise StreamInterrupted(provider.name) from e
+        finally:
+            # The client may close the stream mid-way (GeneratorExit); that says nothing about the provider
+            if breaker:
+                if succeeded is None:
+                    breaker.release()
+                elif succeeded:
+                    breaker.record_success()
+                else:
+                    breaker.record_failure()
+    yield STREAM_UNAVAILABLE_MESSAGE
+
+
+def sse_event(event: str, data) -> str:
+    """Format one Server-Sent Events frame."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
@@ -4,6 +4,11 @@ from fastapi.responses import JSONResponse
 from database import engine
 from models import Base
 from routers import auth, users, sessions, users_router, posts_router, comments_router
+import metrics
+import jobs
+import llm
+from config import settings
+from suggestions import run_suggestion_job
 
 # Removed table creation. Only Django manages tables.
 
@@ -32,6 +37,20 @@ app.include_router(posts_router, prefix="/api/v1")
 app.include_router(comments_router, prefix="/api/v1")
 
 
+@app.on_event("startup")
+def start_job_workers():
+    # Providers hold the HTTP connection pools, so they are built before the workers use them
+    llm.init_providers()
+    if settings.job_workers > 0:
+        jobs.start_workers(run_suggestion_job)
+
+
+@app.on_event("shutdown")
+def stop_job_workers():
+    jobs.stop_workers()
+    llm.close_providers()
+
+
 @app.get("/")
 async def root():
     """Root endpoint."""
@@ -49,6 +68,12 @@ async def health_check():
     return {"status": "healthy", "message": "API is running"}
 
 
+@app.get("/metrics")
+async def get_metrics():
+    """In-process counters for this worker."""
+    return metrics.snapshot()
+
+
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request, exc):
     """Global exception handler for HTTP exceptions."""
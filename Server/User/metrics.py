@@ -0,0 +1,22 @@
+import threading
+from collections import defaultdict
+
+# In-process counters, exposed at GET /metrics. Each worker reports its own numbers.
+_lock = threading.Lock()
+_counters = defaultdict(int)
+
+
+def increment(name: str, amount: int = 1):
+    with _lock:
+        _counters[name] += amount
+
+
+def snapshot() -> dict:
+    """Counters, plus a <name>_hit_ratio for every <name>_hit/<name>_miss pair."""
+    with _lock:
+        result = dict(_counters)
+    for name in [n for n in result if n.endswith("_hit")]:
+        prefix = name[:-len("_hit")]
+        total = result[name] + result.get(prefix + "_miss", 0)
+        result[prefix + "_hit_ratio"] = round(result[name] / total, 4) if total else 0.0
+    return result
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Date
+from sqlalchemy import Column, BigInteger, Integer, SmallInteger, String, Text, DateTime, Boolean, ForeignKey, Date, UniqueConstraint, Index, JSON
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
@@ -23,6 +24,8 @@ class User(Base):
     role = Column(Text, nullable=False)
     status = Column(String(15), default=UserStatus.INACTIVE)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # IANA name; decides where the user's days start and end
+    timezone = Column(String(64), nullable=False, default="Asia/Manila", server_default="Asia/Manila")
 
     # Relationships
     sessions = relationship("Session", back_populates="user")
@@ -45,12 +48,22 @@ class Session(Base):
     feedback = relationship("Feedback", back_populates="session")
 
 
+# Serves newest-first keyset pagination of a user's sessions
+Index("sessions_user_start_idx", Session.user_id, Session.start_time.desc(), Session.id.desc())
+
+
 class EmotionDetection(Base):
     __tablename__ = "emotion_detections"
 
     id = Column(Integer, primary_key=True, index=True)
     session_id = Column(Integer, ForeignKey("sessions.id"), nullable=False)
+    # Copied from the session at ingest so per-user window queries skip the sessions table
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     timestamp = Column(DateTime(timezone=True), server_default=func.now())
+    # Set at ingest when the check-in text matches a crisis keyword
+    crisis_flag = Column(Boolean, nullable=False, default=False, server_default="false", index=True)
+    # Calendar day of timestamp in the owner's timezone, stamped at ingest
+    local_day = Column(Date)
 
     # Relationships
     session = relationship("Session", back_populates="emotion_detections")
@@ -59,12 +72,28 @@ class EmotionDetection(Base):
     wellness_suggestions = relationship("WellnessSuggestion", back_populates="detection")
 
 
+Index("detections_user_time_idx", EmotionDetection.user_id, EmotionDetection.timestamp)
+Index("detections_user_day_idx", EmotionDetection.user_id, EmotionDetection.local_day)
+Index("detections_timestamp_idx", EmotionDetection.timestamp)
+
+
+class Emotion(Base):
+    """Canonical emotion vocabulary; the id is the small integer code stored on detections."""
+    __tablename__ = "emotions"
+
+    id = Column(SmallInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    name = Column(Text, nullable=False, unique=True)
+    intensity = Column(String(10), nullable=False, default="moderate")
+    color = Column(String(7), nullable=False, default="#778899")
+
+
 class FacialData(Base):
     __tablename__ = "facial_data"
 
     id = Column(Integer, primary_key=True, index=True)
     detection_id = Column(Integer, ForeignKey("emotion_detections.id"), nullable=False)
-    emotion = Column(Text, nullable=False)
+    emotion = Column(Text, nullable=False)  # As reported by the client, kept for display
+    emotion_code = Column(SmallInteger, ForeignKey("emotions.id"), nullable=False, index=True)
 
     # Relationships
     detection = relationship("EmotionDetection", back_populates="facial_data")
@@ -100,11 +129,67 @@ class WellnessSuggestion(Base):
     detection_id = Column(Integer, ForeignKey("emotion_detections.id"), nullable=False)
     suggestion = Column(Text, nullable=False)
     url = Column(Text, nullable=True)  # Comma-separated URLs (up to 3) for relevant Reddit/Quora discussions per suggestion
+    # Parsed once at write time (see checkins.suggestion_fields)
+    acknowledgment = Column(Text, nullable=False, default="")
+    suggestions = Column(JSON().with_variant(JSONB(), "postgresql"), nullable=False, default=list)
+    summary = Column(Text, nullable=True)
+    urls = Column(JSON().with_variant(JSONB(), "postgresql"), nullable=False, default=list)
 
     # Relationships
     detection = relationship("EmotionDetection", back_populates="wellness_suggestions")
 
 
+class DetectionArchive(Base):
+    """Detections past the retention period, flattened with their facial/voice/suggestion rows.
+
+    Created by the Admin migrations (partitioned by month on PostgreSQL) and filled by
+    its archive_detections command; read only where whole history is needed.
+    """
+    __tablename__ = "detection_archive"
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    timestamp = Column(DateTime(timezone=True), primary_key=True)
+    session_id = Column(Integer, nullable=False)
+    user_id = Column(Integer, nullable=False)
+    local_day = Column(Date)
+    crisis_flag = Column(Boolean, nullable=False, default=False)
+    emotion = Column(Text)
+    emotion_code = Column(SmallInteger)
+    voice_content = Column(Text)
+    acknowledgment = Column(Text)
+    suggestions = Column(JSON().with_variant(JSONB(), "postgresql"))
+    urls = Column(JSON().with_variant(JSONB(), "postgresql"))
+
+
+Index("detection_archive_user_time_idx", DetectionArchive.user_id, DetectionArchive.timestamp)
+
+
+class UserActivity(Base):
+    """Per-user counters kept in step with session and check-in writes, so reads skip the sessions table."""
+    __tablename__ = "user_activity"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    session_count = Column(Integer, nullable=False, default=0)
+    first_session_at = Column(DateTime(timezone=True))
+    last_session_at = Column(DateTime(timezone=True))
+    last_detection_id = Column(Integer)
+
+
+class EmotionDailyRollup(Base):
+    __tablename__ = "emotion_daily_rollups"
+    __table_args__ = (
+        UniqueConstraint("user_id", "local_day", "emotion_code", name="uniq_rollup_user_day_emotion"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    local_day = Column(Date, nullable=False)
+    emotion_code = Column(SmallInteger, ForeignKey("emotions.id"), nullable=False)
+    mild = Column(Integer, nullable=False, default=0)
+    moderate = Column(Integer, nullable=False, default=0)
+    severe = Column(Integer, nullable=False, default=0)
+
+
 class CommunityPost(Base):
     __tablename__ = "community_posts"
 
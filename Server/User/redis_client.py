@@ -1,7 +1,9 @@
+import redis
 import redis.asyncio as aioredis
 from config import settings
 
 _redis = None
+_sync_redis = None
 
 async def get_redis():
     global _redis
@@ -9,8 +11,15 @@ async def get_redis():
         _redis = aioredis.from_url(settings.redis_url, decode_responses=True)
     return _redis
 
+def get_sync_redis():
+    """Blocking client for the sync (threadpool) endpoints."""
+    global _sync_redis
+    if _sync_redis is None:
+        _sync_redis = redis.Redis.from_url(settings.redis_url, decode_responses=True)
+    return _sync_redis
+
 async def close_redis():
     global _redis
     if _redis:
         await _redis.close()
-        _redis = None 
\ No newline at end of file
+        _redis = None
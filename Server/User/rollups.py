@@ -0,0 +1,245 @@
+# rollups.py
+from collections import defaultdict
+from datetime import date, datetime, timezone
+from functools import lru_cache
+from typing import List, Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from fastapi import HTTPException
+from sqlalchemy import bindparam, delete, func, update
+from sqlalchemy.orm import Session
+from database import dialect_insert
+from models import DetectionArchive, EmotionDailyRollup, EmotionDetection, FacialData, User
+from emotions import INTENSITIES, vocabulary_for
+
+# Timezone of users who have not chosen one
+DEFAULT_TIMEZONE = "Asia/Manila"
+DEFAULT_TZ = ZoneInfo(DEFAULT_TIMEZONE)
+
+
+@lru_cache(maxsize=64)
+def get_zone(name: str) -> ZoneInfo:
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid timezone")
+
+
+def user_zone(user: User) -> ZoneInfo:
+    return get_zone(user.timezone or DEFAULT_TIMEZONE)
+
+
+def local_day_of(timestamp: datetime, zone: ZoneInfo = DEFAULT_TZ) -> date:
+    """Calendar day of a detection timestamp in the owner's timezone."""
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return timestamp.astimezone(zone).date()
+
+
+def record_detections(db: Session, user_id: int, detections: List[Tuple[date, int]]):
+    """Add (local_day, emotion code) detections to the user's rollups with one upsert. The caller commits."""
+    intensity_of = vocabulary_for(db, [code for _, code in detections]).intensity_of
+    merged = {}
+    for local_day, code in detections:
+        row = merged.setdefault((local_day, code), {
+            "user_id": user_id, "local_day": local_day, "emotion_code": code, "mild": 0, "moderate": 0, "severe": 0
+        })
+        row[intensity_of[code]] += 1
+    if not merged:
+        return
+    table = EmotionDailyRollup.__table__
+    stmt = dialect_insert(db)(table).values(list(merged.values()))
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.user_id, table.c.local_day, table.c.emotion_code],
+        set_={name: table.c[name] + stmt.excluded[name] for name in INTENSITIES}
+    )
+    db.execute(stmt)
+
+
+def record_detection(db: Session, user_id: int, local_day: date, code: int):
+    """Add one detection to the user's rollup for that day. The caller commits."""
+    record_detections(db, user_id, [(local_day, code)])
+
+
+def remove_detections(db: Session, user_id: int, counts: List[Tuple[date, int, int]]):
+    """Take (local_day, emotion code, count) detections back out of the user's rollups. The caller commits.
+
+    One executemany UPDATE per intensity, then rows that dropped to zero are deleted.
+    """
+    intensity_of = vocabulary_for(db, [code for _, code, _ in counts]).intensity_of
+    by_intensity = defaultdict(list)
+    for local_day, code, count in counts:
+        if local_day is not None:
+            by_intensity[intensity_of[code]].append({"day": local_day, "code": code, "n": count})
+    if not by_intensity:
+        return
+    table = EmotionDailyRollup.__table__
+    for intensity, params in by_intensity.items():
+        db.execute(
+            update(table).where(
+                table.c.user_id == user_id,
+                table.c.local_day == bindparam("day"),
+                table.c.emotion_code == bindparam("code")
+            ).values({intensity: table.c[intensity] - bindparam("n")}),
+            params
+        )
+    db.execute(delete(table).where(
+        table.c.user_id == user_id,
+        table.c.mild + table.c.moderate + table.c.severe <= 0
+    ))
+
+
+def get_daily_rollups(db: Session, user_id: int, since_day: date) -> dict:
+    """Map day -> {emotion code: {mild, moderate, severe}} for the user from since_day onwards."""
+    rows = db.query(EmotionDailyRollup).filter(
+        EmotionDailyRollup.user_id == user_id,
+        EmotionDailyRollup.local_day >= since_day
+    ).order_by(EmotionDailyRollup.local_day, EmotionDailyRollup.emotion_code).all()
+    days = defaultdict(dict)
+    for row in rows:
+        days[row.local_day][row.emotion_code] = {"mild": row.mild, "moderate": row.moderate, "severe": row.severe}
+    return days
+
+
+def refresh_local_days(db: Session, user_id: Optional[int] = None) -> int:
+    """Recompute local_day of hot and archived detections in each owner's timezone. The caller commits."""
+    hot = db.query(EmotionDetection.id, EmotionDetection.timestamp, User.timezone).join(
+        User, User.id == EmotionDetection.user_id
+    )
+    archived = db.query(DetectionArchive.id, DetectionArchive.timestamp, User.timezone).join(
+        User, User.id == DetectionArchive.user_id
+    )
+    if user_id is not None:
+        hot = hot.filter(EmotionDetection.user_id == user_id)
+        archived = archived.filter(DetectionArchive.user_id == user_id)
+
+    updated = 0
+    for model, query in ((EmotionDetection, hot), (DetectionArchive, archived)):
+        rows = []
+        for detection_id, timestamp, tz in query.yield_per(1000):
+            row = {"id": detection_id, "local_day": local_day_of(timestamp, get_zone(tz or DEFAULT_TIMEZONE))}
+            if model is DetectionArchive:
+                # The archive's primary key includes the partition key
+                row["timestamp"] = timestamp
+            rows.append(row)
+        for start in range(0, len(rows), 1000):
+            db.execute(update(model), rows[start:start + 1000])
+        updated += len(rows)
+    return updated
+
+
+def backfill_rollups(db: Session, user_id: Optional[int] = None, refresh_days: bool = False) -> int:
+    """Rebuild rollups from the local days of hot and archived detections, for one user or everyone,
+    and commit. Returns the number of rows written.
+
+    Pass refresh_days=True to recompute the local days first, e.g. after a timezone change.
+    Counts of detections offloaded out of the database are kept; see rebuild_rollups.
+    """
+    written = rebuild_rollups(db, user_id, refresh_days)
+    db.commit()
+    return written
+
+
+def _detection_counts(db: Session, user_id: Optional[int]) -> dict:
+    """Map (user, local day, emotion code) -> number of hot and archived detections."""
+    hot = db.query(
+        EmotionDetection.user_id, EmotionDetection.local_day, FacialData.emotion_code, func.count()
+    ).join(
+        FacialData, FacialData.detection_id == EmotionDetection.id
+    ).group_by(EmotionDetection.user_id, EmotionDetection.local_day, FacialData.emotion_code)
+    archived = db.query(
+        DetectionArchive.user_id, DetectionArchive.local_day, DetectionArchive.emotion_code, func.count()
+    ).filter(
+        DetectionArchive.emotion_code.isnot(None)
+    ).group_by(DetectionArchive.user_id, DetectionArchive.local_day, DetectionArchive.emotion_code)
+    if user_id is not None:
+        hot = hot.filter(EmotionDetection.user_id == user_id)
+        archived = archived.filter(DetectionArchive.user_id == user_id)
+    # A day can straddle the retention cutoff, so merge the two sources
+    counts = defaultdict(int)
+    for owner_id, day, code, count in hot.all() + archived.all():
+        counts[owner_id, day, code] += count
+    return counts
+
+
+def _offloaded_counts(db: Session, user_id: Optional[int], counts: dict) -> dict:
+    """Rollup counts of detections that are no longer in the database, keyed like _detection_counts.
+
+    archive_detections --offload-months drops whole months older than anything still stored,
+    so they can only sit on or before each user's oldest stored day. There the rollups hold
+    more than the stored detections account for; later days are rebuilt from the detections.
+    """
+    oldest = {}
+    for owner_id, day, _ in counts:
+        if owner_id not in oldest or day < oldest[owner_id]:
+            oldest[owner_id] = day
+    rollups = db.query(EmotionDailyRollup)
+    if user_id is not None:
+        rollups = rollups.filter(EmotionDailyRollup.user_id == user_id)
+    offloaded = {}
+    for row in rollups.all():
+        if row.user_id in oldest and row.local_day > oldest[row.user_id]:
+            continue
+        key = (row.user_id, row.local_day, row.emotion_code)
+        extra = row.mild + row.moderate + row.severe - counts.get(key, 0)
+        if extra > 0:
+            offloaded[key] = extra
+    return offloaded
+
+
+def rebuild_rollups(db: Session, user_id: Optional[int] = None, refresh_days: bool = False) -> int:
+    """backfill_rollups without the commit, for callers that write more in the same transaction.
+
+    Offloaded detections cannot be re-bucketed, so their counts stay on the days they were
+    recorded under, even when refresh_days moves the stored detections to other days.
+    """
+    counts = _detection_counts(db, user_id)
+    offloaded = _offloaded_counts(db, user_id, counts)
+    if refresh_days:
+        refresh_local_days(db, user_id)
+        counts = _detection_counts(db, user_id)
+    merged = defaultdict(int, counts)
+    for key, count in offloaded.items():
+        merged[key] += count
+    counts = [(owner_id, day, code, count) for (owner_id, day, code), count in merged.items()]
+
+    intensity_of = vocabulary_for(db, {code for _, _, code, _ in counts}).intensity_of
+    rows = []
+    for owner_id, day, code, count in counts:
+        row = {"user_id": owner_id, "local_day": day, "emotion_code": code, "mild": 0, "moderate": 0, "severe": 0}
+        row[intensity_of[code]] = count
+        rows.append(row)
+
+    cleanup = db.query(EmotionDailyRollup)
+    if user_id is not None:
+        cleanup = cleanup.filter(EmotionDailyRollup.user_id == user_id)
+    cleanup.delete(synchronize_session=False)
+    if rows:
+        db.execute(EmotionDailyRollup.__table__.insert(), rows)
+    return len(rows)
+
+
+def set_user_timezone(db: Session, user: User, name: str):
+    """Move a user to another timezone, re-bucketing their detections and rollups into its days. The caller commits."""
+    zone = get_zone(name)
+    if user.timezone == zone.key:
+        return
+    user.timezone = zone.key
+    db.flush()
+    rebuild_rollups(db, user.id, refresh_days=True)
+
+
+if __name__ == "__main__":
+    import argparse
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Rebuild the per-user daily emotion rollups from raw detections")
+    parser.add_argument("--user-id", type=int, default=None, help="Only rebuild this user's rollups")
+    parser.add_argument("--local-days", action="store_true", help="Recompute each detection's local day in its owner's timezone first")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        written = backfill_rollups(db, args.user_id, refresh_days=args.local_days)
+        print(f"Rebuilt {written} rollup rows")
+    finally:
+        db.close()
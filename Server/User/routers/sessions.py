@@ -1,5 +1,6 @@
 # sessions.py
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from typing import List, Optional # Import Optional
 from datetime import datetime, timedelta
@@ -8,10 +9,20 @@ from models import Session as SessionModel, User, EmotionDetection, FacialData,
 from schemas import SessionCreate, SessionResponse, SessionWithDetections, FeedbackCreate, FeedbackResponse, EmotionDetectionWithData, FacialDataResponse, VoiceDataResponse, WellnessSuggestionResponse, SessionOverview # Removed FeedbackCreate, FeedbackResponse as they are defined later.
 from dependencies import get_current_active_user, get_current_user
 from config import settings
-import requests
+from session_queries import get_session_overviews, get_session_page, load_session_history, serialize_session_history
+from charts import get_chart_rows, build_intensity_chart, build_dominant_emotion_chart
+from diagnosis_cache import latest_detection_id, get_cached_diagnosis, store_diagnosis, note_new_detection, invalidate_user
+from checkins import save_check_in, save_check_in_batch, delete_session_cascade
+from activity import record_session_start, session_count
+from jobs import get_job_queue
+from exports import iter_export_rows, ndjson_chunks, csv_chunks
+from suggestion_cache import normalize_content
+from llm import UNAVAILABLE_MESSAGE, STREAM_UNAVAILABLE_MESSAGE, get_diagnosis_providers, get_suggestion_providers, complete_with_fallback, stream_with_fallback, sse_event, StreamInterrupted
+from suggestions import build_gemini_prompt
+from rollups import get_daily_rollups, get_zone, user_zone
+from emotions import INTENSITIES, get_vocabulary, vocabulary_for
 import json
 from pydantic import BaseModel
-import google.generativeai as genai
 from random import uniform
 from collections import defaultdict, Counter
 from zoneinfo import ZoneInfo  # Add this import
@@ -22,47 +33,19 @@ class ProcessEmotionRequest(BaseModel):
     emotion: str
     voice_content: str
 
-class DiagnosisRequest(BaseModel):
-    window: str  # 'day', '3days', 'week', 'month'
+class CheckInItem(BaseModel):
+    session_id: int
+    emotion: str
+    voice_content: str
+    client_timestamp: Optional[datetime] = None
 
-# Enhanced emotion color mapping with more nuanced emotions
-EMOTION_COLORS = {
-    # Positive emotions
-    "happy": "#FFD700",  # Gold
-    "joyful": "#FFD700",
-    "excited": "#FF8C00",  # Dark orange
-    "content": "#98FB98",  # Pale green
-    "grateful": "#FFA07A",  # Light salmon
-    "hopeful": "#87CEFA",  # Light sky blue
-    
-    # Negative emotions
-    "sad": "#4682B4",    # Steel blue
-    "depressed": "#1E90FF",  # Dodger blue
-    "lonely": "#6495ED",  # Cornflower blue
-    "angry": "#DC143C",  # Crimson
-    "furious": "#B22222",  # Firebrick
-    "frustrated": "#CD5C5C",  # Indian red
-    "fearful": "#9370DB", # Medium purple
-    "anxious": "#9932CC",  # Dark orchid
-    "stressed": "#FF6347",  # Tomato
-    "overwhelmed": "#FF4500",  # Orange red
-    
-    # Neutral/other
-    "surprised": "#FFA500", # Orange
-    "shocked": "#FF4500",
-    "disgusted": "#2E8B57", # Sea green
-    "neutral": "#778899", # Light slate gray
-    "tired": "#A9A9A9",   # Dark gray
-    "confused": "#DAA520"   # Golden rod
-}
-
-SUICIDAL_KEYWORDS = [
-    "die", "suicide", "kill myself", "end my life", "self-harm", "hurt myself", "give up", "worthless", "no way out"
-]
-
-def contains_suicidal_keywords(text: str) -> bool:
-    text_lower = text.lower()
-    return any(kw in text_lower for kw in SUICIDAL_KEYWORDS)
+class BatchCheckInRequest(BaseModel):
+    items: List[CheckInItem]
+
+MAX_BATCH_CHECK_INS = 500
+
+class DiagnosisRequest(BaseModel):
+    window: str  # 'day', '3days', 'week', 'month', 'quarter', 'year', 'all'
 
 @router.post("/", response_model=SessionResponse)
 def create_session(
@@ -76,178 +59,90 @@ def create_session(
         start_time=datetime.utcnow()
     )
     db.add(db_session)
+    record_session_start(db, current_user.id, db_session.start_time)
     db.commit()
     db.refresh(db_session)
     return db_session
 
-def summarize_suggestion(suggestion: str) -> str:
-    if not suggestion:
-        return None
-    # Try to get the first sentence
-    for sep in [".", "!", "?"]:
-        if sep in suggestion:
-            first_sentence = suggestion.split(sep)[0].strip()
-            if first_sentence:
-                return first_sentence
-    # If no sentence-ending punctuation, return first 6 words
-    words = suggestion.split()
-    return " ".join(words[:6]) + ("..." if len(words) > 6 else "")
-
 @router.get("/", response_model=List[SessionOverview])
 def get_user_sessions(
+    response: Response,
     skip: int = 0,
     limit: int = 5,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
-    """Get all sessions for the current user, with dominant emotion and brief suggestion."""
-    sessions = db.query(SessionModel).filter(
-        SessionModel.user_id == current_user.id
-    ).order_by(SessionModel.start_time.desc()).offset(skip).limit(limit).all()
+    """Get all sessions for the current user, with dominant emotion and brief suggestion.
+
+    Pass the X-Next-Cursor header of one page as ?cursor= to fetch the next one.
+    skip is still honoured for older clients but gets slower the further it goes.
+    """
+    if skip:
+        sessions = db.query(SessionModel).filter(
+            SessionModel.user_id == current_user.id
+        ).order_by(SessionModel.start_time.desc(), SessionModel.id.desc()).offset(skip).limit(limit).all()
+    else:
+        sessions, next_cursor = get_session_page(db, current_user.id, limit, cursor)
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
 
     print(f"[DEBUG] User: {current_user.email} (id={current_user.id}), Sessions found: {len(sessions)}")
 
-    result = []
-    for session in sessions:
-        # Get all detections for this session
-        detections = db.query(EmotionDetection).filter(
-            EmotionDetection.session_id == session.id
-        ).all()
-        # Find dominant emotion
-        emotions = []
-        for det in detections:
-            facial = db.query(FacialData).filter(FacialData.detection_id == det.id).first()
-            if facial:
-                emotions.append(facial.emotion.lower())
-        dominant_emotion = None
-        if emotions:
-            dominant_emotion = Counter(emotions).most_common(1)[0][0]
-        # Get the first wellness suggestion (summarized)
-        suggestion = None
-        for det in detections:
-            wellness = db.query(WellnessSuggestion).filter(WellnessSuggestion.detection_id == det.id).first()
-            if wellness and wellness.suggestion:
-                raw_suggestion = wellness.suggestion.split('•')[0].strip()
-                suggestion = summarize_suggestion(raw_suggestion)
-                break
-        result.append(SessionOverview(
-            id=session.id,
-            user_id=session.user_id,
-            start_time=session.start_time,
-            end_time=session.end_time,
-            dominant_emotion=dominant_emotion,
-            suggestion=suggestion
-        ))
-    return result
-
-def call_openrouter_gpt4o(prompt: str) -> str:
-    """Call OpenRouter's GPT-4o as a fallback."""
-    api_url = settings.openrouter_api_url or "https://openrouter.ai/api/v1/chat"
-    api_key = settings.openrouter_api_key
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
-    data = {
-        "model": "openai/gpt-4o",
-        "messages": [
-            {"role": "system", "content": "You are a compassionate mental health assistant."},
-            {"role": "user", "content": prompt}
-        ]
-    }
-    try:
-        resp = requests.post(api_url, headers=headers, data=json.dumps(data), timeout=30)
-        resp.raise_for_status()
-        result = resp.json()
-        # OpenRouter returns choices[0].message.content
-        return result["choices"][0]["message"]["content"].strip()
-    except Exception as e:
-        return "AI awareness unavailable (OpenRouter fallback failed). Please try again later."
+    return get_session_overviews(db, sessions)
 
-@router.post("/diagnosis")
-def get_diagnosis(
-    req: DiagnosisRequest,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
-):
-    """Aggregate user's emotion detections, classify intensity, and get diagnosis from Gemini."""
-    # Determine time window
-    MANILA_TZ = ZoneInfo("Asia/Manila")
-    now = datetime.now(MANILA_TZ)
-    if req.window == 'day':
-        since = now.replace(hour=0, minute=0, second=0, microsecond=0)
-    elif req.window == '3days':
-        since = now - timedelta(days=3)
-    elif req.window == 'week':
-        since = now - timedelta(weeks=1)
-    elif req.window == 'month':
-        since = now - timedelta(days=30)
-    else:
-        raise HTTPException(status_code=400, detail="Invalid window")
+def diagnosis_since(window: str, zone: ZoneInfo) -> datetime:
+    """Start of a diagnosis window, in the user's timezone."""
+    now = datetime.now(zone)
+    if window == 'day':
+        return now.replace(hour=0, minute=0, second=0, microsecond=0)
+    elif window == '3days':
+        return now - timedelta(days=3)
+    elif window == 'week':
+        return now - timedelta(weeks=1)
+    elif window == 'month':
+        return now - timedelta(days=30)
+    elif window == 'quarter':
+        return now - timedelta(days=90)
+    elif window == 'year':
+        return now - timedelta(days=365)
+    elif window == 'all':
+        return datetime(1970, 1, 1, tzinfo=zone)
+    raise HTTPException(status_code=400, detail="Invalid window")
+
+def summarize_diagnosis_window(db: Session, user_id: int, window: str, since: datetime):
+    """Return (tallies, prompt) for the window, or None when it holds no detections."""
+    # Read the per-day rollups for the window instead of every raw detection
+    daily = get_daily_rollups(db, user_id, since.date())
+    if not daily:
+        return None
 
-    # Get all user's sessions (all time)
-    sessions = db.query(SessionModel).filter(
-        SessionModel.user_id == current_user.id
-    ).all()
-    session_ids = [s.id for s in sessions]
-    if not session_ids:
-        return {"diagnosis": "No sessions in this window.", "emotion_tally": {}, "intensity_breakdown": {}}
-
-    # Get all emotion detections in these sessions, but only those in the time window
-    detections = db.query(EmotionDetection).filter(
-        EmotionDetection.session_id.in_(session_ids),
+    # Tally per emotion code; intensity was assigned from the vocabulary when the rollup was written
+    code_tally = defaultdict(lambda: {"mild": 0, "moderate": 0, "severe": 0})
+    for day_emotions in daily.values():
+        for code, counts in day_emotions.items():
+            for intensity in INTENSITIES:
+                code_tally[code][intensity] += counts[intensity]
+    name_of = vocabulary_for(db, code_tally).name_of
+    emotion_intensity_map = {name_of[code]: counts for code, counts in code_tally.items()}
+    emotion_tally = {emotion: sum(counts.values()) for emotion, counts in emotion_intensity_map.items()}
+    intensity_breakdown = {intensity: sum(counts[intensity] for counts in code_tally.values()) for intensity in INTENSITIES}
+    total_detections = sum(intensity_breakdown.values())
+    # Severe counts only ever come from severe negative emotions
+    severe_negative_count = intensity_breakdown["severe"]
+
+    # Crisis keywords were matched when each check-in was stored; read the flags of the latest ones
+    recent_voice = db.query(VoiceData.content, EmotionDetection.crisis_flag).join(EmotionDetection).filter(
+        EmotionDetection.user_id == user_id,
         EmotionDetection.timestamp >= since
-    ).all()
-    if not detections:
-        return {"diagnosis": "No emotion detections in this window.", "emotion_tally": {}, "intensity_breakdown": {}}
-
-    # Tally emotions and classify intensity
-    emotion_tally = {}
-    intensity_breakdown = {"mild": 0, "moderate": 0, "severe": 0}
-    emotion_intensity_map = {}
-    severe_negative_count = 0
-    for det in detections:
-        facial = db.query(FacialData).filter(FacialData.detection_id == det.id).first()
-        if not facial:
-            continue
-        emotion = facial.emotion.lower()
-        # Deterministic intensity assignment
-        if emotion in ["happy", "content", "neutral"]:
-            intensity = "mild"
-        elif emotion in ["sad", "angry", "depressed", "furious", "fearful", "anxious", "stressed", "overwhelmed"]:
-            intensity = "severe"
-        else:
-            intensity = "moderate"
-        emotion_tally[emotion] = emotion_tally.get(emotion, 0) + 1
-        intensity_breakdown[intensity] += 1
-        if emotion not in emotion_intensity_map:
-            emotion_intensity_map[emotion] = {"mild": 0, "moderate": 0, "severe": 0}
-        emotion_intensity_map[emotion][intensity] += 1
-        # Count severe negative emotions for awareness
-        if intensity == "severe" and emotion in ["sad", "depressed", "angry", "furious", "fearful", "anxious", "stressed", "overwhelmed"]:
-            severe_negative_count += 1
-
-    # Check for suicidal/self-harm keywords in recent voice data
-    recent_voice = db.query(VoiceData).join(EmotionDetection).filter(EmotionDetection.id.in_([d.id for d in detections])).order_by(VoiceData.id.desc()).limit(3).all()
-    suicidal_flag = False
-    if recent_voice:
-        for v in recent_voice:
-            if contains_suicidal_keywords(v.content):
-                suicidal_flag = True
-                break
-    # Optionally, check facial emotion text as well (not just voice)
-    if not suicidal_flag:
-        for det in detections:
-            facial = db.query(FacialData).filter(FacialData.detection_id == det.id).first()
-            if facial and contains_suicidal_keywords(facial.emotion):
-                suicidal_flag = True
-                break
+    ).order_by(VoiceData.id.desc()).limit(3).all()
+    suicidal_flag = any(v.crisis_flag for v in recent_voice)
 
     # Prepare summary for Gemini
-    summary = f"User emotion summary (window: {req.window}):\n"
+    summary = f"User emotion summary (window: {window}):\n"
     for emotion, count in emotion_tally.items():
         summary += f"- {emotion}: {count} times (mild: {emotion_intensity_map[emotion]['mild']}, moderate: {emotion_intensity_map[emotion]['moderate']}, severe: {emotion_intensity_map[emotion]['severe']})\n"
-    summary += f"\nTotal detections: {len(detections)}\n"
+    summary += f"\nTotal detections: {total_detections}\n"
     summary += f"Intensity breakdown: mild={intensity_breakdown['mild']}, moderate={intensity_breakdown['moderate']}, severe={intensity_breakdown['severe']}\n"
     if severe_negative_count > 0:
         summary += f"\nThere were {severe_negative_count} severe negative emotion detections.\n"
@@ -255,156 +150,148 @@ def get_diagnosis(
         summary += ("\nWARNING: There are indications of suicidal thoughts or self-harm in recent user input. "
                     "Strongly recommend the user seek immediate professional help or contact a crisis hotline.\n")
 
-    recent_voice = db.query(VoiceData).join(EmotionDetection).filter(EmotionDetection.id.in_([d.id for d in detections])).order_by(VoiceData.id.desc()).limit(3).all()
     if recent_voice:
         summary += "\nRecent voice entries:\n"
         for v in recent_voice:
             summary += f"- {v.content[:100]}\n"
-    recent_suggestions = db.query(WellnessSuggestion).join(EmotionDetection).filter(EmotionDetection.id.in_([d.id for d in detections])).order_by(WellnessSuggestion.id.desc()).limit(3).all()
+    recent_suggestions = db.query(WellnessSuggestion).join(EmotionDetection).filter(
+        EmotionDetection.user_id == user_id,
+        EmotionDetection.timestamp >= since
+    ).order_by(WellnessSuggestion.id.desc()).limit(3).all()
     if recent_suggestions:
         summary += "\nRecent wellness suggestions:\n"
         for s in recent_suggestions:
             summary += f"- {s.suggestion[:100]}\n"
 
-    # Send to Gemini for diagnosis
     diagnosis_prompt = summary + "\n\nBased on the above, provide a brief mental health analysis. Use language like 'You are experiencing...' or 'It appears you may be experiencing...'. If there is a pattern of severe negative emotions (e.g., sadness, anger, fear), raise awareness and suggest the user may benefit from talking to a professional, but do NOT replace professional advice. Be concise, compassionate, and focus on awareness and next steps, not diagnosis."
-    try:
-        genai.configure(api_key=settings.gemini_api_key)
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        response = model.generate_content(diagnosis_prompt)
-        diagnosis = response.text.strip()
-    except Exception as e:
-        # Fallback to OpenRouter GPT-4o
-        diagnosis = call_openrouter_gpt4o(diagnosis_prompt)
-
-    return {
-        "diagnosis": diagnosis,
+    tallies = {
         "emotion_tally": emotion_tally,
         "intensity_breakdown": intensity_breakdown,
         "emotion_intensity_map": emotion_intensity_map,
-        "window": req.window
+        "window": window
     }
+    return tallies, diagnosis_prompt
+
+NO_DETECTIONS_RESULT = {"diagnosis": "No emotion detections in this window.", "emotion_tally": {}, "intensity_breakdown": {}}
+
+@router.post("/diagnosis")
+def get_diagnosis(
+    req: DiagnosisRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Aggregate user's emotion detections, classify intensity, and get diagnosis from Gemini."""
+    since = diagnosis_since(req.window, user_zone(current_user))
+
+    # Serve a stored result if nothing new was detected since it was generated
+    latest_id = latest_detection_id(db, current_user.id)
+    cached = get_cached_diagnosis(current_user.id, req.window, since.date(), latest_id)
+    if cached is not None:
+        return cached
+
+    summary = summarize_diagnosis_window(db, current_user.id, req.window, since)
+    if summary is None:
+        return NO_DETECTIONS_RESULT
+    tallies, diagnosis_prompt = summary
+
+    # Send to Gemini for diagnosis, falling back to OpenRouter GPT-4o
+    diagnosis = complete_with_fallback(diagnosis_prompt, get_diagnosis_providers())
+
+    result = {"diagnosis": diagnosis, **tallies}
+    # An outage notice is not a diagnosis; the next request should ask the model again
+    if diagnosis != UNAVAILABLE_MESSAGE:
+        store_diagnosis(current_user.id, req.window, since.date(), latest_id, result)
+    return result
+
+@router.post("/diagnosis/stream")
+def stream_diagnosis(
+    req: DiagnosisRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Same as /diagnosis, as Server-Sent Events: a `summary` event with the tallies right away,
+    `token` events while the model writes, then `done` with the full result.
+    If the model fails mid-reply, an `error` event replaces `done`."""
+    since = diagnosis_since(req.window, user_zone(current_user))
+    user_id = current_user.id
+    latest_id = latest_detection_id(db, user_id)
+    cached = get_cached_diagnosis(user_id, req.window, since.date(), latest_id)
+    # All DB work happens before streaming starts; the generator only talks to the model
+    summary = None if cached is not None else summarize_diagnosis_window(db, user_id, req.window, since)
+
+    def events():
+        if cached is not None:
+            yield sse_event("summary", {k: v for k, v in cached.items() if k != "diagnosis"})
+            yield sse_event("token", {"text": cached["diagnosis"]})
+            yield sse_event("done", cached)
+            return
+        if summary is None:
+            yield sse_event("done", NO_DETECTIONS_RESULT)
+            return
+        tallies, diagnosis_prompt = summary
+        yield sse_event("summary", tallies)
+        parts = []
+        try:
+            for token in stream_with_fallback(diagnosis_prompt, get_diagnosis_providers()):
+                parts.append(token)
+                yield sse_event("token", {"text": token})
+        except StreamInterrupted:
+            # The tokens sent so far are a fragment; it must not be cached as a diagnosis
+            yield sse_event("error", {"detail": STREAM_UNAVAILABLE_MESSAGE})
+            return
+        result = {"diagnosis": "".join(parts).strip(), **tallies}
+        if result["diagnosis"] != STREAM_UNAVAILABLE_MESSAGE:
+            store_diagnosis(user_id, req.window, since.date(), latest_id, result)
+        yield sse_event("done", result)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @router.get("/intensity_chart")
 def get_intensity_chart(
     window: str = 'week',
+    tz: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
-    MANILA_TZ = ZoneInfo("Asia/Manila")
-    now = datetime.now(MANILA_TZ)
-    if window == 'day':
-        since = now.replace(hour=0, minute=0, second=0, microsecond=0)
-        days = [since.date()]
-    elif window == '3days':
-        since = now - timedelta(days=3)
-        days = [(since + timedelta(days=i)).date() for i in range(4)]
-    elif window == 'week':
-        monday = now - timedelta(days=now.weekday())
-        days = [(monday + timedelta(days=i)).date() for i in range(7)]
-        since = monday.replace(hour=0, minute=0, second=0, microsecond=0)
-    elif window == 'month':
-        since = now - timedelta(days=30)
-        days = [(since + timedelta(days=i)).date() for i in range(31)]
-    else:
-        raise HTTPException(status_code=400, detail="Invalid window")
-
-    sessions = db.query(SessionModel).filter(
-        SessionModel.user_id == current_user.id
-    ).all()
-    session_ids = [s.id for s in sessions]
-    detections = db.query(EmotionDetection).filter(
-        EmotionDetection.session_id.in_(session_ids),
-        EmotionDetection.timestamp >= since
-    ).all()
-
-    day_map = defaultdict(list)
-    for det in detections:
-        det_date = det.timestamp.astimezone(MANILA_TZ).date()
-        facial = db.query(FacialData).filter(FacialData.detection_id == det.id).first()
-        if not facial:
-            continue
-        emotion = facial.emotion.lower()
-        # Deterministic intensity assignment
-        if emotion in ["happy", "content", "neutral"]:
-            intensity = "mild"
-        elif emotion in ["sad", "angry", "depressed", "furious", "fearful", "anxious", "stressed", "overwhelmed"]:
-            intensity = "severe"
-        else:
-            intensity = "moderate"
-        day_map[det_date].append((emotion, intensity))
-
-    chart = []
-    for day in days:
-        emotions = [e for e, _ in day_map.get(day, [])]
-        intensities = [i for _, i in day_map.get(day, [])]
-        if emotions:
-            dominant_emotion = Counter(emotions).most_common(1)[0][0]
-            intensity_tally = {k: intensities.count(k) for k in ["mild", "moderate", "severe"]}
-        else:
-            dominant_emotion = None
-            intensity_tally = {"mild": 0, "moderate": 0, "severe": 0}
-        chart.append({
-            "day": str(day),
-            "dominant_emotion": dominant_emotion,
-            "intensity_tally": intensity_tally
-        })
-    return chart
+    home = user_zone(current_user)
+    zone = get_zone(tz) if tz else home
+    daily, days = get_chart_rows(db, current_user.id, window, zone, home)
+    return build_intensity_chart(daily, days)
 
 @router.get("/dominant_emotion_chart")
 def get_dominant_emotion_chart(
     window: str = 'week',
+    tz: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
-    MANILA_TZ = ZoneInfo("Asia/Manila")
-    now = datetime.now(MANILA_TZ)
-    if window == 'day':
-        since = now.replace(hour=0, minute=0, second=0, microsecond=0)
-        days = [since.date()]
-    elif window == '3days':
-        since = now - timedelta(days=3)
-        days = [(since + timedelta(days=i)).date() for i in range(4)]
-    elif window == 'week':
-        monday = now - timedelta(days=now.weekday())
-        days = [(monday + timedelta(days=i)).date() for i in range(7)]
-        since = monday.replace(hour=0, minute=0, second=0, microsecond=0)
-    elif window == 'month':
-        since = now - timedelta(days=30)
-        days = [(since + timedelta(days=i)).date() for i in range(31)]
+    home = user_zone(current_user)
+    zone = get_zone(tz) if tz else home
+    daily, days = get_chart_rows(db, current_user.id, window, zone, home)
+    return build_dominant_emotion_chart(daily, days)
+
+@router.get("/export")
+def export_history(
+    format: str = 'ndjson',
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Download every check-in of the current user as NDJSON or CSV, streamed while it is read."""
+    if format == 'ndjson':
+        chunks, media_type = ndjson_chunks, "application/x-ndjson"
+    elif format == 'csv':
+        chunks, media_type = csv_chunks, "text/csv"
     else:
-        raise HTTPException(status_code=400, detail="Invalid window")
-
-    sessions = db.query(SessionModel).filter(
-        SessionModel.user_id == current_user.id
-    ).all()
-    session_ids = [s.id for s in sessions]
-    detections = db.query(EmotionDetection).filter(
-        EmotionDetection.session_id.in_(session_ids),
-        EmotionDetection.timestamp >= since
-    ).all()
-
-    day_map = defaultdict(list)
-    for det in detections:
-        det_date = det.timestamp.astimezone(MANILA_TZ).date()
-        facial = db.query(FacialData).filter(FacialData.detection_id == det.id).first()
-        if not facial:
-            continue
-        emotion = facial.emotion.lower()
-        day_map[det_date].append(emotion)
-
-    chart = []
-    for day in days:
-        emotions = day_map.get(day, [])
-        if emotions:
-            dominant_emotion = Counter(emotions).most_common(1)[0][0]
-        else:
-            dominant_emotion = None
-        chart.append({
-            "day": str(day),
-            "dominant_emotion": dominant_emotion
-        })
-    return chart
+        raise HTTPException(status_code=400, detail="Invalid format")
+    return StreamingResponse(
+        chunks(iter_export_rows(db, current_user.id)),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="faceofmind-history.{format}"'}
+    )
 
 @router.get("/count")
 def get_session_count(
@@ -412,8 +299,34 @@ def get_session_count(
     current_user: User = Depends(get_current_active_user)
 ):
     """Get the total number of sessions for the current user."""
-    count = db.query(SessionModel).filter(SessionModel.user_id == current_user.id).count()
-    return {"count": count}
+    return {"count": session_count(db, current_user.id)}
+
+@router.get("/dashboard")
+def get_dashboard(
+    window: str = 'week',
+    tz: Optional[str] = None,
+    limit: int = 5,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Everything the home screen needs in one call: session count, latest sessions and both charts.
+    Charts use the user's timezone unless tz overrides it."""
+    home = user_zone(current_user)
+    zone = get_zone(tz) if tz else home
+
+    count = session_count(db, current_user.id)
+    sessions, next_cursor = get_session_page(db, current_user.id, limit)
+    # Both charts come from the same per-day rows, so the detections are aggregated once
+    daily, days = get_chart_rows(db, current_user.id, window, zone, home)
+
+    return {
+        "count": count,
+        "sessions": get_session_overviews(db, sessions),
+        "next_cursor": next_cursor,
+        "intensity_chart": build_intensity_chart(daily, days),
+        "dominant_emotion_chart": build_dominant_emotion_chart(daily, days),
+        "window": window
+    }
 
 @router.get("/{session_id}", response_model=SessionResponse)
 def get_session(
@@ -436,15 +349,10 @@ def delete_session(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
-    """Delete a session."""
-    session = db.query(SessionModel).filter(
-        SessionModel.id == session_id,
-        SessionModel.user_id == current_user.id
-    ).first()
-    if not session:
+    """Delete a session with its check-ins, suggestions and feedback."""
+    if not delete_session_cascade(db, current_user.id, session_id):
         raise HTTPException(status_code=404, detail="Session not found")
-    db.delete(session)
-    db.commit()
+    invalidate_user(current_user.id)
     return {"message": "Session deleted successfully"}
 
 @router.post("/{session_id}/process_emotion")
@@ -454,207 +362,128 @@ def process_emotion(
     db: Session = Depends(get_db),
     current_user = Depends(get_current_user)
 ):
-    """Process emotion data and generate 5 short, direct-to-the-point bullet suggestions (max 1 sentence each, no URLs in text). Also stores up to 5 relevant URLs (from any reputable site, not just Reddit/Quora) as a separate field. URLs are not included in the suggestion text, only in the url field and response."""
-    from zoneinfo import ZoneInfo
-    MANILA_TZ = ZoneInfo("Asia/Manila")
-    detection = EmotionDetection(session_id=session_id, timestamp=datetime.now(MANILA_TZ))
-    db.add(detection)
-    db.commit()
-    db.refresh(detection)
-
-    # Get emotion color
-    emotion_lower = req.emotion.lower()
-    calculated_emotion_color = EMOTION_COLORS.get(emotion_lower, "#778899")
-
-    # 2. Store facial data
-    facial = FacialData(
-        detection_id=detection.id,
-        emotion=req.emotion,
-    )
-    db.add(facial)
-    db.commit()
-    db.refresh(facial)
-
-    # 3. Store voice data
-    voice = VoiceData(detection_id=detection.id, content=req.voice_content)
-    db.add(voice)
-    db.commit()
-    db.refresh(voice)
-
-    # 4. Generate 5 short, direct bullet suggestions and up to 5 reputable URLs
-    suggestion_text = None
-    suggestions_list = []
-    urls_list = []
-    try:
-        # Prompt for 1 acknowledgment + 4 actionable tips, and up to 5 Reddit/Quora URLs
-        if contains_suicidal_keywords(req.voice_content):
-            prompt = (
-                "The user has expressed thoughts of suicide or self-harm. "
-                "Your role is to be extremely gentle, calm, and supportive. "
-                "Do NOT judge or dismiss their feelings. "
-                "Encourage them to reach out to a mental health professional or crisis hotline immediately. "
-                "Provide immediate comfort, grounding techniques, and remind them they are not alone. "
-                "Format: 1 direct, empathetic acknowledgment/comforting statement as the first bullet (address the user's feelings and situation), then 4 short, direct-to-the-point actionable bullet points (max 1 sentence each, no URLs in text). "
-                "After the suggestions, provide up to 5 relevant, working URLs from Reddit or Quora only, one per line, not included in the suggestion text. Do not include 'url not found' or broken links."
-                f"\nUser's message: '{req.voice_content}'"
-            )
-        else:
-            prompt = (
-                build_gemini_prompt(req.emotion.lower(), req.voice_content) +
-                "\nFormat the suggestions as 5 bullet points: the first bullet is a direct, empathetic acknowledgment/comforting statement for the user's feelings and situation, and the next 4 are short, actionable coping tips (max 1 sentence each, no URLs in text). After the suggestions, provide up to 5 relevant, working URLs from Reddit or Quora only, one per line, not included in the suggestion text. Do not include 'url not found' or broken links. Example output:\n- Acknowledgment.\n- Tip 1.\n- Tip 2.\n- Tip 3.\n- Tip 4.\n[URLs start here, one per line]"
-            )
-        genai.configure(api_key=settings.gemini_api_key)
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        response = model.generate_content(prompt)
-        suggestion_text = response.text.strip()
-    except Exception as e:
-        suggestion_text = call_openrouter_gpt4o(prompt)
-
-    # Parse bullet suggestions and URLs (split by lines)
-    lines = [l.strip() for l in suggestion_text.split('\n') if l.strip()]
-    suggestions_list = []
-    urls_list = []
-    for line in lines:
-        if line.startswith('- ') or line.startswith('• '):
-            suggestions_list.append(line[2:].strip())
-        elif line.startswith('http'):
-            urls_list.append(line)
-    # Fallback: If no suggestions found, take lines before first URL (up to 5)
-    if not suggestions_list:
-        for line in lines:
-            if line.startswith('http'):
-                break
-            suggestions_list.append(line)
-            if len(suggestions_list) == 5:
-                break
-    # Only keep up to 5 suggestions and 5 URLs
-    suggestions_list = suggestions_list[:5]
-    # Only keep Reddit/Quora URLs
-    urls_list = [u for u in urls_list if ('reddit.com' in u or 'quora.com' in u)][:5]
-    url_field = ','.join(urls_list) if urls_list else None
-
-    # 5. Store suggestion (as joined bullet points, no URLs)
-    suggestion = WellnessSuggestion(
-        detection_id=detection.id,
-        suggestion='\n'.join(['- ' + s for s in suggestions_list]),
-        url=url_field
-    )
-    db.add(suggestion)
-    db.commit()
-    db.refresh(suggestion)
-
-    # 6. End the session automatically
-    session = db.query(SessionModel).filter(
-        SessionModel.id == session_id,
-        SessionModel.user_id == current_user.id
-    ).first()
-    if session and not session.end_time:
-        session.end_time = datetime.now(MANILA_TZ)
-        db.commit()
+    """Store a check-in and queue generation of 5 short, direct-to-the-point bullet suggestions (max 1 sentence each, no URLs in text) plus up to 5 relevant URLs. Returns right away with a job_id; poll GET /sessions/jobs/{job_id} for the suggestions."""
+    # Store the check-in now; the suggestion is generated by a background worker
+    detection_id = save_check_in(db, current_user.id, session_id, req.emotion, req.voice_content, zone=user_zone(current_user))
+    if detection_id is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    calculated_emotion_color = get_vocabulary(db).color(req.emotion)
+    note_new_detection(current_user.id, detection_id)
+    job_id = get_job_queue().enqueue({
+        "detection_ids": [detection_id],
+        "emotion": req.emotion,
+        "voice_content": req.voice_content
+    }, owner_id=current_user.id)
 
     return {
         "session_id": session_id,
         "emotion": req.emotion,
         "voice_content": req.voice_content,
-        "suggestions": suggestions_list,
+        "suggestions": [],
         "emotion_color": calculated_emotion_color,
-        "urls": urls_list
+        "urls": [],
+        "detection_id": detection_id,
+        "job_id": job_id,
+        "status": "pending"
+    }
+
+@router.post("/process_emotion/batch")
+def process_emotion_batch(
+    req: BatchCheckInRequest,
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_user)
+):
+    """Replay check-ins queued offline. All valid items are written in one transaction; identical
+    (emotion, voice_content) pairs share one suggestion job. Returns one result per item, in order."""
+    if len(req.items) > MAX_BATCH_CHECK_INS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_CHECK_INS} check-ins per batch")
+
+    session_ids = {item.session_id for item in req.items}
+    owned = {row[0] for row in db.query(SessionModel.id).filter(
+        SessionModel.id.in_(session_ids),
+        SessionModel.user_id == current_user.id
+    )} if session_ids else set()
+
+    zone = user_zone(current_user)
+    now = datetime.now(zone)
+    accepted = []
+    for index, item in enumerate(req.items):
+        if item.session_id not in owned:
+            continue
+        timestamp = item.client_timestamp or now
+        if timestamp.tzinfo is None:
+            timestamp = timestamp.replace(tzinfo=zone)
+        accepted.append((index, {
+            "session_id": item.session_id,
+            "emotion": item.emotion,
+            "voice_content": item.voice_content,
+            "timestamp": timestamp
+        }))
+    detection_ids = save_check_in_batch(db, current_user.id, [row for _, row in accepted], zone)
+    if detection_ids:
+        note_new_detection(current_user.id, max(detection_ids))
+
+    vocabulary = get_vocabulary(db)
+
+    # One suggestion job per distinct (emotion, normalized content)
+    groups = {}
+    for (index, row), detection_id in zip(accepted, detection_ids):
+        key = (row["emotion"].lower(), normalize_content(row["voice_content"]))
+        group = groups.setdefault(key, {"emotion": row["emotion"], "voice_content": row["voice_content"], "detection_ids": [], "indexes": []})
+        group["detection_ids"].append(detection_id)
+        group["indexes"].append(index)
+
+    results = [{"index": index, "status": "error", "detail": "Session not found"} for index in range(len(req.items))]
+    job_queue = get_job_queue()
+    for group in groups.values():
+        job_id = job_queue.enqueue({
+            "detection_ids": group["detection_ids"],
+            "emotion": group["emotion"],
+            "voice_content": group["voice_content"]
+        }, owner_id=current_user.id)
+        for index, detection_id in zip(group["indexes"], group["detection_ids"]):
+            item = req.items[index]
+            results[index] = {
+                "index": index,
+                "status": "accepted",
+                "session_id": item.session_id,
+                "detection_id": detection_id,
+                "emotion_color": vocabulary.color(item.emotion),
+                "job_id": job_id
+            }
+    return {"results": results, "accepted": len(detection_ids), "jobs": len(groups)}
+
+@router.get("/jobs/{job_id}")
+def get_suggestion_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """Poll a suggestion job started by process_emotion."""
+    job = get_job_queue().get(job_id)
+    if not job or job["owner_id"] != current_user.id:
+        raise HTTPException(status_code=404, detail="Job not found")
+    result = job["result"] or {}
+    return {
+        "job_id": job_id,
+        "status": job["status"],
+        "detection_ids": result.get("detection_ids", []),
+        "suggestions": result.get("suggestions", []),
+        "urls": result.get("urls", [])
     }
 
 def generate_wellness_response_with_gemini(emotion: str, content: str, db: Session) -> str:
     """Generate wellness response using Gemini 1.5 Flash with enhanced prompting."""
     try:
-        genai.configure(api_key=settings.gemini_api_key)
-        
-        # Create the model instance using 'gemini-1.5-flash'
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        
-        
         emotion = emotion.lower()
         prompt = build_gemini_prompt(emotion, content)
-        
-        
-        response = model.generate_content(prompt)
-        
-       
-        return format_gemini_response(response.text, emotion)
+        # The shared provider keeps its configured model between calls
+        response_text = get_suggestion_providers()[0].complete(prompt)
+        return format_gemini_response(response_text, emotion)
         
     except Exception as e:
         print(f"Gemini 1.5 Flash failed: {str(e)}")
         return get_enhanced_fallback_response(emotion, content)
 
-def build_gemini_prompt(emotion: str, content: str) -> str:
-    """Build a tailored prompt for Gemini based on emotion type."""
-    base_prompt = """As a compassionate mental health assistant, respond to someone feeling {emotion} who shared:
-"{content}"
-
-Provide:
-1. A brief (10-15 word) empathetic acknowledgment of their emotion
-2. Three (3) concise wellness suggestions (12 words max each) tailored to their situation
-3. Format as: "[Acknowledgment] • Suggestion 1 • Suggestion 2 • Suggestion 3"
-
-Make suggestions practical, specific, and emotionally appropriate."""
-
-    # Emotion-specific prompt variations
-    if emotion in ["happy", "joyful", "excited", "content"]:
-        return f"""As a positivity coach, respond to someone feeling {emotion} who shared:
-"{content}"
-
-Provide:
-1. A warm validation (12-15 words)
-2. Three suggestions to:
-    - Deepen this positive state
-    - Share it with others
-    - Create lasting positive memories
-3. Format as: "It's wonderful you're feeling {emotion}! • Suggestion 1 • Suggestion 2 • Suggestion 3"
-
-Keep suggestions uplifting and practical."""
-
-    elif emotion in ["sad", "depressed", "lonely"]:
-        return f"""As a compassionate listener, respond to someone feeling {emotion} who shared:
-"{content}"
-
-Provide:
-1. A validating acknowledgment (12-15 words)
-2. Three gentle suggestions for:
-    - Immediate comfort
-    - Connection with others
-    - Small steps toward relief
-3. Format as: "I hear this {emotion} feeling is hard • Comfort idea • Connection suggestion • Small step"
-
-Use a warm, non-judgmental tone."""
-
-    elif emotion in ["angry", "furious", "frustrated"]:
-        return f"""As an emotional regulation coach, respond to someone feeling {emotion} who shared:
-"{content}"
-
-Provide:
-1. A validating but calming acknowledgment (12-15 words)
-2. Three suggestions for:
-    - Safe emotional release
-    - Shifting perspective
-    - Constructive action
-3. Format as: "{emotion.capitalize()} makes sense here • Release technique • Perspective shift • Action step"
-
-Keep suggestions practical and non-shaming."""
-
-    elif emotion in ["fearful", "anxious", "stressed", "overwhelmed"]:
-        return f"""As a calming presence, respond to someone feeling {emotion} who shared:
-"{content}"
-
-Provide:
-1. A grounding acknowledgment (12-15 words)
-2. Three suggestions for:
-    - Immediate calming
-    - Breaking down concerns
-    - Regaining control
-3. Format as: "{emotion.capitalize()} can feel overwhelming • Calming technique • Perspective tip • Action step"
-
-Make suggestions concrete and doable."""
-
-    else:   
-        return base_prompt.format(emotion=emotion, content=content)
-
 def format_gemini_response(response_text: str, emotion: str) -> str:
     """Format Gemini's response for consistent output."""
     response_text = response_text.strip()
@@ -764,97 +593,7 @@ def get_session_history(
     current_user: User = Depends(get_current_active_user)
 ):
     """Get complete session history with all related data. Also returns a list of relevant URLs that might help the user."""
-    session = db.query(SessionModel).filter(
-        SessionModel.id == session_id,
-        SessionModel.user_id == current_user.id
-    ).first()
+    session = load_session_history(db, session_id, current_user.id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
-
-    detections = db.query(EmotionDetection).filter(
-        EmotionDetection.session_id == session.id
-    ).all()
-    
-    detection_data = []
-    all_urls = set()
-    for det in detections: 
-        facial = db.query(FacialData).filter(
-            FacialData.detection_id == det.id
-        ).first()
-        voice = db.query(VoiceData).filter(
-            VoiceData.detection_id == det.id
-        ).first()
-        wellness = db.query(WellnessSuggestion).filter(
-            WellnessSuggestion.detection_id == det.id
-        ).first()
-        
-        facial_response = None
-        facial_emotion_color = ""
-        facial_emotion_str = None
-
-        if facial:
-            emotion_from_facial = facial.emotion.lower()
-            facial_emotion_color = EMOTION_COLORS.get(emotion_from_facial, "#778899")
-            facial_emotion_str = facial.emotion
-            
-            facial_response = FacialDataResponse(
-                id=facial.id,
-                detection_id=facial.detection_id,
-                emotion=facial.emotion,
-            )
-        
-        voice_response = VoiceDataResponse.from_orm(voice) if voice else None
-
-        history_acknowledgment = ""
-        history_suggestions_list = []
-        wellness_suggestion_response = None
-        if wellness and wellness.suggestion:
-            # Split by newlines and filter for lines that look like bullets
-            lines = [l.strip() for l in wellness.suggestion.split('\n') if l.strip()]
-            bullets = []
-            for line in lines:
-                if line.startswith('- ') or line.startswith('- *') or line.startswith('•'):
-                    # Remove '- ', '- *', or '•' from start
-                    clean = line.lstrip('-*• ').strip()
-                    if clean:
-                        bullets.append(clean)
-            history_acknowledgment = bullets[0] if bullets else ""
-            history_suggestions_list = bullets[1:] if len(bullets) > 1 else []
-            # Parse URLs from the url field (comma-separated)
-            url_list = [u.strip() for u in wellness.url.split(',')] if wellness.url else []
-            wellness_suggestion_response = WellnessSuggestionResponse(
-                id=wellness.id,
-                detection_id=wellness.detection_id,
-                suggestion=wellness.suggestion,
-                acknowledgment=history_acknowledgment,
-                suggestions=history_suggestions_list,
-                url=url_list
-            )
-            # Collect URLs from the url field (comma-separated)
-            for u in wellness.url.split(','):
-                u = u.strip()
-                if u:
-                    all_urls.add(u)
-
-        detection_data.append(EmotionDetectionWithData(
-            id=det.id,
-            session_id=det.session_id,
-            timestamp=det.timestamp,
-            facial_data=facial_response, 
-            voice_data=voice_response,   
-            wellness_suggestions=wellness_suggestion_response, 
-            emotion_color=facial_emotion_color, 
-            facial_emotion=facial_emotion_str 
-        ))
-
-    # Return the session with detections and relevant URLs
-    return {
-        **SessionWithDetections(
-            id=session.id,
-            user_id=session.user_id,
-            start_time=session.start_time,
-            end_time=session.end_time,
-            emotion_detections=detection_data
-        ).dict(),
-        "relevant_urls": list(all_urls)
-    }
\ No newline at end of file
+    return serialize_session_history(db, session)
\ No newline at end of file
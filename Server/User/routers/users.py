@@ -5,6 +5,8 @@ from database import get_db
 from models import User, UserStatus
 from schemas import UserResponse, UserUpdate, UserWithSessions, UserProfileUpdate
 from dependencies import get_current_user, get_current_active_user
+from rollups import set_user_timezone
+from diagnosis_cache import invalidate_user
 
 router = APIRouter(prefix="/users", tags=["users"])
 
@@ -39,7 +41,9 @@ def update_user(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
-    """Update a user's profile (first_name and last_name only)."""
+    """Update a user's profile (first_name, last_name and timezone only).
+
+    Changing the timezone re-buckets the user's past detections into days of the new zone."""
     if current_user.id != user_id and current_user.role != "admin":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -52,8 +56,13 @@ def update_user(
             detail="User not found"
         )
     update_data = user_update.dict(exclude_unset=True)
+    timezone = update_data.pop("timezone", None)
     for field, value in update_data.items():
         setattr(user, field, value)
+    if timezone and timezone != user.timezone:
+        # Commits together with the name fields
+        set_user_timezone(db, user, timezone)
+        invalidate_user(user.id)
     db.commit()
     db.refresh(user)
     return user
@@ -26,6 +26,7 @@ class UserUpdate(BaseModel):
 class UserProfileUpdate(BaseModel):
     first_name: Optional[str] = None
     last_name: Optional[str] = None
+    timezone: Optional[str] = None
 
 
 class UserResponse(UserBase):
@@ -33,6 +34,7 @@ class UserResponse(UserBase):
     role: str
     status: UserStatus
     created_at: datetime
+    timezone: str = "Asia/Manila"
 
     @property
     def full_name(self) -> str:
@@ -279,6 +281,9 @@ class EmotionDetectionWithData(EmotionDetectionResponse):
 
 class SessionWithDetections(SessionResponse):
     emotion_detections: List[EmotionDetectionWithData] = []
+    relevant_urls: List[str] = []
+    # Check-ins moved to the archive, which the history does not list
+    archived_detections: int = 0
 
 # Your FeedbackCreate and FeedbackResponse were duplicated and inconsistent.
 # I've kept the one that matches your router's usage.
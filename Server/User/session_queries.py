@@ -0,0 +1,218 @@
+# session_queries.py
+import base64
+import json
+from datetime import datetime
+from typing import List, Optional, Tuple
+from fastapi import HTTPException
+from sqlalchemy import func, tuple_
+from sqlalchemy.orm import Session, selectinload
+from models import Session as SessionModel, DetectionArchive, EmotionDetection, FacialData, WellnessSuggestion
+from schemas import SessionOverview
+from emotions import vocabulary_for
+from checkins import suggestion_fields
+
+
+def encode_cursor(session: SessionModel) -> str:
+    """Opaque keyset cursor pointing just past the given session."""
+    raw = json.dumps({"t": session.start_time.isoformat(), "id": session.id})
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw)
+        return datetime.fromisoformat(data["t"]), int(data["id"])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def get_session_page(db: Session, user_id: int, limit: int, cursor: Optional[str] = None) -> Tuple[List[SessionModel], Optional[str]]:
+    """Newest-first page of the user's sessions after the cursor, plus the cursor for the next page.
+
+    Pages are keyed on (start_time, id) so every page is an index range scan on
+    sessions_user_start_idx, however far back the user scrolls.
+    """
+    query = db.query(SessionModel).filter(SessionModel.user_id == user_id)
+    if cursor:
+        start_time, session_id = decode_cursor(cursor)
+        query = query.filter(tuple_(SessionModel.start_time, SessionModel.id) < tuple_(start_time, session_id))
+    sessions = query.order_by(SessionModel.start_time.desc(), SessionModel.id.desc()).limit(limit + 1).all()
+    if len(sessions) > limit:
+        sessions = sessions[:limit]
+        return sessions, encode_cursor(sessions[-1])
+    return sessions, None
+
+
+def load_session_history(db: Session, session_id: int, user_id: int) -> Optional[SessionModel]:
+    """The user's session with its detections and their facial/voice/suggestion rows.
+
+    Each relation is fetched with one selectin query, so the statement count does not
+    grow with the number of detections in the session.
+    """
+    detections = selectinload(SessionModel.emotion_detections)
+    return db.query(SessionModel).options(
+        detections.selectinload(EmotionDetection.facial_data),
+        detections.selectinload(EmotionDetection.voice_data),
+        detections.selectinload(EmotionDetection.wellness_suggestions)
+    ).filter(
+        SessionModel.id == session_id,
+        SessionModel.user_id == user_id
+    ).first()
+
+
+def _first(rows):
+    # The history shows one row per relation per detection: the earliest stored
+    return min(rows, key=lambda row: row.id) if rows else None
+
+
+def serialize_session_history(db: Session, session: SessionModel) -> dict:
+    """Shape an eager-loaded session into the SessionWithDetections payload in one pass."""
+    color_of = vocabulary_for(db, {f.emotion_code for det in session.emotion_detections for f in det.facial_data}).color_of
+    detections = []
+    relevant_urls = {}
+    for det in sorted(session.emotion_detections, key=lambda d: d.id):
+        facial = _first(det.facial_data)
+        voice = _first(det.voice_data)
+        wellness = _first(det.wellness_suggestions)
+
+        wellness_data = None
+        if wellness and wellness.suggestion:
+            wellness_data = {
+                "id": wellness.id,
+                "detection_id": wellness.detection_id,
+                "suggestion": wellness.suggestion,
+                "acknowledgment": wellness.acknowledgment,
+                "suggestions": wellness.suggestions,
+                "url": wellness.urls
+            }
+            relevant_urls.update((u, None) for u in wellness.urls)
+
+        detections.append({
+            "id": det.id,
+            "session_id": det.session_id,
+            "timestamp": det.timestamp,
+            "facial_data": {"id": facial.id, "detection_id": facial.detection_id, "emotion": facial.emotion} if facial else None,
+            "voice_data": {"id": voice.id, "detection_id": voice.detection_id, "content": voice.content} if voice else None,
+            "wellness_suggestions": wellness_data,
+            "emotion_color": color_of[facial.emotion_code] if facial else "",
+            "facial_emotion": facial.emotion if facial else None
+        })
+
+    # Archived check-ins are not listed; say how many are left out
+    archived = db.query(func.count()).select_from(DetectionArchive).filter(
+        DetectionArchive.session_id == session.id,
+        DetectionArchive.user_id == session.user_id
+    ).scalar()
+    return {
+        "id": session.id,
+        "user_id": session.user_id,
+        "start_time": session.start_time,
+        "end_time": session.end_time,
+        "emotion_detections": detections,
+        "relevant_urls": list(relevant_urls),
+        "archived_detections": archived
+    }
+
+
+def get_dominant_emotions(db: Session, session_ids: List[int]) -> dict:
+    """Map session id -> most frequent facial emotion, archived detections included, in a single grouped query."""
+    if not session_ids:
+        return {}
+    hot = db.query(
+        EmotionDetection.session_id,
+        FacialData.emotion_code,
+        func.count(FacialData.id),
+        func.min(EmotionDetection.id)
+    ).join(
+        FacialData, FacialData.detection_id == EmotionDetection.id
+    ).filter(
+        EmotionDetection.session_id.in_(session_ids)
+    ).group_by(EmotionDetection.session_id, FacialData.emotion_code)
+    archived = db.query(
+        DetectionArchive.session_id,
+        DetectionArchive.emotion_code,
+        func.count(),
+        func.min(DetectionArchive.id)
+    ).filter(
+        DetectionArchive.session_id.in_(session_ids),
+        DetectionArchive.emotion_code.isnot(None)
+    ).group_by(DetectionArchive.session_id, DetectionArchive.emotion_code)
+
+    # A session straddling the retention cutoff has rows in both
+    counts = {}
+    for session_id, code, count, first_seen in hot.union_all(archived).all():
+        total, first = counts.get((session_id, code), (0, first_seen))
+        counts[session_id, code] = (total + count, min(first, first_seen))
+
+    # Highest count wins; ties go to the emotion seen first, like Counter.most_common
+    best = {}
+    for (session_id, code), (count, first_seen) in counts.items():
+        current = best.get(session_id)
+        if current is None or (count, -first_seen) > (current[1], -current[2]):
+            best[session_id] = (code, count, first_seen)
+    name_of = vocabulary_for(db, {value[0] for value in best.values()}).name_of
+    return {session_id: name_of[value[0]] for session_id, value in best.items()}
+
+
+def get_first_suggestions(db: Session, session_ids: List[int]) -> dict:
+    """Map session id -> summary of its first stored wellness suggestion, with one windowed query
+    over the hot rows and one over the archive."""
+    if not session_ids:
+        return {}
+    rank = func.row_number().over(
+        partition_by=EmotionDetection.session_id,
+        order_by=(EmotionDetection.id, WellnessSuggestion.id)
+    ).label("rank")
+    ranked = db.query(
+        EmotionDetection.session_id.label("session_id"),
+        WellnessSuggestion.summary.label("summary"),
+        rank
+    ).join(
+        WellnessSuggestion, WellnessSuggestion.detection_id == EmotionDetection.id
+    ).filter(
+        EmotionDetection.session_id.in_(session_ids),
+        WellnessSuggestion.suggestion != ""
+    ).subquery()
+    rows = db.query(ranked.c.session_id, ranked.c.summary).filter(ranked.c.rank == 1).all()
+    result = {session_id: suggestion for session_id, suggestion in rows}
+
+    archive_rank = func.row_number().over(
+        partition_by=DetectionArchive.session_id,
+        order_by=DetectionArchive.id
+    ).label("rank")
+    archived = db.query(
+        DetectionArchive.session_id.label("session_id"),
+        DetectionArchive.acknowledgment.label("acknowledgment"),
+        DetectionArchive.suggestions.label("suggestions"),
+        archive_rank
+    ).filter(
+        DetectionArchive.session_id.in_(session_ids),
+        DetectionArchive.acknowledgment.isnot(None),
+        DetectionArchive.acknowledgment != ""
+    ).subquery()
+    for session_id, acknowledgment, suggestions in db.query(
+        archived.c.session_id, archived.c.acknowledgment, archived.c.suggestions
+    ).filter(archived.c.rank == 1):
+        # Archived detections are older than any hot one in the same session
+        result[session_id] = suggestion_fields([acknowledgment, *(suggestions or [])], None)["summary"]
+    return result
+
+
+def get_session_overviews(db: Session, sessions: List[SessionModel]) -> List[SessionOverview]:
+    """Build SessionOverview rows for a page of sessions using a fixed number of queries."""
+    session_ids = [s.id for s in sessions]
+    dominant = get_dominant_emotions(db, session_ids)
+    suggestions = get_first_suggestions(db, session_ids)
+
+    result = []
+    for session in sessions:
+        result.append(SessionOverview(
+            id=session.id,
+            user_id=session.user_id,
+            start_time=session.start_time,
+            end_time=session.end_time,
+            dominant_emotion=dominant.get(session.id),
+            suggestion=suggestions.get(session.id)
+        ))
+    return result
@@ -0,0 +1,107 @@
+# suggestion_cache.py
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+from config import settings
+from emotions import normalize_emotion
+from redis_client import get_sync_redis
+import metrics
+
+Suggestion = Tuple[List[str], List[str]]
+
+
+def normalize_content(voice_content: str) -> str:
+    """Case and whitespace do not change the answer, so they do not change the key either."""
+    return " ".join((voice_content or "").lower().split())
+
+
+def cache_key(emotion: str, voice_content: str, prompt_version: int) -> str:
+    digest = hashlib.sha256(normalize_content(voice_content).encode()).hexdigest()
+    return f"suggestion:v{prompt_version}:{normalize_emotion(emotion)}:{digest}"
+
+
+class SuggestionCache:
+    """Model replies keyed by (emotion, content hash, prompt version).
+
+    A per-process LRU of max_entries sits in front of Redis, which is shared by every
+    worker. Both tiers expire entries after ttl_seconds; Redis evicts under memory
+    pressure according to its maxmemory-policy.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: int, redis=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.redis = redis
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _redis(self):
+        return self.redis or get_sync_redis()
+
+    def get(self, key: str) -> Optional[Suggestion]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                value, latency_ms = entry[1], entry[2]
+            else:
+                self._entries.pop(key, None)
+                value = None
+        if value is not None:
+            self._record_hit("local", latency_ms)
+            return value
+
+        try:
+            payload = self._redis().get(key)
+        except Exception as e:
+            print(f"Suggestion cache unavailable: {e}")
+            payload = None
+        if payload is None:
+            metrics.increment("suggestion_cache_miss")
+            return None
+        data = json.loads(payload)
+        value = (data["suggestions"], data["urls"])
+        self._remember(key, value, data["latency_ms"])
+        self._record_hit("redis", data["latency_ms"])
+        return value
+
+    def put(self, key: str, value: Suggestion, latency_ms: float):
+        """Store a reply along with how long the model took to produce it."""
+        self._remember(key, value, latency_ms)
+        try:
+            self._redis().set(
+                key,
+                json.dumps({"suggestions": value[0], "urls": value[1], "latency_ms": latency_ms}),
+                ex=self.ttl_seconds
+            )
+        except Exception as e:
+            print(f"Suggestion cache unavailable: {e}")
+
+    def _remember(self, key: str, value: Suggestion, latency_ms: float):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value, latency_ms)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _record_hit(self, tier: str, latency_ms: float):
+        metrics.increment("suggestion_cache_hit")
+        metrics.increment(f"suggestion_cache_hit_{tier}")
+        # Model time the hit avoided
+        metrics.increment("suggestion_cache_saved_ms", int(latency_ms))
+
+
+_cache = None
+
+
+def get_suggestion_cache() -> SuggestionCache:
+    global _cache
+    if _cache is None:
+        _cache = SuggestionCache(settings.suggestion_cache_size, settings.suggestion_cache_ttl_seconds)
+    return _cache
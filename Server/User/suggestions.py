@@ -0,0 +1,158 @@
+# suggestions.py
+import time
+from typing import List, Tuple
+from database import SessionLocal
+from models import EmotionDetection, WellnessSuggestion
+from checkins import parse_suggestion_text, save_suggestion
+from llm import UNAVAILABLE_MESSAGE, complete_with_fallback, get_suggestion_providers
+from crisis import contains_suicidal_keywords, is_crisis_check_in
+from suggestion_cache import cache_key, get_suggestion_cache
+from diagnosis_cache import invalidate_user
+import metrics
+
+# Part of the suggestion cache key; bump it whenever build_suggestion_prompt changes
+SUGGESTION_PROMPT_VERSION = 1
+
+
+def build_gemini_prompt(emotion: str, content: str) -> str:
+    """Build a tailored prompt for Gemini based on emotion type."""
+    base_prompt = """As a compassionate mental health assistant, respond to someone feeling {emotion} who shared:
+"{content}"
+
+Provide:
+1. A brief (10-15 word) empathetic acknowledgment of their emotion
+2. Three (3) concise wellness suggestions (12 words max each) tailored to their situation
+3. Format as: "[Acknowledgment] • Suggestion 1 • Suggestion 2 • Suggestion 3"
+
+Make suggestions practical, specific, and emotionally appropriate."""
+
+    # Emotion-specific prompt variations
+    if emotion in ["happy", "joyful", "excited", "content"]:
+        return f"""As a positivity coach, respond to someone feeling {emotion} who shared:
+"{content}"
+
+Provide:
+1. A warm validation (12-15 words)
+2. Three suggestions to:
+    - Deepen this positive state
+    - Share it with others
+    - Create lasting positive memories
+3. Format as: "It's wonderful you're feeling {emotion}! • Suggestion 1 • Suggestion 2 • Suggestion 3"
+
+Keep suggestions uplifting and practical."""
+
+    elif emotion in ["sad", "depressed", "lonely"]:
+        return f"""As a compassionate listener, respond to someone feeling {emotion} who shared:
+"{content}"
+
+Provide:
+1. A validating acknowledgment (12-15 words)
+2. Three gentle suggestions for:
+    - Immediate comfort
+    - Connection with others
+    - Small steps toward relief
+3. Format as: "I hear this {emotion} feeling is hard • Comfort idea • Connection suggestion • Small step"
+
+Use a warm, non-judgmental tone."""
+
+    elif emotion in ["angry", "furious", "frustrated"]:
+        return f"""As an emotional regulation coach, respond to someone feeling {emotion} who shared:
+"{content}"
+
+Provide:
+1. A validating but calming acknowledgment (12-15 words)
+2. Three suggestions for:
+    - Safe emotional release
+    - Shifting perspective
+    - Constructive action
+3. Format as: "{emotion.capitalize()} makes sense here • Release technique • Perspective shift • Action step"
+
+Keep suggestions practical and non-shaming."""
+
+    elif emotion in ["fearful", "anxious", "stressed", "overwhelmed"]:
+        return f"""As a calming presence, respond to someone feeling {emotion} who shared:
+"{content}"
+
+Provide:
+1. A grounding acknowledgment (12-15 words)
+2. Three suggestions for:
+    - Immediate calming
+    - Breaking down concerns
+    - Regaining control
+3. Format as: "{emotion.capitalize()} can feel overwhelming • Calming technique • Perspective tip • Action step"
+
+Make suggestions concrete and doable."""
+
+    else:   
+        return base_prompt.format(emotion=emotion, content=content)
+
+
+def build_suggestion_prompt(emotion: str, voice_content: str) -> str:
+    """Prompt for 1 acknowledgment + 4 actionable tips, and up to 5 Reddit/Quora URLs."""
+    if contains_suicidal_keywords(voice_content):
+        return (
+            "The user has expressed thoughts of suicide or self-harm. "
+            "Your role is to be extremely gentle, calm, and supportive. "
+            "Do NOT judge or dismiss their feelings. "
+            "Encourage them to reach out to a mental health professional or crisis hotline immediately. "
+            "Provide immediate comfort, grounding techniques, and remind them they are not alone. "
+            "Format: 1 direct, empathetic acknowledgment/comforting statement as the first bullet (address the user's feelings and situation), then 4 short, direct-to-the-point actionable bullet points (max 1 sentence each, no URLs in text). "
+            "After the suggestions, provide up to 5 relevant, working URLs from Reddit or Quora only, one per line, not included in the suggestion text. Do not include 'url not found' or broken links."
+            f"\nUser's message: '{voice_content}'"
+        )
+    return (
+        build_gemini_prompt(emotion.lower(), voice_content) +
+        "\nFormat the suggestions as 5 bullet points: the first bullet is a direct, empathetic acknowledgment/comforting statement for the user's feelings and situation, and the next 4 are short, actionable coping tips (max 1 sentence each, no URLs in text). After the suggestions, provide up to 5 relevant, working URLs from Reddit or Quora only, one per line, not included in the suggestion text. Do not include 'url not found' or broken links. Example output:\n- Acknowledgment.\n- Tip 1.\n- Tip 2.\n- Tip 3.\n- Tip 4.\n[URLs start here, one per line]"
+    )
+
+
+def generate_suggestions(emotion: str, voice_content: str) -> Tuple[List[str], List[str]]:
+    """Return (suggestions, urls), from the suggestion cache when the same emotion and content were answered before.
+
+    Crisis check-ins always get a fresh answer and are never cached.
+    """
+    prompt = build_suggestion_prompt(emotion, voice_content)
+    if is_crisis_check_in(emotion, voice_content):
+        metrics.increment("suggestion_cache_bypass")
+        return parse_suggestion_text(complete_with_fallback(prompt, get_suggestion_providers()))
+
+    cache = get_suggestion_cache()
+    key = cache_key(emotion, voice_content, SUGGESTION_PROMPT_VERSION)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+    started = time.perf_counter()
+    suggestion_text = complete_with_fallback(prompt, get_suggestion_providers())
+    result = parse_suggestion_text(suggestion_text)
+    # The "unavailable" placeholder is not an answer worth keeping
+    if suggestion_text != UNAVAILABLE_MESSAGE:
+        cache.put(key, result, (time.perf_counter() - started) * 1000)
+    return result
+
+
+def run_suggestion_job(payload: dict) -> dict:
+    """Worker handler: generate one suggestion and store it for every detection in the job.
+
+    Batched check-ins with the same emotion and content share a job, so the model is asked once.
+    Detections that already have a suggestion are skipped, since a job whose worker died is run again.
+    The owners' cached diagnoses are dropped once the suggestion is stored.
+    """
+    suggestions_list, urls_list = generate_suggestions(payload["emotion"], payload["voice_content"])
+    db = SessionLocal()
+    try:
+        stored = {detection_id for detection_id, in db.query(WellnessSuggestion.detection_id).filter(
+            WellnessSuggestion.detection_id.in_(payload["detection_ids"])
+        )}
+        added = [detection_id for detection_id in payload["detection_ids"] if detection_id not in stored]
+        for detection_id in added:
+            save_suggestion(db, detection_id, suggestions_list, urls_list)
+        owners = [user_id for user_id, in db.query(EmotionDetection.user_id).filter(
+            EmotionDetection.id.in_(added)
+        ).distinct()] if added else []
+        db.commit()
+        # Diagnoses cached since the check-in were written without this suggestion in the prompt
+        for user_id in owners:
+            invalidate_user(user_id)
+    finally:
+        db.close()
+    return {"detection_ids": payload["detection_ids"], "suggestions": suggestions_list, "urls": urls_list}
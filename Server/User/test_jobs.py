@@ -0,0 +1,86 @@
+"""
+Tests for the background job queue, using the in-process queue and a dict standing in for Redis
+"""
+
+import time
+from jobs import LocalJobQueue, RedisJobQueue, WorkerPool, QUEUE_KEY, _heartbeat_key
+
+
+def wait_for(job_queue, job_id, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = job_queue.get(job_id)
+        if job["status"] != "pending":
+            return job
+        time.sleep(0.01)
+    raise AssertionError("job did not finish")
+
+
+def test_worker_pool_runs_jobs_and_stores_results():
+    job_queue = LocalJobQueue()
+    pool = WorkerPool(job_queue, lambda payload: {"doubled": payload["n"] * 2}, size=2)
+    pool.start()
+    try:
+        job_ids = [job_queue.enqueue({"n": n}, owner_id=7) for n in range(5)]
+        assert job_queue.get(job_ids[0])["owner_id"] == 7
+        results = [wait_for(job_queue, job_id) for job_id in job_ids]
+    finally:
+        pool.stop()
+    assert [r["status"] for r in results] == ["done"] * 5
+    assert [r["result"]["doubled"] for r in results] == [0, 2, 4, 6, 8]
+
+
+def test_failed_job_is_reported():
+    def broken(payload):
+        raise RuntimeError("model unavailable")
+
+    job_queue = LocalJobQueue()
+    pool = WorkerPool(job_queue, broken, size=1)
+    pool.start()
+    try:
+        job = wait_for(job_queue, job_queue.enqueue({}, owner_id=1))
+    finally:
+        pool.stop()
+    assert job["status"] == "failed"
+    assert job["result"] == {"error": "model unavailable"}
+
+
+def test_local_queue_forgets_jobs_after_the_ttl():
+    job_queue = LocalJobQueue(ttl_seconds=0.05)
+    old = job_queue.enqueue({}, owner_id=1)
+    job_queue.finish(old, "done", {})
+    assert job_queue.get(old)["status"] == "done"
+    time.sleep(0.06)
+    assert job_queue.get(old) is None
+    job_queue.enqueue({}, owner_id=1)
+    assert old not in job_queue._jobs
+
+
+def test_redis_queue_acknowledges_finished_jobs(fake_redis):
+    job_queue = RedisJobQueue(fake_redis)
+    job_id = job_queue.enqueue({"n": 1}, owner_id=7)
+    assert job_queue.dequeue(timeout=1) == (job_id, {"n": 1})
+    # Claimed, not yet acknowledged
+    assert fake_redis.lrange(QUEUE_KEY, 0, -1) == []
+    assert len(fake_redis.lrange(job_queue.processing_key, 0, -1)) == 1
+
+    job_queue.finish(job_id, "done", {"doubled": 2})
+    assert fake_redis.lrange(job_queue.processing_key, 0, -1) == []
+    assert job_queue.get(job_id) == {"status": "done", "owner_id": 7, "result": {"doubled": 2}}
+    assert job_queue.dequeue(timeout=1) is None
+
+
+def test_redis_queue_requeues_jobs_of_dead_workers_in_order(fake_redis):
+    dead = RedisJobQueue(fake_redis)
+    job_ids = [dead.enqueue({"n": n}, owner_id=1) for n in range(3)]
+    later = dead.enqueue({"n": 3}, owner_id=1)
+    assert [dead.dequeue(timeout=1)[0] for _ in range(3)] == job_ids
+
+    alive = RedisJobQueue(fake_redis)
+    # The worker is still beating, so its jobs stay put
+    assert alive.requeue_stale() == 0
+    fake_redis.delete(_heartbeat_key(dead.worker_id))
+    assert alive.requeue_stale() == 3
+    assert fake_redis.lrange(dead.processing_key, 0, -1) == []
+    # The stranded jobs run first, oldest first, then the one that was still waiting
+    assert [alive.dequeue(timeout=1)[0] for _ in range(4)] == job_ids + [later]
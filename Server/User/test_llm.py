@@ -0,0 +1,218 @@
+"""
+Tests for the LLM provider helpers, using the offline fake provider
+"""
+
+import json
+import pytest
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import llm
+from llm import (
+    UNAVAILABLE_MESSAGE, CircuitBreaker, StreamInterrupted, FakeProvider, OpenRouterProvider, complete_with_fallback,
+    stream_with_fallback, sse_event, init_providers, close_providers, get_diagnosis_providers
+)
+from suggestion_cache import SuggestionCache, cache_key
+import suggestions
+import metrics
+
+
+class BrokenProvider:
+    name = "broken"
+
+    def stream(self, prompt):
+        raise RuntimeError("provider down")
+        yield
+
+
+def test_fake_provider_streams_reply_in_pieces():
+    tokens = list(FakeProvider(reply="You are doing okay.").stream("prompt"))
+    assert len(tokens) == 4
+    assert "".join(tokens) == "You are doing okay."
+
+
+def test_stream_falls_back_before_first_token():
+    tokens = list(stream_with_fallback("prompt", [BrokenProvider(), FakeProvider(reply="Take a breath.")]))
+    assert "".join(tokens) == "Take a breath."
+
+
+def test_stream_reports_when_every_provider_fails():
+    tokens = list(stream_with_fallback("prompt", [BrokenProvider()]))
+    assert tokens == ["AI awareness unavailable. Please try again later."]
+
+
+def test_stream_failing_after_first_token_is_reported():
+    class CutOffProvider(FakeProvider):
+        def stream(self, prompt):
+            yield "You are "
+            raise RuntimeError("connection reset")
+
+    stream = stream_with_fallback("prompt", [CutOffProvider(), FakeProvider(reply="Take a breath.")])
+    assert next(stream) == "You are "
+    with pytest.raises(StreamInterrupted):
+        next(stream)
+
+
+def test_stream_moves_on_when_the_first_token_is_late():
+    slow = FakeProvider(reply="Slow.", delay=2.0, name="gemini")
+    started = time.monotonic()
+    tokens = list(stream_with_fallback("prompt", [slow, FakeProvider(reply="Take a breath.")], deadline=0.2))
+    assert "".join(tokens) == "Take a breath."
+    assert time.monotonic() - started < 1.0
+    assert slow.breaker.failures == 1
+
+
+def test_sse_event_format():
+    frame = sse_event("token", {"text": "hi"})
+    assert frame.startswith("event: token\ndata: ")
+    assert frame.endswith("\n\n")
+    assert json.loads(frame.split("data: ", 1)[1]) == {"text": "hi"}
+
+
+def test_providers_are_built_once_and_shared():
+    init_providers("fake")
+    try:
+        first = get_diagnosis_providers()
+        assert get_diagnosis_providers() is first
+        init_providers("fake")
+        assert get_diagnosis_providers() is not first
+    finally:
+        close_providers()
+
+
+def test_complete_gives_up_at_the_deadline():
+    slow = FakeProvider(delay=2.0)
+    started = time.monotonic()
+    assert complete_with_fallback("prompt", [slow], deadline=0.2) == UNAVAILABLE_MESSAGE
+    assert time.monotonic() - started < 1.0
+
+
+def test_open_breaker_skips_a_failing_provider():
+    down = FakeProvider(delay=0.3, error=RuntimeError("brownout"), name="gemini")
+    down.breaker = CircuitBreaker(failure_threshold=2, reset_seconds=60)
+    backup = FakeProvider(reply="Breathe.", name="openrouter")
+    for _ in range(2):
+        assert complete_with_fallback("prompt", [down, backup], deadline=5, hedge_after=0) == "Breathe."
+    assert not down.breaker.allow()
+
+    started = time.monotonic()
+    assert complete_with_fallback("prompt", [down, backup], deadline=5, hedge_after=0) == "Breathe."
+    assert time.monotonic() - started < 0.2
+
+
+def test_breaker_lets_one_trial_call_through_after_reset():
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0.05)
+    breaker.record_failure()
+    assert not breaker.allow()
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.allow()
+
+
+def test_closing_a_trial_stream_early_frees_the_trial():
+    provider = FakeProvider(reply="Take a slow breath now.")
+    provider.breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0)
+    provider.breaker.record_failure()
+    stream = stream_with_fallback("prompt", [provider])
+    assert next(stream) == "Take "
+    # The client disconnects mid-stream
+    stream.close()
+    assert provider.breaker.allow()
+
+
+def test_calls_still_queued_at_the_deadline_are_cancelled(monkeypatch):
+    pool = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(llm, "_executor", pool)
+    slow = FakeProvider(delay=0.5, name="gemini")
+    calls = []
+    queued = FakeProvider(name="openrouter")
+    queued.complete = lambda prompt: calls.append(prompt) or "Late."
+    queued.breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0)
+    queued.breaker.record_failure()
+
+    assert complete_with_fallback("prompt", [slow, queued], deadline=0.2, hedge_after=0.05) == UNAVAILABLE_MESSAGE
+    pool.shutdown(wait=True)
+    assert calls == []
+    # Its trial slot was handed back
+    assert queued.breaker.allow()
+
+
+def test_hedge_takes_the_first_answer():
+    slow = FakeProvider(reply="Slow.", delay=2.0, name="gemini")
+    fast = FakeProvider(reply="Fast.", delay=0.05, name="openrouter")
+    started = time.monotonic()
+    assert complete_with_fallback("prompt", [slow, fast], deadline=5, hedge_after=0.1) == "Fast."
+    assert time.monotonic() - started < 1.0
+
+
+class ChatHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        body = json.dumps({"choices": [{"message": {"content": "Breathe."}}]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_openrouter_provider_reuses_its_connection():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ChatHandler)
+    server.connections = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    provider = OpenRouterProvider(f"http://127.0.0.1:{server.server_port}/chat", "key")
+    try:
+        assert [provider.complete("prompt") for _ in range(5)] == ["Breathe."] * 5
+        assert server.connections == 1
+    finally:
+        provider.close()
+        server.shutdown()
+
+
+def test_suggestion_cache_lru_and_shared_tier(fake_redis):
+    redis = fake_redis
+    cache = SuggestionCache(max_entries=2, ttl_seconds=60, redis=redis)
+    keys = [cache_key("Sad", f"note {i}", 1) for i in range(3)]
+    for i, key in enumerate(keys):
+        cache.put(key, ([f"tip {i}"], []), latency_ms=500)
+    assert cache_key("sad ", "  NOTE 0 ", 1) == keys[0]
+    assert list(cache._entries) == keys[1:]
+
+    before = metrics.snapshot()
+    # Evicted locally, still in Redis
+    assert cache.get(keys[0]) == (["tip 0"], [])
+    assert cache.get(keys[0]) == (["tip 0"], [])
+    assert SuggestionCache(2, 60, redis=redis).get(cache_key("Sad", "note 0", 2)) is None
+    after = metrics.snapshot()
+    assert after["suggestion_cache_hit_redis"] - before.get("suggestion_cache_hit_redis", 0) == 1
+    assert after["suggestion_cache_hit_local"] - before.get("suggestion_cache_hit_local", 0) == 1
+    assert after["suggestion_cache_saved_ms"] - before.get("suggestion_cache_saved_ms", 0) == 1000
+    assert 0 < after["suggestion_cache_hit_ratio"] < 1
+
+
+def test_generate_suggestions_uses_cache_but_not_for_crisis(monkeypatch, fake_redis):
+    calls = []
+    monkeypatch.setattr(suggestions, "complete_with_fallback", lambda prompt, providers: calls.append(prompt) or "- Breathe.\n- Walk.")
+    monkeypatch.setattr(suggestions, "get_suggestion_providers", lambda: [])
+    cache = SuggestionCache(10, 60, redis=fake_redis)
+    monkeypatch.setattr(suggestions, "get_suggestion_cache", lambda: cache)
+
+    first = suggestions.generate_suggestions("Sad", "Long day at work")
+    assert suggestions.generate_suggestions("sad", "long day  at work") == first
+    assert len(calls) == 1
+    suggestions.generate_suggestions("Sad", "I want to end my life")
+    suggestions.generate_suggestions("Sad", "I want to end my life")
+    assert len(calls) == 3
@@ -0,0 +1,584 @@
+"""
+Tests for the session query helpers, run against an in-memory SQLite database
+"""
+
+import asyncio
+import csv
+import io
+import json
+import pytest
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from database import Base
+from models import User, Session as SessionModel, EmotionDetection, FacialData, VoiceData, WellnessSuggestion, DetectionArchive, Feedback, EmotionDailyRollup
+from session_queries import get_session_overviews, get_session_page, load_session_history, serialize_session_history
+from rollups import record_detection, backfill_rollups, get_daily_rollups, local_day_of, set_user_timezone, DEFAULT_TZ, get_zone
+from charts import get_daily_chart_rows, get_long_range_chart_rows
+from checkins import save_check_in, save_check_in_batch, suggestion_fields, delete_session_cascade
+from emotions import emotion_code, emotion_codes, get_vocabulary
+from models import Emotion
+from exports import iter_export_rows, ndjson_chunks, csv_chunks
+from crisis import contains_suicidal_keywords, backfill_crisis_flags
+from activity import get_activity, record_session_start, rebuild_activity
+from schemas import SessionCreate
+from routers.sessions import create_session, get_dashboard, get_diagnosis, stream_diagnosis, DiagnosisRequest
+from diagnosis_cache import note_new_detection, invalidate_user
+from llm import UNAVAILABLE_MESSAGE, FakeProvider
+import metrics
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    db.statements = []
+    event.listen(engine, "before_cursor_execute", lambda conn, cursor, statement, *args: db.statements.append(statement))
+    yield db
+    db.close()
+
+
+def make_user(db, email="user@example.com"):
+    user = User(email=email, password="x", first_name="Test", last_name="User", role="user", status="active")
+    db.add(user)
+    db.flush()
+    return user
+
+
+def make_sessions(db, user, count, emotions=("sad", "happy", "sad")):
+    start = datetime(2025, 1, 1)
+    for i in range(count):
+        session = SessionModel(user_id=user.id, start_time=start + timedelta(hours=i))
+        db.add(session)
+        db.flush()
+        for j, emotion in enumerate(emotions):
+            detection = EmotionDetection(session_id=session.id, user_id=user.id, timestamp=session.start_time, local_day=local_day_of(session.start_time))
+            db.add(detection)
+            db.flush()
+            db.add(FacialData(detection_id=detection.id, emotion=emotion.capitalize(), emotion_code=emotion_code(db, emotion)))
+            db.add(WellnessSuggestion(detection_id=detection.id, **suggestion_fields([f"Tip {j}. Breathe slowly"], None)))
+    db.commit()
+
+
+def overview_statement_count(db, user, limit):
+    sessions = db.query(SessionModel).filter(SessionModel.user_id == user.id).limit(limit).all()
+    db.statements.clear()
+    overviews = get_session_overviews(db, sessions)
+    assert len(overviews) == limit
+    return len(db.statements), overviews
+
+
+def test_session_overview_values(db):
+    user = make_user(db)
+    make_sessions(db, user, 1)
+    _, overviews = overview_statement_count(db, user, 1)
+    assert overviews[0].dominant_emotion == "sad"
+    assert overviews[0].suggestion == "- Tip 0"
+
+
+def test_session_overview_tie_keeps_first_seen_emotion(db):
+    user = make_user(db)
+    make_sessions(db, user, 1, emotions=("happy", "sad"))
+    _, overviews = overview_statement_count(db, user, 1)
+    assert overviews[0].dominant_emotion == "happy"
+
+
+def test_session_overview_statement_count_is_constant(db):
+    user = make_user(db)
+    make_sessions(db, user, 20)
+    small, _ = overview_statement_count(db, user, 2)
+    large, _ = overview_statement_count(db, user, 20)
+    # Dominant emotions, first hot suggestions, first archived suggestions
+    assert small == large == 3
+
+
+def test_session_pages_walk_every_session_once(db):
+    user = make_user(db)
+    make_sessions(db, user, 7, emotions=())
+    # Two sessions sharing a start time must still land on exactly one page each
+    db.add(SessionModel(user_id=user.id, start_time=datetime(2025, 1, 1, 3)))
+    db.commit()
+    expected = [s.id for s in db.query(SessionModel).order_by(SessionModel.start_time.desc(), SessionModel.id.desc())]
+
+    seen, cursor = [], None
+    while True:
+        sessions, cursor = get_session_page(db, user.id, 3, cursor)
+        seen.extend(s.id for s in sessions)
+        if cursor is None:
+            break
+    assert seen == expected
+
+
+def test_session_history_statement_count_is_constant(db):
+    user = make_user(db)
+    make_sessions(db, user, 2, emotions=("sad",) * 3)
+    make_sessions(db, user, 1, emotions=("sad", "happy") * 50)
+    user_id = user.id
+
+    counts = []
+    for session in db.query(SessionModel).order_by(SessionModel.id).all():
+        session_id = session.id
+        db.expunge_all()
+        db.statements.clear()
+        history = serialize_session_history(db, load_session_history(db, session_id, user_id))
+        counts.append(len(db.statements))
+    # session, detections, one query each for facial, voice and suggestion rows, then the archived count
+    assert counts == [6, 6, 6]
+    assert len(history["emotion_detections"]) == 100
+    first = history["emotion_detections"][0]
+    assert first["facial_emotion"] == "Sad"
+    assert first["wellness_suggestions"]["acknowledgment"] == "Tip 0. Breathe slowly"
+    assert load_session_history(db, session_id, user_id + 1) is None
+
+
+def test_delete_session_is_set_based_and_keeps_rollups_in_step(db):
+    user = make_user(db)
+    make_sessions(db, user, 1, emotions=("sad", "happy"))
+    make_sessions(db, user, 1, emotions=("sad", "happy") * 50)
+    user_id = user.id
+    small_id, big_id = [row.id for row in db.query(SessionModel.id).order_by(SessionModel.id)]
+    db.add(Feedback(session_id=big_id, comment="ok", rating=5))
+    backfill_rollups(db, user_id)
+
+    counts = []
+    for session_id in (small_id, big_id):
+        db.statements.clear()
+        assert delete_session_cascade(db, user_id, session_id)
+        counts.append(len(db.statements))
+    # The count depends on the session's mix of intensities, not on its number of check-ins
+    assert counts[0] == counts[1]
+    assert not delete_session_cascade(db, user_id, big_id)
+    for model in (SessionModel, EmotionDetection, FacialData, WellnessSuggestion, Feedback, EmotionDailyRollup):
+        assert db.query(model).count() == 0
+
+
+def test_activity_summary_follows_session_writes(db):
+    user = make_user(db)
+    user_id = user.id
+    session_ids = []
+    for day in (1, 2, 3):
+        session = SessionModel(user_id=user_id, start_time=datetime(2025, 1, day))
+        db.add(session)
+        record_session_start(db, user_id, session.start_time)
+        db.commit()
+        session_ids.append(session.id)
+    detection_id = save_check_in(db, user_id, session_ids[0], "sad", "", timestamp=datetime(2025, 1, 1, 9))
+    assert delete_session_cascade(db, user_id, session_ids[2])
+
+    activity = get_activity(db, user_id)
+    assert (activity.session_count, activity.last_session_at, activity.last_detection_id) == (2, datetime(2025, 1, 2), detection_id)
+    kept = (activity.session_count, activity.first_session_at, activity.last_session_at, activity.last_detection_id)
+    rebuild_activity(db, user_id)
+    db.expire_all()
+    activity = get_activity(db, user_id)
+    assert (activity.session_count, activity.first_session_at, activity.last_session_at, activity.last_detection_id) == kept
+
+
+def test_dashboard_endpoint(db):
+    user = make_user(db)
+    session_ids = [create_session(SessionCreate(), db, user).id for _ in range(3)]
+    for emotion in ["Sad", "Happy", "Sad"]:
+        save_check_in(db, user.id, session_ids[0], emotion, "", [])
+
+    dashboard = get_dashboard(window="week", tz=None, limit=2, db=db, current_user=user)
+    assert dashboard["count"] == 3
+    assert [s.id for s in dashboard["sessions"]] == session_ids[:0:-1]
+    rest, next_cursor = get_session_page(db, user.id, 2, dashboard["next_cursor"])
+    assert [s.id for s in rest] == [session_ids[0]] and next_cursor is None
+
+    today = str(datetime.now(DEFAULT_TZ).date())
+    intensity = {row["day"]: row for row in dashboard["intensity_chart"]}
+    assert len(intensity) == 7
+    assert intensity[today]["dominant_emotion"] == "sad"
+    assert intensity[today]["intensity_tally"] == {"mild": 1, "moderate": 0, "severe": 2}
+    assert sum(sum(row["intensity_tally"].values()) for row in intensity.values()) == 3
+    assert {row["day"]: row["dominant_emotion"] for row in dashboard["dominant_emotion_chart"]} == {
+        day: row["dominant_emotion"] for day, row in intensity.items()
+    }
+
+
+def test_diagnosis_endpoint_cache(db, monkeypatch, fake_redis):
+    monkeypatch.setattr("diagnosis_cache.get_sync_redis", lambda: fake_redis)
+    replies = ["You seem low.", UNAVAILABLE_MESSAGE, "Things look brighter."]
+    calls = []
+    monkeypatch.setattr("routers.sessions.complete_with_fallback", lambda prompt, providers: calls.append(prompt) or replies[0])
+    monkeypatch.setattr("routers.sessions.get_diagnosis_providers", lambda: [])
+    user = make_user(db)
+    session_id = create_session(SessionCreate(), db, user).id
+    save_check_in(db, user.id, session_id, "Sad", "Long day", [])
+    req = DiagnosisRequest(window="all")
+
+    def diagnose():
+        before = metrics.snapshot().get("diagnosis_cache_hit", 0)
+        result = get_diagnosis(req, db, user)
+        return result["diagnosis"], metrics.snapshot().get("diagnosis_cache_hit", 0) - before
+
+    assert diagnose() == ("You seem low.", 0)
+    assert diagnose() == ("You seem low.", 1)
+    assert len(calls) == 1
+
+    # A new check-in moves the key on
+    note_new_detection(user.id, save_check_in(db, user.id, session_id, "Happy", "Better now", []))
+    replies.pop(0)
+    assert diagnose() == (UNAVAILABLE_MESSAGE, 0)
+    # The outage notice was not stored
+    replies.pop(0)
+    assert diagnose() == ("Things look brighter.", 0)
+    assert diagnose() == ("Things look brighter.", 1)
+
+    invalidate_user(user.id)
+    assert diagnose() == ("Things look brighter.", 0)
+    assert len(calls) == 4
+
+
+class CutOffProvider(FakeProvider):
+    """Streams the start of a reply, then fails."""
+
+    def stream(self, prompt):
+        yield "You are experiencing "
+        raise RuntimeError("connection reset")
+
+
+def read_events(response):
+    async def collect():
+        return [chunk async for chunk in response.body_iterator]
+    frames = "".join(asyncio.run(collect())).strip().split("\n\n")
+    return [(frame.split("\n")[0][len("event: "):], json.loads(frame.split("\n")[1][len("data: "):])) for frame in frames]
+
+
+def test_diagnosis_stream_endpoint(db, monkeypatch, fake_redis):
+    monkeypatch.setattr("diagnosis_cache.get_sync_redis", lambda: fake_redis)
+    providers = [CutOffProvider()]
+    monkeypatch.setattr("routers.sessions.get_diagnosis_providers", lambda: providers)
+    user = make_user(db)
+    session_id = create_session(SessionCreate(), db, user).id
+    save_check_in(db, user.id, session_id, "Sad", "Long day", [])
+    req = DiagnosisRequest(window="all")
+
+    # A reply cut off mid-way ends in an error event and is not cached
+    events = read_events(stream_diagnosis(req, db, user))
+    assert [name for name, _ in events] == ["summary", "token", "error"]
+    assert not [key for key in fake_redis.values if ":all:" in key]
+
+    providers[:] = [FakeProvider(reply="You seem low.")]
+    events = read_events(stream_diagnosis(req, db, user))
+    assert [name for name, _ in events] == ["summary", "token", "token", "token", "done"]
+    assert events[-1][1]["diagnosis"] == "You seem low."
+    # The complete reply is cached and replayed in one token
+    events = read_events(stream_diagnosis(req, db, user))
+    assert [name for name, _ in events] == ["summary", "token", "done"]
+    assert events[1][1] == {"text": "You seem low."}
+
+
+def test_rollup_write_path_matches_backfill(db):
+    user = make_user(db)
+    make_sessions(db, user, 3)
+    for detection, facial in db.query(EmotionDetection, FacialData).join(FacialData).all():
+        record_detection(db, user.id, local_day_of(detection.timestamp), facial.emotion_code)
+    db.commit()
+    incremental = get_daily_rollups(db, user.id, datetime(2024, 1, 1).date())
+
+    assert backfill_rollups(db, user.id) == 2
+    rebuilt = get_daily_rollups(db, user.id, datetime(2024, 1, 1).date())
+    assert incremental == rebuilt
+    day = next(iter(rebuilt))
+    assert rebuilt[day][emotion_code(db, "sad")] == {"mild": 0, "moderate": 0, "severe": 6}
+    assert rebuilt[day][emotion_code(db, "happy")] == {"mild": 3, "moderate": 0, "severe": 0}
+
+
+def test_daily_chart_rows_pick_mode_in_one_query(db):
+    user = make_user(db)
+    make_sessions(db, user, 2)
+    user_id = user.id
+    backfill_rollups(db, user_id)
+    db.statements.clear()
+    daily = get_daily_chart_rows(db, user_id, datetime(2024, 1, 1, tzinfo=DEFAULT_TZ), DEFAULT_TZ)
+    assert len(db.statements) == 1
+    assert list(daily.values()) == [("sad", {"mild": 2, "moderate": 0, "severe": 4})]
+
+
+def test_long_range_chart_rows_match_daily_rows_and_downsample(db):
+    user = make_user(db)
+    user_id = user.id
+    session = SessionModel(user_id=user_id, start_time=datetime.now(DEFAULT_TZ))
+    db.add(session)
+    db.commit()
+    # SQLite keeps only the wall time, so store UTC the way Postgres normalises it
+    now = datetime.now(timezone.utc)
+    emotions = ["Sad", "Happy", "Angry", "Happy", "Neutral"]
+    save_check_in_batch(db, user_id, [
+        {"session_id": session.id, "emotion": emotions[i % 5], "voice_content": "", "timestamp": now - timedelta(hours=7 * i)}
+        for i in range(1000)
+    ])
+    since = (now.astimezone(DEFAULT_TZ) - timedelta(days=365)).replace(hour=0, minute=0, second=0, microsecond=0)
+
+    daily, days = get_long_range_chart_rows(db, user_id, since, DEFAULT_TZ, max_points=1000)
+    assert len(days) == 366
+    assert daily == get_daily_chart_rows(db, user_id, since, DEFAULT_TZ)
+
+    db.statements.clear()
+    points, point_days = get_long_range_chart_rows(db, user_id, since, DEFAULT_TZ, max_points=50)
+    # Detections carry their user, so the window is a range scan without the sessions table
+    assert not any("sessions" in statement for statement in db.statements)
+    assert len(point_days) == 50 and point_days[0] == days[0]
+    assert sum(sum(tally.values()) for _, tally in points.values()) == 1000
+
+
+def test_chart_rows_in_another_timezone(db):
+    user = make_user(db)
+    user_id = user.id
+    session = SessionModel(user_id=user_id, start_time=datetime.now(DEFAULT_TZ))
+    db.add(session)
+    db.commit()
+    now = datetime.now(timezone.utc)
+    check_ins = [("Sad", 2), ("Happy", 14), ("Sad", 15), ("Angry", 26), ("Happy", 38)]
+    for emotion, hours_ago in check_ins:
+        save_check_in(db, user_id, session.id, emotion, "", [], timestamp=now - timedelta(hours=hours_ago))
+    since = now - timedelta(days=3)
+
+    # The detection path must bucket like the rollups did
+    assert get_daily_chart_rows(db, user_id, since, DEFAULT_TZ, user_zone=get_zone("UTC")) == get_daily_chart_rows(db, user_id, since, DEFAULT_TZ)
+
+    utc = get_zone("UTC")
+    daily = get_daily_chart_rows(db, user_id, since, utc, user_zone=DEFAULT_TZ)
+    expected = {}
+    for emotion, hours_ago in check_ins:
+        expected.setdefault((now - timedelta(hours=hours_ago)).date(), []).append(emotion)
+    assert set(daily) == set(expected)
+    for day, emotions in expected.items():
+        assert sum(daily[day][1].values()) == len(emotions)
+
+
+def test_archived_detections_still_count_in_rollups_and_charts(db):
+    user = make_user(db)
+    session = SessionModel(user_id=user.id, start_time=datetime(2020, 1, 1, tzinfo=timezone.utc))
+    db.add(session)
+    db.commit()
+    user_id, session_id = user.id, session.id
+    old_id = save_check_in(db, user_id, session_id, "sad", "", timestamp=datetime(2020, 1, 1, 12, tzinfo=timezone.utc))
+    save_check_in(db, user_id, session_id, "happy", "", timestamp=datetime.now(timezone.utc))
+    before = get_daily_rollups(db, user_id, datetime(2019, 1, 1).date())
+
+    # What archive_detections does for the old month
+    old = db.get(EmotionDetection, old_id)
+    db.add(DetectionArchive(
+        id=old.id, timestamp=old.timestamp, session_id=session_id, user_id=user_id, local_day=old.local_day,
+        emotion="sad", emotion_code=emotion_code(db, "sad"), voice_content=""
+    ))
+    for model in (FacialData, VoiceData):
+        db.query(model).filter(model.detection_id == old_id).delete()
+    db.delete(old)
+    db.commit()
+
+    assert backfill_rollups(db, user_id) == 2
+    assert get_daily_rollups(db, user_id, datetime(2019, 1, 1).date()) == before
+    points, _ = get_long_range_chart_rows(db, user_id, None, DEFAULT_TZ)
+    assert sum(sum(tally.values()) for _, tally in points.values()) == 2
+
+    # The export still has the whole history; the session history says what it leaves out
+    exported = list(iter_export_rows(db, user_id))
+    assert [(row["detection_id"], row["emotion"], row["intensity"]) for row in exported][0] == (old_id, "sad", "severe")
+    assert len(exported) == 2
+    history = serialize_session_history(db, load_session_history(db, session_id, user_id))
+    assert len(history["emotion_detections"]) == 1 and history["archived_detections"] == 1
+
+    archived_session = SessionModel(user_id=user_id, start_time=datetime(2020, 2, 1, tzinfo=timezone.utc))
+    db.add(archived_session)
+    db.flush()
+    db.add(DetectionArchive(
+        id=old_id + 100, timestamp=datetime(2020, 2, 1, tzinfo=timezone.utc), session_id=archived_session.id, user_id=user_id,
+        emotion="Angry", emotion_code=emotion_code(db, "angry"), acknowledgment="You are not alone. Reach out.", suggestions=["Walk."], urls=[]
+    ))
+    db.commit()
+    overview, = get_session_overviews(db, [archived_session])
+    assert (overview.dominant_emotion, overview.suggestion) == ("angry", "- You are not alone")
+
+
+def test_save_check_in_writes_everything_and_closes_session(db):
+    user = make_user(db)
+    session = SessionModel(user_id=user.id, start_time=datetime(2025, 1, 1))
+    db.add(session)
+    db.commit()
+    user_id, session_id = user.id, session.id
+
+    detection_id = save_check_in(db, user_id, session_id, "Sad", "Long day", ["I hear you.", "Rest."], ["https://reddit.com/r/a"])
+
+    detection = db.get(EmotionDetection, detection_id)
+    assert detection.facial_data[0].emotion == "Sad"
+    assert detection.voice_data[0].content == "Long day"
+    wellness = detection.wellness_suggestions[0]
+    assert wellness.suggestion == "- I hear you.\n- Rest."
+    assert (wellness.acknowledgment, wellness.suggestions, wellness.summary) == ("I hear you.", ["Rest."], "- I hear you")
+    assert wellness.urls == ["https://reddit.com/r/a"]
+    ended = db.get(SessionModel, session_id).end_time
+    assert ended is not None
+    assert detection.crisis_flag is False
+
+    # A later check-in keeps the end time; another user's session is refused and nothing is written
+    save_check_in(db, user_id, session_id, "Happy", "Better", [])
+    assert db.get(SessionModel, session_id).end_time == ended
+    other_id = make_user(db, email="other@example.com").id
+    db.commit()
+    assert save_check_in(db, other_id, session_id, "Sad", "Not mine", []) is None
+    assert db.query(EmotionDetection).count() == 2
+    assert db.query(EmotionDailyRollup).filter(EmotionDailyRollup.user_id == other_id).count() == 0
+
+
+def test_crisis_flag_is_set_at_ingest_and_backfilled(db):
+    assert contains_suicidal_keywords("I want to END  my life")
+    for text in ["self-harming again", "Self harm", "this worthlessness", "I wish I died", "reading about suicides", "feeling suicidal"]:
+        assert contains_suicidal_keywords(text), text
+    assert not contains_suicidal_keywords("Started a new diet and studied all day")
+
+    user = make_user(db)
+    session = SessionModel(user_id=user.id, start_time=datetime(2025, 1, 1))
+    db.add(session)
+    db.commit()
+    user_id, session_id = user.id, session.id
+    flagged = save_check_in(db, user_id, session_id, "Sad", "I feel worthless")
+    ids = save_check_in_batch(db, user_id, [
+        {"session_id": session_id, "emotion": "Sad", "voice_content": text, "timestamp": datetime(2025, 1, 1)}
+        for text in ("Long day", "There is no way out", "I keep self-harming")
+    ])
+    assert [db.get(EmotionDetection, i).crisis_flag for i in [flagged, *ids]] == [True, False, True, True]
+
+    from routers.sessions import summarize_diagnosis_window
+    _, prompt = summarize_diagnosis_window(db, user_id, "all", datetime(2024, 1, 1, tzinfo=DEFAULT_TZ))
+    assert "WARNING" in prompt and "- There is no way out" in prompt
+
+    db.query(EmotionDetection).update({"crisis_flag": False})
+    db.commit()
+    assert backfill_crisis_flags(db) == 3
+
+
+def test_local_day_follows_the_users_timezone(db):
+    user = make_user(db)
+    session = SessionModel(user_id=user.id, start_time=datetime(2025, 3, 1, tzinfo=timezone.utc))
+    db.add(session)
+    db.flush()
+    user_id, session_id = user.id, session.id
+    # 23:30 in New York is already the next day in Manila
+    stamp = datetime(2025, 3, 1, 23, 30, tzinfo=get_zone("America/New_York"))
+    user.timezone = "America/New_York"
+    detection_id = save_check_in(db, user_id, session_id, "sad", "long day", timestamp=stamp, zone=get_zone("America/New_York"))
+
+    new_york_day = datetime(2025, 3, 1).date()
+    assert db.get(EmotionDetection, detection_id).local_day == new_york_day
+    assert list(get_daily_rollups(db, user_id, new_york_day)) == [new_york_day]
+
+    # Nothing is committed until the caller commits
+    set_user_timezone(db, db.get(User, user_id), "Asia/Manila")
+    db.rollback()
+    assert db.get(User, user_id).timezone == "America/New_York"
+    assert list(get_daily_rollups(db, user_id, new_york_day)) == [new_york_day]
+
+    set_user_timezone(db, db.get(User, user_id), "Asia/Manila")
+    db.commit()
+    manila_day = datetime(2025, 3, 2).date()
+    assert db.get(EmotionDetection, detection_id).local_day == manila_day
+    assert list(get_daily_rollups(db, user_id, new_york_day)) == [manila_day]
+
+
+def test_timezone_change_keeps_rollups_of_offloaded_months(db):
+    user = make_user(db)
+    session = SessionModel(user_id=user.id, start_time=datetime(2024, 1, 1, tzinfo=timezone.utc))
+    db.add(session)
+    db.flush()
+    user_id, session_id = user.id, session.id
+    old_id = save_check_in(db, user_id, session_id, "sad", "long day", timestamp=datetime(2024, 1, 10, 12, tzinfo=timezone.utc))
+    save_check_in(db, user_id, session_id, "sad", "long day", timestamp=datetime(2025, 3, 1, 23, tzinfo=timezone.utc))
+    # archive_detections --offload-months drops January 2024 from the database
+    db.query(FacialData).filter(FacialData.detection_id == old_id).delete()
+    db.query(EmotionDetection).filter(EmotionDetection.id == old_id).delete()
+    db.commit()
+    sad = emotion_code(db, "sad")
+
+    set_user_timezone(db, db.get(User, user_id), "America/New_York")
+    db.commit()
+    rollups = get_daily_rollups(db, user_id, datetime(2024, 1, 1).date())
+    assert rollups == {
+        datetime(2024, 1, 10).date(): {sad: {"mild": 0, "moderate": 0, "severe": 1}},
+        datetime(2025, 3, 1).date(): {sad: {"mild": 0, "moderate": 0, "severe": 1}},
+    }
+    # A manual rebuild keeps them too
+    assert backfill_rollups(db, user_id) == 2
+
+
+def test_suggestion_job_run_twice_stores_one_suggestion(db, monkeypatch, fake_redis):
+    import suggestions
+    monkeypatch.setattr(suggestions, "SessionLocal", sessionmaker(bind=db.get_bind()))
+    monkeypatch.setattr(suggestions, "generate_suggestions", lambda emotion, content: (["Breathe slowly"], []))
+    monkeypatch.setattr("diagnosis_cache.get_sync_redis", lambda: fake_redis)
+    user = make_user(db)
+    session_id = create_session(SessionCreate(), db, user).id
+    ids = [save_check_in(db, user.id, session_id, "Sad", "Long day") for _ in range(2)]
+    payload = {"emotion": "Sad", "voice_content": "Long day", "detection_ids": ids}
+
+    suggestions.run_suggestion_job(payload)
+    # Re-queued after its worker died
+    suggestions.run_suggestion_job(payload)
+    assert sorted(row.detection_id for row in db.query(WellnessSuggestion)) == ids
+    # Only the run that stored the suggestions retired the user's cached diagnoses
+    assert fake_redis.get(f"diagnosis:generation:{user.id}") == "1"
+
+
+def test_unknown_emotions_share_the_other_code(db):
+    sad, other = emotion_codes(db, ["Sad", "other"])
+    rows = db.query(Emotion).count()
+    db.statements.clear()
+    codes = emotion_codes(db, [f"made up {i}" for i in range(50)] + ["  SAD "])
+    assert codes == [other] * 50 + [sad]
+    # Neither inserted nor reloaded
+    assert db.statements == []
+    assert db.query(Emotion).count() == rows
+    assert get_vocabulary(db).name_of[other] == "other"
+
+
+def test_save_check_in_batch_bulk_writes_in_one_commit(db):
+    user = make_user(db)
+    sessions = [SessionModel(user_id=user.id, start_time=datetime(2025, 1, 1)) for _ in range(2)]
+    db.add_all(sessions)
+    db.commit()
+    user_id, session_ids = user.id, [s.id for s in sessions]
+    stamp = datetime(2025, 1, 2, 1, tzinfo=DEFAULT_TZ)
+    items = [
+        {"session_id": session_ids[i % 2], "emotion": emotion, "voice_content": "note", "timestamp": stamp + timedelta(minutes=i)}
+        for i, emotion in enumerate(["Sad", "sad", "Happy", "Sad"])
+    ]
+    # A running process already holds the vocabulary in memory
+    sad, happy = emotion_code(db, "sad"), emotion_code(db, "happy")
+    db.statements.clear()
+
+    detection_ids = save_check_in_batch(db, user_id, items)
+
+    # Child rows, rollups, the activity summary and session ends go out as one statement each, whatever the batch size.
+    # (SQLite cannot batch INSERT .. RETURNING, so the detections themselves are not counted here.)
+    heads = [" ".join(statement.split()[:3]) for statement in db.statements if not statement.startswith("INSERT INTO emotion_detections")]
+    assert heads == ["INSERT INTO facial_data", "INSERT INTO voice_data", "INSERT INTO emotion_daily_rollups", "UPDATE user_activity SET", "UPDATE sessions SET"]
+    assert detection_ids == sorted(detection_ids)
+    assert [db.get(EmotionDetection, d).facial_data[0].emotion for d in detection_ids] == ["Sad", "sad", "Happy", "Sad"]
+    assert get_daily_rollups(db, user_id, stamp.date())[stamp.date()] == {
+        happy: {"mild": 1, "moderate": 0, "severe": 0},
+        sad: {"mild": 0, "moderate": 0, "severe": 3},
+    }
+    assert all(db.get(SessionModel, session_id).end_time is not None for session_id in session_ids)
+
+
+def test_export_streams_every_check_in(db, monkeypatch):
+    monkeypatch.setattr("exports.EXPORT_CHUNK_SIZE", 200)
+    user = make_user(db)
+    make_sessions(db, user, 3)
+    other = make_user(db, email="other@example.com")
+    make_sessions(db, other, 1)
+    user_id = user.id
+
+    chunks = list(ndjson_chunks(iter_export_rows(db, user_id)))
+    lines = "".join(chunks).splitlines()
+    assert len(chunks) > 1 and len(lines) == 9
+    first = json.loads(lines[0])
+    assert (first["emotion"], first["intensity"], first["acknowledgment"]) == ("Sad", "severe", "Tip 0. Breathe slowly")
+
+    rows = list(csv.DictReader(io.StringIO("".join(csv_chunks(iter_export_rows(db, user_id))))))
+    assert len(rows) == 9 and rows[1]["emotion"] == "Happy"